@@ -1,281 +1,285 @@
 import logging
 import json
-from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.keys import Keys
-import time
+from driver_pool import launch_driver
+import extraction
+import browser_profile
+import tracing
+import snapshots
+import waits
+import warm_profiles
 import sys
+import os
+from urllib.parse import quote_plus
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Set up Chrome options
-options = Options()
-options.add_argument("--start-maximized")
-options.add_argument("--disable-blink-features=AutomationControlled")
-# options.add_argument("--headless") # Keep headless commented out for now for debugging!
-options.add_argument("--disable-gpu")
-options.add_argument("--no-sandbox")
-options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/555.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/555.36")
-
-# Get product name from command-line argument
-if len(sys.argv) > 1:
-    product_name = sys.argv[1]
-else:
-    product_name = "potato"
-    logging.info(f"No product name provided, defaulting to '{product_name}'")
-
-# Initialize driver
-driver = None
-try:
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
-    
-    grocery_keywords_for_direct_nav = ["potato", "onion", "tomato", "ginger", "garlic", "vegetable", "fruit", "milk", "bread", "rice", "dal", "sugar", "salt", "flour", "atta", "oil", "ghee"]
-    
-    if any(keyword in product_name.lower() for keyword in grocery_keywords_for_direct_nav):
+# Storefront root; point it at a local stand-in site for testing
+AMAZON_BASE_URL = os.environ.get("AMAZON_BASE_URL", "https://www.amazon.in").rstrip("/")
+
+# Origins whose storage is wiped when a pooled driver is handed back
+AMAZON_ORIGINS = [AMAZON_BASE_URL]
+
+RESULT_LIST_SELECTOR = "div.s-result-list.s-search-results"
+
+# "direct" opens the search results URL; "interactive" types into the home page search box
+NAVIGATION_MODE = os.environ.get("NAVIGATION_MODE", "direct")
+
+AMAZON_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/555.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/555.36"
+
+grocery_keywords_for_direct_nav = ["potato", "onion", "tomato", "ginger", "garlic", "vegetable", "fruit", "milk", "bread", "rice", "dal", "sugar", "salt", "flour", "atta", "oil", "ghee"]
+
+
+def is_grocery(product_name):
+    return any(keyword in product_name.lower() for keyword in grocery_keywords_for_direct_nav)
+
+
+def build_search_url(product_name):
+    """URL of Amazon's search results page for `product_name`, scoped to Amazon Fresh for groceries."""
+    url = f"{AMAZON_BASE_URL}/s?k={quote_plus(product_name)}"
+    if is_grocery(product_name):
+        url += "&i=nowstore"  # Amazon Fresh search index
+    return url
+
+
+def build_chrome_options():
+    """Chrome options used for every Amazon browser, pooled or not."""
+    # Set BROWSER_PROFILE=full to get a visible, maximized browser for debugging
+    return browser_profile.build_options(AMAZON_USER_AGENT)
+
+
+def click_close_button(driver, close_button_selectors):
+    """Clicks the first visible modal close button, preferring historically successful selectors."""
+    selector, close_button = waits.race_selectors(driver, "amazon", "modal_close", close_button_selectors, 5)
+    if selector:
+        close_button.click()
+        logging.info(f"Successfully clicked modal close button with selector: {selector}")
+        return True
+    logging.debug("No modal close button selector was found or clickable.")
+    return False
+
+
+SEARCH_BOX_SELECTOR = "#twotabsearchtextbox"
+
+# Popups Amazon may lay over the page, and the buttons that close them
+MODAL_SELECTORS = ["div.a-modal-scroller", "div.a-popover-modal-header", "#a-popover-content"]
+CLOSE_BUTTON_SELECTORS = [
+    "button[data-action='a-popover-close']", 
+    ".a-icon.a-icon-close-small", 
+    "input[data-action='a-popover-close']", 
+    "#attach-close_decorate",
+    "span.a-button-inner button.a-button-close"
+]
+
+LOCATION_CONFIRM_SELECTORS = [
+    "span[data-action='GLUXConfirmClose'] input[type='submit']",
+    "#GLUXConfirmClose",
+    "#GLUXZipUpdateLink",
+]
+
+# Delivery location text in the header; it shows a pincode once a location is chosen
+LOCATION_SET_SCRIPT = """
+const line = document.getElementById('glow-ingress-line2');
+return !!line && /\\d{6}/.test(line.textContent);
+"""
+
+
+def dismiss_modal(driver):
+    """Closes a full-page modal/overlay if one is showing."""
+    tracing.phase("modal_dismissal")
+    if not warm_profiles.wait_for_overlays(driver, MODAL_SELECTORS + CLOSE_BUTTON_SELECTORS, [SEARCH_BOX_SELECTOR]):
+        logging.info("No modal/overlay on the page, skipping dismissal.")
+        return
+    try:
+        logging.info("Attempting to dismiss any full-page modal/overlay...")
+        modal_closed = click_close_button(driver, CLOSE_BUTTON_SELECTORS)
+
+        if not modal_closed:
+            logging.info("No common close button found or clickable. Trying ESC key.")
+            driver.find_element(By.TAG_NAME, 'body').send_keys(Keys.ESCAPE)
+            logging.info("Sent ESC key to dismiss potential pop-up.")
+
+        if waits.wait_until_gone(driver, MODAL_SELECTORS, 10):
+            logging.info("Waited for potential full-page modal/overlay to disappear.")
+        else:
+            logging.info("Full-page modal/overlay is still showing, proceeding.")
+
+    except waits.BudgetExhausted:
+        raise
+    except Exception as e_modal_dismiss:
+        logging.info(f"No full-page modal/overlay found or successfully dismissed, proceeding. ({e_modal_dismiss})")
+
+
+def choose_location(driver):
+    """Confirms a delivery location through the location popup unless one is already set."""
+    tracing.phase("location_popup")
+    try:
+        if driver.execute_script(LOCATION_SET_SCRIPT):
+            logging.info("Delivery location already set, skipping the location popup.")
+            return
+    except Exception as e:
+        logging.debug(f"Could not read the delivery location: {e}")
+    try:
+        if not waits.wait_for_any(driver, ["#glow-ingress-block"], 5, visible=True):
+            logging.info("Location block not found, no further action needed.")
+            return
+        driver.find_element(By.ID, "glow-ingress-block").click()
+        logging.info("Clicked on location block after modal dismissal (if it appeared).")
+
+        confirm_selector = waits.wait_for_any(driver, LOCATION_CONFIRM_SELECTORS, 5, visible=True)
+        if confirm_selector:
+            driver.find_element(By.CSS_SELECTOR, confirm_selector).click()
+            logging.info("Clicked 'Confirm' or 'Update' button in location modal (after glow-ingress-block click).")
+        else:
+            logging.info("No explicit confirmation button found or clickable in location modal after glow-ingress-block click, proceeding.")
+
+        if waits.wait_until_gone(driver, ["div.a-popover-modal-header", "#a-popover-content"], 5):
+            logging.info("Waited for potential smaller location modal to disappear.")
+
+    except waits.BudgetExhausted:
+        raise
+    except Exception as e_location_block:
+        logging.info(f"Location block not found or interactable after initial modal dismissal, or no further action needed. ({e_location_block})")
+
+
+def type_search(driver, product_name):
+    """Types `product_name` into the header search box and submits it."""
+    tracing.phase("search_submit")
+    logging.info("Attempting to interact with the search box.")
+    if not waits.wait_for_any(driver, [SEARCH_BOX_SELECTOR], 20, visible=True):
+        raise Exception("Search box did not appear.")
+    search_box = driver.find_element(By.CSS_SELECTOR, SEARCH_BOX_SELECTOR)
+    search_box.click()
+    logging.info("Clicked the search box.")
+    search_box.send_keys(product_name)
+    logging.info(f"Typed '{product_name}' into search box.")
+    search_box.submit()
+
+
+def warm_up_session(driver):
+    """Visits Amazon Fresh once to clear its popups and pick a location, for the saved warm profile."""
+    waits.navigate(driver, f"{AMAZON_BASE_URL}/fresh?ref_=nav_cs_fresh")
+    dismiss_modal(driver)
+    choose_location(driver)
+
+
+def search_interactively(driver, product_name):
+    """Reaches the results page the slow way: home or Fresh page, modals, location popup, typed search."""
+    if is_grocery(product_name):
         logging.info(f"'{product_name}' identified as a potential grocery item. Attempting direct navigation to Amazon Fresh.")
-        amazon_fresh_url = "https://www.amazon.in/fresh?ref_=nav_cs_fresh"
-        driver.get(amazon_fresh_url)
+        amazon_fresh_url = f"{AMAZON_BASE_URL}/fresh?ref_=nav_cs_fresh"
+        tracing.phase("navigation")
+        waits.navigate(driver, amazon_fresh_url)
         logging.info(f"Navigated to Amazon Fresh: {amazon_fresh_url}")
-        
+
         # --- Handle potential full-page modal/overlay first ---
-        try:
-            logging.info("Attempting to dismiss any full-page modal/overlay...")
-            
-            close_button_selectors = [
-                "button[data-action='a-popover-close']", 
-                ".a-icon.a-icon-close-small", 
-                "input[data-action='a-popover-close']", 
-                "#attach-close_decorate",
-                "span.a-button-inner button.a-button-close"
-            ]
-            
-            modal_closed = False
-            for selector in close_button_selectors:
-                try:
-                    close_button = WebDriverWait(driver, 5).until(
-                        EC.element_to_be_clickable((By.CSS_SELECTOR, selector))
-                    )
-                    close_button.click()
-                    logging.info(f"Successfully clicked modal close button with selector: {selector}")
-                    modal_closed = True
-                    time.sleep(1) # Small sleep after click
-                    break 
-                except:
-                    logging.debug(f"Modal close button with selector '{selector}' not found or not clickable.")
-            
-            if not modal_closed:
-                logging.info("No common close button found or clickable. Trying ESC key.")
-                driver.find_element(By.TAG_NAME, 'body').send_keys(Keys.ESCAPE)
-                logging.info("Sent ESC key to dismiss potential pop-up.")
-                time.sleep(1) # Small sleep after ESC
-
-            WebDriverWait(driver, 10).until_not(
-                EC.visibility_of_element_located((By.CSS_SELECTOR, "div.a-modal-scroller, div.a-popover-modal-header, #a-popover-content")) 
-            )
-            logging.info("Waited for potential full-page modal/overlay to disappear.")
+        dismiss_modal(driver)
+        choose_location(driver)
 
-        except Exception as e_modal_dismiss:
-            logging.info(f"No full-page modal/overlay found or successfully dismissed, proceeding. ({e_modal_dismiss})")
-            
-
-       
-        try:
-            glow_ingress_block = WebDriverWait(driver, 5).until(
-                EC.element_to_be_clickable((By.ID, "glow-ingress-block")) 
-            )
-            glow_ingress_block.click()
-            logging.info("Clicked on location block after modal dismissal (if it appeared).")
-
-            try:
-                confirm_button = WebDriverWait(driver, 5).until(
-                    EC.element_to_be_clickable((By.CSS_SELECTOR, "span[data-action='GLUXConfirmClose'] input[type='submit'], #GLUXConfirmClose, #GLUXZipUpdateLink, #GLUXConfirmClose.a-button-primary"))
-                )
-                confirm_button.click()
-                logging.info("Clicked 'Confirm' or 'Update' button in location modal (after glow-ingress-block click).")
-                time.sleep(1)
-            except Exception as e_confirm:
-                logging.info(f"No explicit confirmation button found or clickable in location modal after glow-ingress-block click, proceeding. ({e_confirm})")
-
-            WebDriverWait(driver, 5).until_not(
-                EC.visibility_of_element_located((By.CSS_SELECTOR, "div.a-popover-modal-header, #a-popover-content"))
-            )
-            logging.info("Waited for potential smaller location modal to disappear.")
 
-        except Exception as e_location_block:
-            logging.info(f"Location block not found or interactable after initial modal dismissal, or no further action needed. ({e_location_block})")
-
-
-        # --- Enhanced Search Box Interaction ---
-        logging.info("Attempting to interact with the search box.")
-        search_box = WebDriverWait(driver, 20).until(
-            EC.visibility_of_element_located((By.ID, "twotabsearchtextbox"))
-        )
-       
-        search_box.click()
-        logging.info("Clicked the search box.")
-        
-        
-        time.sleep(0.5) 
-
-        
-        search_box = WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable((By.ID, "twotabsearchtextbox"))
-        )
-        
-        
-
-        search_box.send_keys(product_name)
-        logging.info(f"Typed '{product_name}' into search box.")
-        search_box.submit()
+        type_search(driver, product_name)
         logging.info(f"Submitted search for '{product_name}' within Amazon Fresh.")
 
     else:
-       
-        driver.get("https://www.amazon.in/")
+
+        tracing.phase("navigation")
+        waits.navigate(driver, f"{AMAZON_BASE_URL}/")
         logging.info("Navigated to Amazon.in (main page).")
-        
-        
-        try:
-            logging.info("Attempting to dismiss any full-page modal/overlay on main page...")
-            close_button_selectors = [
-                "button[data-action='a-popover-close']", 
-                ".a-icon.a-icon-close-small", 
-                "input[data-action='a-popover-close']", 
-                "#attach-close_decorate",
-                "span.a-button-inner button.a-button-close"
-            ]
-            modal_closed = False
-            for selector in close_button_selectors:
-                try:
-                    close_button = WebDriverWait(driver, 5).until(
-                        EC.element_to_be_clickable((By.CSS_SELECTOR, selector))
-                    )
-                    close_button.click()
-                    logging.info(f"Successfully clicked modal close button with selector: {selector} on main page.")
-                    modal_closed = True
-                    time.sleep(1)
-                    break
-                except:
-                    logging.debug(f"Modal close button with selector '{selector}' not found or not clickable on main page.")
-            
-            if not modal_closed:
-                logging.info("No common close button found or clickable on main page. Trying ESC key.")
-                driver.find_element(By.TAG_NAME, 'body').send_keys(Keys.ESCAPE)
-                logging.info("Sent ESC key to dismiss potential pop-up on main page.")
-                time.sleep(1)
-
-            WebDriverWait(driver, 10).until_not(
-                EC.visibility_of_element_located((By.CSS_SELECTOR, "div.a-modal-scroller, div.a-popover-modal-header, #a-popover-content")) 
-            )
-            logging.info("Waited for potential full-page modal/overlay to disappear on main page.")
-        except Exception as e_modal_dismiss_main:
-            logging.info(f"No full-page modal/overlay found or successfully dismissed on main page, proceeding. ({e_modal_dismiss_main})")
-
-
-        # --- Enhanced Search Box Interaction for main page ---
-        logging.info("Attempting to interact with the search box on main page.")
-        search_box = WebDriverWait(driver, 20).until(
-            EC.visibility_of_element_located((By.ID, "twotabsearchtextbox"))
-        )
-        search_box.click() # Explicitly click
-        logging.info("Clicked the search box on main page.")
-        time.sleep(0.5) # Short delay
-        search_box = WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable((By.ID, "twotabsearchtextbox"))
-        )
-        search_box.send_keys(product_name)
-        logging.info(f"Typed '{product_name}' into search box on main page.")
-        search_box.submit()
+
+        dismiss_modal(driver)
+
+
+        type_search(driver, product_name)
         logging.info(f"Submitted search for '{product_name}' on main Amazon page.")
 
-    # Wait for search results to load (consistent for both paths)
-    WebDriverWait(driver, 15).until(
-        EC.presence_of_element_located((By.CSS_SELECTOR, "div.s-result-list.s-search-results"))
-    )
-    logging.info("Search results page loaded.")
-
-    output_data = None
-
-    results = driver.find_elements(By.CSS_SELECTOR, "div[data-component-type='s-search-result']")
-    logging.info(f"Found {len(results)} potential product result containers.")
-
-    if results:
-        for i, result_element in enumerate(results):
-            logging.debug(f"Attempting to extract data from product result {i+1}")
-            try:
-                title_span_element = result_element.find_element(By.CSS_SELECTOR, "h2 span")
-                title = title_span_element.text.strip()
-                logging.debug(f"Found title: {title}")
-
-                if product_name.lower() == "potato" and "chips" in title.lower():
-                    logging.debug(f"Skipping '{title}' as it contains 'chips' for 'potato' search.")
-                    continue
-
-                link_element = result_element.find_element(By.CSS_SELECTOR, "a.a-link-normal.s-underline-text, a.a-link-normal.s-no-outline")
-                link = link_element.get_attribute("href")
-                logging.debug(f"Found link: {link}")
-
-                price_whole = ""
-                price_fraction = ""
-                
-                try:
-                    price_whole_element = result_element.find_element(By.CSS_SELECTOR, "span.a-price-whole")
-                    price_whole = price_whole_element.text.replace(",", "").strip()
-                    logging.debug(f"Found price whole: {price_whole}")
-                except Exception as e_whole:
-                    logging.debug(f"Price whole not found for title '{title}': {e_whole}")
-                    pass 
-
-                try:
-                    price_fraction_element = result_element.find_element(By.CSS_SELECTOR, "span.a-price-fraction")
-                    price_fraction = price_fraction_element.text.strip()
-                    logging.debug(f"Found price fraction: {price_fraction}")
-                except Exception as e_fraction:
-                    logging.debug(f"Price fraction not found for title '{title}': {e_fraction}")
-                    pass
-
-                price = None
-                if price_whole:
-                    price_str = price_whole
-                    if price_fraction:
-                        price_str += f".{price_fraction}"
-                    try:
-                        price = float(price_str)
-                        logging.debug(f"Parsed price: {price}")
-                    except ValueError:
-                        logging.warning(f"Could not convert price string '{price_str}' to float for title: {title}")
-                        price = None
-                
-                if title and link and price is not None:
-                    output_data = {"title": title, "price": price, "link": link}
-                    logging.info(f"Successfully extracted data for: {title}")
-                    break
-                else:
-                    logging.debug(f"Skipping product {i+1} due to missing data: Title='{title}', Price='{price}', Link='{link}'")
-
-            except Exception as e:
-                logging.debug(f"Failed to extract all details from product result {i+1} (possibly sponsored or different layout): {e}")
 
+def open_search_results(driver, product_name):
+    """Loads the results page straight from its URL. Returns False if the result list did not show up."""
+    url = build_search_url(product_name)
+    try:
+        tracing.phase("navigation")
+        waits.navigate(driver, url)
+        tracing.phase("result_wait")
+        if not waits.wait_for_any(driver, [RESULT_LIST_SELECTOR], 15):
+            raise Exception("Result list did not appear.")
+        logging.info(f"Opened search results directly: {url}")
+        return True
+    except waits.BudgetExhausted:
+        raise
+    except Exception as e:
+        logging.info(f"Direct navigation to {url} did not reach the result list, using the interactive search. ({e})")
+        return False
+
+
+def scrape_amazon(product_name, driver=None):
+    """Searches Amazon for `product_name` and returns {"title", "price", "link"} or None.
+
+    Pass a leased `driver` to reuse a pooled browser; otherwise a fresh one is
+    launched and quit when the scrape ends. The scrape gets SCRAPE_BUDGET_SECONDS;
+    if that runs out, whatever the page shows by then is returned with "partial" set.
+    None means the site listed no match; a scrape that failed before it could tell raises.
+    """
+    owns_driver = driver is None
+    try:
+        if owns_driver:
+            driver = launch_driver(build_chrome_options())
+        with waits.budget():
+            browser_profile.reset_page_metrics(driver)
+            warm_profiles.apply("amazon", driver, warm_up_session, build_chrome_options, rewarm=not owns_driver)
+
+            results_loaded = False
+            if NAVIGATION_MODE == "direct":
+                results_loaded = open_search_results(driver, product_name)
+            if not results_loaded:
+                search_interactively(driver, product_name)
+
+            # Wait for search results to load (consistent for both paths)
+            if not results_loaded:
+                tracing.phase("result_wait")
+            if not waits.wait_for_any(driver, [RESULT_LIST_SELECTOR], 15):
+                raise Exception("Search results page did not load.")
+            logging.info("Search results page loaded.")
+            browser_profile.log_page_metrics(driver, "amazon")
+
+        # Pull the whole result list in one round trip and extract locally
+        tracing.phase("extraction")
+        html = driver.page_source
+        snapshots.record("amazon", product_name, html, driver.current_url)
+        output_data = extraction.parse_amazon_results(html, product_name, base_url=driver.current_url)
         if output_data:
-            print(json.dumps(output_data))
+            logging.info(f"Successfully extracted data for: {output_data['title']}")
         else:
             logging.warning("No complete product data found after trying all results with current selectors.")
-            print(json.dumps(None))
-    else:
-        logging.warning("No search results found at all with the main product container selector: div[data-component-type='s-search-result']")
-        print(json.dumps(None))
+        tracing.end_phase()
+
+        return output_data
+
+    except waits.BudgetExhausted as e:
+        tracing.fail_phase()
+        logging.warning(f"{e} Returning what the Amazon page shows so far.")
+        result = waits.partial_result(driver, extraction.parse_amazon_results, product_name)
+        if result is None:
+            raise   # Nothing usable yet is not the same as "no results"
+        return result
 
-except Exception as e:
-    logging.error(f"An unexpected error occurred during scraping: {e}", exc_info=True)
-    print(json.dumps(None))
+    except Exception as e:
+        tracing.fail_phase()
+        logging.error(f"An unexpected error occurred during scraping: {e}", exc_info=True)
+        raise
 
-finally:
-    if 'driver' in locals() and driver:
-        driver.quit()
-        logging.info("WebDriver closed.")
\ No newline at end of file
+    finally:
+        if owns_driver and driver:
+            driver.quit()
+            logging.info("WebDriver closed.")
+
+
+if __name__ == '__main__':
+    # Get product name from command-line argument
+    if len(sys.argv) > 1:
+        product_name = sys.argv[1]
+    else:
+        product_name = "potato"
+        logging.info(f"No product name provided, defaulting to '{product_name}'")
+    print(json.dumps(scrape_amazon(product_name)))
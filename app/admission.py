@@ -0,0 +1,178 @@
+"""Admission control for comparisons that need a browser.
+
+At most `capacity` comparisons scrape at once and at most `queue_size` more wait
+for a slot. Searches wait on the event loop (`slot`), so a queued request holds no
+server thread. A search that finds the queue full is rejected straight away (429),
+and one that waits longer than `max_wait` gives up (503). Both carry a Retry-After
+estimate based on recent service times.
+
+Work started from server threads takes the same slots: `hold` blocks for one,
+behind every queued search and within an optional cap on held slots, and `try_acquire` takes one only if it is free right
+now, never queueing.
+"""
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+DEFAULT_SERVICE_SECONDS = 20     # Assumed comparison time until real ones have been measured
+
+
+class Rejected(Exception):
+    def __init__(self, status, retry_after, reason):
+        super().__init__(reason)
+        self.status = status
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class _Waiter:
+    """A queued search: its event loop and the future resolved once it holds a slot."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.future = loop.create_future()
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class AdmissionController:
+    def __init__(self, capacity, queue_size, max_wait):
+        self.capacity = capacity
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._freed = threading.Condition(self._lock)   # wakes `hold` callers when a slot frees up
+        self._waiters = deque()     # queued searches, first come first served
+        self.running = 0
+        self.held = 0               # slots held by `hold` callers, out of `running`
+        self.holding_back = 0       # `hold` callers waiting for a slot
+        self.service_seconds = None     # Moving average of how long an admitted comparison takes
+        self.counters = {"admitted": 0, "rejected_full": 0, "rejected_timeout": 0, "wait_seconds_total": 0.0,
+                         "wait_seconds_max": 0.0, "holds": 0, "tries": 0, "tries_busy": 0}
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    def retry_after(self, position):
+        """Seconds until roughly `position` queued comparisons have been served."""
+        per_comparison = self.service_seconds or DEFAULT_SERVICE_SECONDS
+        return max(1, math.ceil(per_comparison * position / self.capacity))
+
+    def busy(self):
+        """True when no slot is free right now, or searches are queued for one."""
+        with self._lock:
+            return self.running >= self.capacity or bool(self._waiters)
+
+    def full(self):
+        """True when a new search would be rejected with a 429 right now."""
+        with self._lock:
+            return self.running >= self.capacity and len(self._waiters) >= self.queue_size
+
+    def _release(self):
+        """Frees one slot and hands it to the first queued search, else to a `hold` caller. Caller holds `_lock`."""
+        self.running -= 1
+        while self._waiters and self.running < self.capacity:
+            waiter = self._waiters.popleft()
+            self.running += 1
+            waiter.loop.call_soon_threadsafe(_resolve, waiter.future)
+        self._freed.notify_all()
+
+    @asynccontextmanager
+    async def slot(self):
+        """Holds one scrape slot for the block; yields how long the request queued for it."""
+        started = time.monotonic()
+        with self._lock:
+            if self.running < self.capacity and not self._waiters:
+                self.running += 1
+                waiter = None
+            elif len(self._waiters) >= self.queue_size:
+                self.counters["rejected_full"] += 1
+                raise Rejected(429, self.retry_after(len(self._waiters) + 1), "Too many searches are waiting for a browser.")
+            else:
+                waiter = _Waiter(asyncio.get_running_loop())
+                self._waiters.append(waiter)
+
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), self.max_wait)
+            except BaseException as e:
+                with self._lock:
+                    queued = waiter in self._waiters    # else the slot was granted just as the wait ended
+                    if queued:
+                        self._waiters.remove(waiter)
+                    if not isinstance(e, asyncio.TimeoutError):
+                        if not queued:
+                            self._release()
+                        raise   # the request went away while queued
+                    if queued:
+                        self.counters["rejected_timeout"] += 1
+                        raise Rejected(503, self.retry_after(len(self._waiters) + 1), "No browser became free in time.")
+
+        waited = time.monotonic() - started
+        with self._lock:
+            self.counters["admitted"] += 1
+            self.counters["wait_seconds_total"] += waited
+            self.counters["wait_seconds_max"] = max(self.counters["wait_seconds_max"], waited)
+        service_started = time.monotonic()
+        try:
+            yield waited
+        finally:
+            elapsed = time.monotonic() - service_started
+            with self._lock:
+                previous = self.service_seconds
+                self.service_seconds = elapsed if previous is None else 0.8 * previous + 0.2 * elapsed
+                self._release()
+
+    @contextmanager
+    def hold(self, limit=None):
+        """Blocks the calling thread until a slot is free and no search is queued for one, then holds it.
+
+        With `limit`, also waits while that many slots are already held, leaving the rest to searches.
+        """
+        with self._lock:
+            self.holding_back += 1
+            try:
+                while self.running >= self.capacity or self._waiters or (limit is not None and self.held >= limit):
+                    self._freed.wait()
+            finally:
+                self.holding_back -= 1
+            self.running += 1
+            self.held += 1
+            self.counters["holds"] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.held -= 1
+                self._release()
+
+    def try_acquire(self):
+        """Takes a slot if one is free and no search is queued for it; returns False instead of waiting."""
+        with self._lock:
+            if self.running >= self.capacity or self._waiters:     # same test as `busy`
+                self.counters["tries_busy"] += 1
+                return False
+            self.running += 1
+            self.counters["tries"] += 1
+            return True
+
+    def release(self):
+        """Gives back a slot taken with `try_acquire`."""
+        with self._lock:
+            self._release()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters, capacity=self.capacity, queue_size=self.queue_size, running=self.running,
+                         waiting=len(self._waiters), held=self.held, holding_back=self.holding_back,
+                         service_seconds=self.service_seconds)
+        admitted = stats["admitted"]
+        stats["wait_seconds_mean"] = stats["wait_seconds_total"] / admitted if admitted else 0.0
+        return stats
@@ -1,11 +1,26 @@
-from flask import Flask, render_template, request, flash, redirect
+from flask import Flask, render_template, request, flash, redirect, jsonify, Response, stream_with_context, url_for
 import subprocess
 import os
 import logging
 import json
-from fuzzywuzzy import fuzz
 import sys
 from selenium import webdriver
+from fanout import run_site_scrapes, iter_site_scrapes
+from worker_client import WorkerGroup, WorkerError
+from result_cache import ResultCache, MemoryBackend, DiskBackend, ScrapeFailed
+from price_history import PriceHistory
+from single_flight import SingleFlight, SQLiteFlightStore
+from prefetch import Prefetcher
+from batch import BatchRunner
+from admission import AdmissionController
+from resilience import ResilientScraper, CircuitOpen
+from scheduler import Scheduler, Watchlist
+import metrics
+from matching import best_match, candidates_of
+import atexit
+import threading
+import time
+from contextlib import nullcontext
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -14,12 +29,128 @@ app.secret_key = "your_secret_key"  # Replace with a secure key
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
-def are_same_product(title1, title2, threshold=80):
-    """Uses fuzzy matching to determine if two product titles are likely the same."""
-    if not title1 or not title2:
-        return False
-    similarity_score = fuzz.ratio(title1.lower(), title2.lower())
-    return similarity_score >= threshold
+# Shared deadline (seconds) for the Amazon and Flipkart scrapes of one comparison.
+SCRAPE_DEADLINE_SECONDS = 90
+
+# Directory holding amazon_scraping.py and flipkart_scraping.py (the repo root by default)
+SCRAPER_DIR = os.environ.get("SCRAPER_DIR", os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# "worker" sends searches to long-lived scraper_worker.py processes over JSON lines;
+# "subprocess" runs each scraper script in a fresh interpreter and browser per search;
+# "pool" runs the scrapers in-process against warm browsers leased from a driver pool.
+SCRAPER_BACKEND = os.environ.get("SCRAPER_BACKEND", "worker")
+SCRAPER_WORKERS = int(os.environ.get("SCRAPER_WORKERS", "2"))
+
+
+def browser_capacity():
+    """Comparisons the configured scraper backend can run at once; each one needs a browser per site."""
+    if SCRAPER_BACKEND == "worker":
+        per_worker = min(int(os.environ.get("WORKER_CONCURRENCY", "2")), int(os.environ.get("DRIVER_POOL_SIZE", "1")))
+        return SCRAPER_WORKERS * per_worker
+    if SCRAPER_BACKEND == "pool":
+        return int(os.environ.get("DRIVER_POOL_SIZE", "1"))
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+# At most ADMISSION_CAPACITY comparisons scrape at once (default: what the backend has browsers for).
+# serve.py queues searches for these slots, up to ADMISSION_QUEUE_SIZE of them for ADMISSION_MAX_WAIT
+# seconds each; batch items and prefetches take the same slots from server threads.
+ADMISSION_CAPACITY = int(os.environ.get("ADMISSION_CAPACITY", "0")) or browser_capacity()
+ADMISSION_QUEUE_SIZE = int(os.environ.get("ADMISSION_QUEUE_SIZE", str(2 * ADMISSION_CAPACITY)))
+ADMISSION_MAX_WAIT = float(os.environ.get("ADMISSION_MAX_WAIT", "20"))
+
+admission = AdmissionController(ADMISSION_CAPACITY, ADMISSION_QUEUE_SIZE, ADMISSION_MAX_WAIT)
+
+# Scrape result cache: "memory" (per process) or "disk" (SQLite file at RESULT_CACHE_PATH)
+RESULT_CACHE_BACKEND = os.environ.get("RESULT_CACHE_BACKEND", "memory")
+RESULT_CACHE_PATH = os.environ.get("RESULT_CACHE_PATH", os.path.join(SCRAPER_DIR, "result_cache.sqlite3"))
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", "1000"))
+RESULT_CACHE_HIT_TTL = int(os.environ.get("RESULT_CACHE_HIT_TTL", "900"))
+RESULT_CACHE_NEGATIVE_TTL = int(os.environ.get("RESULT_CACHE_NEGATIVE_TTL", "120"))
+RESULT_CACHE_STALE_TTL = int(os.environ.get("RESULT_CACHE_STALE_TTL", "3600"))
+RESULT_CACHE_PARTIAL_TTL = int(os.environ.get("RESULT_CACHE_PARTIAL_TTL", "60"))
+
+if RESULT_CACHE_BACKEND == "disk":
+    _cache_backend = DiskBackend(RESULT_CACHE_PATH, max_entries=RESULT_CACHE_MAX_ENTRIES)
+else:
+    _cache_backend = MemoryBackend(max_entries=RESULT_CACHE_MAX_ENTRIES)
+result_cache = ResultCache(
+    _cache_backend,
+    hit_ttl=RESULT_CACHE_HIT_TTL,
+    negative_ttl=RESULT_CACHE_NEGATIVE_TTL,
+    stale_ttl=RESULT_CACHE_STALE_TTL,
+    partial_ttl=RESULT_CACHE_PARTIAL_TTL,
+    admission=admission,
+)
+
+# Every scrape result is also appended to a SQLite price history. Results observed within
+# PRICE_HISTORY_SERVE_SECONDS are served from it without scraping again (0 disables that).
+PRICE_HISTORY_PATH = os.environ.get("PRICE_HISTORY_PATH", os.path.join(SCRAPER_DIR, "price_history.sqlite3"))
+PRICE_HISTORY_SERVE_SECONDS = int(os.environ.get("PRICE_HISTORY_SERVE_SECONDS", "900"))
+
+price_history = PriceHistory(PRICE_HISTORY_PATH)
+atexit.register(price_history.flush)
+
+# Identical searches already being scraped are shared instead of started again: in memory across
+# this process's threads, and through a SQLite lease file across server processes ("sqlite", the
+# default) or only within this process ("memory").
+SINGLE_FLIGHT_BACKEND = os.environ.get("SINGLE_FLIGHT_BACKEND", "sqlite")
+SINGLE_FLIGHT_PATH = os.environ.get("SINGLE_FLIGHT_PATH", os.path.join(SCRAPER_DIR, "single_flight.sqlite3"))
+
+if SINGLE_FLIGHT_BACKEND == "sqlite":
+    single_flight = SingleFlight(SQLiteFlightStore(SINGLE_FLIGHT_PATH, lease_ttl=SCRAPE_DEADLINE_SECONDS + 30))
+else:
+    single_flight = SingleFlight()
+
+# The home page asks for a prefetch once the search box text has been stable for PREFETCH_DEBOUNCE_MS.
+# Prefetches fill the result cache ahead of submit, on PREFETCH_WORKERS threads, and only start
+# when an admission slot is free with no search queued for one; they hold it while they scrape.
+# Nobody asked for a prefetch yet, so its results go to the result cache and not the price history.
+PREFETCH_ENABLED = os.environ.get("PREFETCH_ENABLED", "1") == "1"
+PREFETCH_MIN_CHARS = int(os.environ.get("PREFETCH_MIN_CHARS", "3"))
+PREFETCH_DEBOUNCE_MS = int(os.environ.get("PREFETCH_DEBOUNCE_MS", "600"))
+PREFETCH_WORKERS = int(os.environ.get("PREFETCH_WORKERS", "1"))
+
+prefetcher = Prefetcher(
+    lambda query: run_site_scrapes(query, site_scrapers(record=False), SCRAPE_DEADLINE_SECONDS),
+    admission,
+    workers=PREFETCH_WORKERS,
+)
+
+# Each site's scrapes go through a ResilientScraper (resilience.py). It tracks latency and failures
+# over the last RESILIENCE_WINDOW attempts. A scrape still running past the site's p95 gets a hedged
+# second attempt (HEDGE_ENABLED, never before HEDGE_MIN_SECONDS) if an admission slot is free. Once BREAKER_ERROR_RATE of at least
+# BREAKER_MIN_SAMPLES attempts failed, the site's breaker opens for BREAKER_COOLDOWN_SECONDS. Searches
+# are then answered from the last result recorded within BREAKER_FALLBACK_MAX_AGE, marked "stale".
+RESILIENCE_WINDOW = int(os.environ.get("RESILIENCE_WINDOW", "50"))
+HEDGE_ENABLED = os.environ.get("HEDGE_ENABLED", "1") == "1"
+HEDGE_MIN_SECONDS = float(os.environ.get("HEDGE_MIN_SECONDS", "5"))
+BREAKER_ERROR_RATE = float(os.environ.get("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_MIN_SAMPLES = int(os.environ.get("BREAKER_MIN_SAMPLES", "10"))
+BREAKER_COOLDOWN_SECONDS = int(os.environ.get("BREAKER_COOLDOWN_SECONDS", "60"))
+BREAKER_FALLBACK_MAX_AGE = int(os.environ.get("BREAKER_FALLBACK_MAX_AGE", str(24 * 3600)))
+
+# Background refresh of watched products (kept in the price history file). Set SCHEDULER_ENABLED=1
+# to run it inside the web process, or run `python scheduler.py` as a separate process.
+SCHEDULER_ENABLED = os.environ.get("SCHEDULER_ENABLED", "0") == "1"
+SCHEDULER_REFRESH_SECONDS = int(os.environ.get("SCHEDULER_REFRESH_SECONDS", "3600"))
+SCHEDULER_SITE_CONCURRENCY = int(os.environ.get("SCHEDULER_SITE_CONCURRENCY", "1"))
+SCHEDULER_SITE_RATE_PER_MINUTE = float(os.environ.get("SCHEDULER_SITE_RATE_PER_MINUTE", "10"))
+
+
+# POST /api/compare compares a batch of products, API_BATCH_CONCURRENCY at a time across all batches
+# (a batch may ask for fewer), at most API_BATCH_MAX_ITEMS per request. Batch items that scrape hold
+# admission slots, at most API_BATCH_MAX_SLOTS of them, so some browsers are always left for searches.
+API_BATCH_CONCURRENCY = int(os.environ.get("API_BATCH_CONCURRENCY", "4"))
+API_BATCH_MAX_ITEMS = int(os.environ.get("API_BATCH_MAX_ITEMS", "5000"))
+API_BATCH_MAX_SLOTS = int(os.environ.get("API_BATCH_MAX_SLOTS", str(max(1, ADMISSION_CAPACITY - 1))))
+
+batch_runner = BatchRunner(lambda query: compare_item(query), workers=API_BATCH_CONCURRENCY)
+
+# STREAM_RESULTS=1 sends searches from the home page to the progressive results page,
+# which shows each site's result as soon as it arrives.
+STREAM_RESULTS = os.environ.get("STREAM_RESULTS", "0") == "1"
+
 
 @app.route('/', methods=['GET', 'POST'])
 def search_product():
@@ -28,60 +159,447 @@ def search_product():
 
         if not searched_product:
             flash("Please enter a product to search.", "error")
-            return render_template('home.html')
+            return render_home()
+        if STREAM_RESULTS:
+            return redirect(url_for('compare_page', q=searched_product))
+        note_search(searched_product)
 
         try:
-            # Run Amazon scraper
-            amazon_data = scrape_amazon(searched_product)
-
-            # Run Flipkart scraper
-            flipkart_data = scrape_flipkart(searched_product)
-
-            if amazon_data and flipkart_data:
-                amazon_title = amazon_data.get('title', '')
-                flipkart_title = flipkart_data.get('title', '')
-
-                if are_same_product(amazon_title, flipkart_title):
-                    amazon_price = amazon_data.get('price')
-                    flipkart_price = flipkart_data.get('price')
-                    amazon_link = amazon_data.get('link')
-                    flipkart_link = flipkart_data.get('link')
-
-                    if amazon_price is not None and flipkart_price is not None and amazon_link and flipkart_link:
-                        if amazon_price < flipkart_price:
-                            flash(f"Amazon has the lower price: ₹{amazon_price}", "success")
-                            return redirect(amazon_link)  # Redirect to Amazon
-                        elif flipkart_price < amazon_price:
-                            flash(f"Flipkart has the lower price: ₹{flipkart_price}", "success")
-                            return redirect(flipkart_link)  # Redirect to Flipkart
-                        else:
-                            flash(f"Prices are the same: Amazon - ₹{amazon_price}, Flipkart - ₹{flipkart_price}", "info")
-                            return render_template('results.html', amazon=amazon_data, flipkart=flipkart_data) # Show both
-                    else:
-                        flash("Could not retrieve price or link from both websites.", "error")
-                        return render_template('results.html', amazon=amazon_data, flipkart=flipkart_data) # Show available data
-                else:
-                    flash("Could not confidently compare prices as the products seem different.", "warning")
-                    return render_template('results.html', amazon=amazon_data, flipkart=flipkart_data) # Show available data
-
-            else:
-                flash("Could not retrieve product data from both websites.", "error")
-                return render_template('results.html', amazon=amazon_data, flipkart=flipkart_data) # Show available data
+            # Run both scrapers concurrently under one deadline
+            site_results, timings = run_site_scrapes(searched_product, site_scrapers(), SCRAPE_DEADLINE_SECONDS)
+            for site, timing in timings.items():
+                observe_scrape(site, timing)
+
+            verdict = compare_results(site_results["amazon"], site_results["flipkart"])
+            flash(verdict["message"], verdict["category"])
+            if verdict["redirect"]:
+                return redirect(verdict["redirect"])  # Send the user to the cheaper site
+            return render_results(verdict["amazon"], verdict["flipkart"], timings)
 
         except Exception as e:
             logging.error(f"Error comparing prices: {e}")
             flash("An error occurred while comparing prices.", "error")
 
-    return render_template('home.html')
+    return render_home()
+
+
+def render_home():
+    return render_template('home.html', prefetch_enabled=PREFETCH_ENABLED, prefetch_min_chars=PREFETCH_MIN_CHARS,
+                           prefetch_debounce_ms=PREFETCH_DEBOUNCE_MS)
+
+
+@app.route('/prefetch', methods=['POST'])
+def prefetch():
+    """Starts a low-priority scrape of text the user is still typing, so the submit finds it cached."""
+    data = request.get_json(silent=True) or request.form
+    query = (data.get("q") or "").strip()
+    if not PREFETCH_ENABLED:
+        return jsonify({"queued": False, "reason": "disabled"})
+    if len(query) < PREFETCH_MIN_CHARS:
+        return jsonify({"queued": False, "reason": "too short"})
+    if not needs_scrape(query):
+        return jsonify({"queued": False, "reason": "cached"})
+    prefetcher.submit(data.get("client") or request.remote_addr, query)
+    return jsonify({"queued": True}), 202
+
+
+@app.route('/compare')
+def compare_page():
+    """Results page that fills in each site as its result streams in from /compare/stream."""
+    query = request.args.get("q")
+    if not query:
+        flash("Please enter a product to search.", "error")
+        return redirect(url_for('search_product'))
+    return render_template('results_stream.html', query=query)
+
+
+@app.route('/compare/stream')
+def compare_stream():
+    """Server-Sent Events: one "site" event per site as it finishes, then a final "verdict" event."""
+    query = request.args.get("q")
+    if not query:
+        return jsonify({"error": "Missing query parameter 'q'."}), 400
+    note_search(query)
+
+    def events():
+        results = {}
+        try:
+            for site, result, timing in iter_site_scrapes(query, site_scrapers(), SCRAPE_DEADLINE_SECONDS):
+                observe_scrape(site, timing)
+                results[site] = result
+                yield sse_event("site", {"site": site, "result": result, "timing": timing})
+            verdict = compare_results(results.get("amazon"), results.get("flipkart"))
+        except Exception as e:
+            logging.error(f"Error streaming comparison: {e}")
+            verdict = {"status": "error", "message": "An error occurred while comparing prices.", "category": "error",
+                       "redirect": None, "score": None, "amazon": results.get("amazon"), "flipkart": results.get("flipkart")}
+        yield sse_event("verdict", verdict)
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route('/api/compare', methods=['POST'])
+def api_compare():
+    """Compares a batch of products, streaming one JSON line per item as it finishes, then a summary line.
+
+    Body: {"queries": ["potato", ...], "concurrency": 2}; "concurrency" is optional and capped at
+    API_BATCH_CONCURRENCY. Item lines carry "index" (position in "queries"), "query", "status",
+    "winner" ("amazon", "flipkart", "same" or null), "match_score", "message", both sites'
+    results and per-site timings.
+    """
+    data = request.get_json(silent=True) or {}
+    queries = data.get("queries")
+    if not isinstance(queries, list) or not queries or not all(isinstance(q, str) and q.strip() for q in queries):
+        return jsonify({"error": "Expected a JSON body with a non-empty list of product names in 'queries'."}), 400
+    if len(queries) > API_BATCH_MAX_ITEMS:
+        return jsonify({"error": f"At most {API_BATCH_MAX_ITEMS} queries per batch."}), 413
+    concurrency = data.get("concurrency")
+    if concurrency is not None and (not isinstance(concurrency, int) or concurrency < 1):
+        return jsonify({"error": "'concurrency' must be a positive integer."}), 400
+
+    def lines():
+        started = time.perf_counter()
+        statuses = {}
+        for index, query, item, error in batch_runner.run(queries, concurrency):
+            if error:
+                item = {"status": "error", "winner": None, "match_score": None, "message": error}
+            statuses[item["status"]] = statuses.get(item["status"], 0) + 1
+            yield json.dumps(dict(item, index=index, query=query)) + "\n"
+        yield json.dumps({"done": True, "items": len(queries), "statuses": statuses,
+                          "seconds": round(time.perf_counter() - started, 3)}) + "\n"
+
+    return Response(stream_with_context(lines()), mimetype="application/x-ndjson",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def compare_item(query):
+    """One batch item: both site results, the match score, the winner and per-site timings.
+
+    An item that has to scrape holds an admission slot while it does, like a search,
+    but only one of the API_BATCH_MAX_SLOTS batches may use.
+    """
+    with admission.hold(limit=API_BATCH_MAX_SLOTS) if needs_scrape(query) else nullcontext():
+        site_results, timings = run_site_scrapes(query, site_scrapers(), SCRAPE_DEADLINE_SECONDS)
+    for site, timing in timings.items():
+        observe_scrape(site, timing)
+    verdict = compare_results(site_results["amazon"], site_results["flipkart"])
+    return {
+        "status": verdict["status"],
+        "winner": verdict["status"] if verdict["status"] in ("amazon", "flipkart", "same") else None,
+        "match_score": verdict["score"],
+        "message": verdict["message"],
+        "amazon": verdict["amazon"],
+        "flipkart": verdict["flipkart"],
+        "timings": timings,
+    }
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def needs_scrape(query):
+    """True unless the result cache can answer `query` for every site without scraping."""
+    return any(result_cache.peek(site, query)[2] is None for site in ("amazon", "flipkart"))
+
+
+def site_scrapers(record=True):
+    return {site: cached_scraper(site, scrape, record=record) for site, scrape in resilient_scrapers.items()}
+
+
+def note_search(query):
+    """Counts a user search towards the refresh priority of a watched product."""
+    if _scheduler:
+        _scheduler.note_demand(query)
+    else:
+        watchlist.bump(query)
+
+
+def observe_scrape(site, timing):
+    metrics.observe_phase(site, "scrape", timing["seconds"], timing["status"] in ("ok", "empty"))
+    metrics.inc("pricecomp_scrape_total", site=site, outcome=timing["status"])
+
+
+def compare_results(amazon_data, flipkart_data):
+    """Decides which site is cheaper for the best-matching pair of products.
+
+    Returns {"status", "message", "category", "redirect", "score", "amazon", "flipkart"}; "redirect"
+    is the cheaper product's link, or None when there is no clear winner to send the user to, and
+    "score" is the title match score of the compared pair, or None when no pair matched.
+    """
+    score = None
+
+    def verdict(status, message, category, redirect_to=None):
+        return {"status": status, "message": message, "category": category, "redirect": redirect_to,
+                "score": score, "amazon": amazon_data, "flipkart": flipkart_data}
 
+    if not (amazon_data and flipkart_data):
+        return verdict("missing", "Could not retrieve product data from both websites.", "error")
 
-def scrape_amazon(product_name):
+    # Pick the closest pair out of both sites' top candidates
+    with metrics.timed("compare", "fuzzy_matching"):
+        match = best_match(candidates_of(amazon_data), candidates_of(flipkart_data))
+    if not match:
+        return verdict("different", "Could not confidently compare prices as the products seem different.", "warning")
+
+    amazon_data, flipkart_data, score = match
+    amazon_price = amazon_data.get('price')
+    flipkart_price = flipkart_data.get('price')
+    amazon_link = amazon_data.get('link')
+    flipkart_link = flipkart_data.get('link')
+
+    if amazon_price is None or flipkart_price is None or not amazon_link or not flipkart_link:
+        return verdict("incomplete", "Could not retrieve price or link from both websites.", "error")
+    if amazon_price < flipkart_price:
+        return verdict("amazon", f"Amazon has the lower price: ₹{amazon_price}", "success", amazon_link)
+    if flipkart_price < amazon_price:
+        return verdict("flipkart", f"Flipkart has the lower price: ₹{flipkart_price}", "success", flipkart_link)
+    return verdict("same", f"Prices are the same: Amazon - ₹{amazon_price}, Flipkart - ₹{flipkart_price}", "info")
+
+
+def render_results(amazon_data, flipkart_data, timings):
+    with metrics.timed("compare", "template_render"):
+        return render_template('results.html', amazon=amazon_data, flipkart=flipkart_data, timings=timings)
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    for event, value in result_cache.stats().items():
+        metrics.set_gauge("pricecomp_result_cache", value, event=event)
+    for event, value in price_history.stats().items():
+        metrics.set_gauge("pricecomp_price_history", value, event=event)
+    for event, value in single_flight.stats().items():
+        metrics.set_gauge("pricecomp_single_flight", value, event=event)
+    for event, value in prefetcher.stats().items():
+        metrics.set_gauge("pricecomp_prefetch", value, event=event)
+    for event, value in batch_runner.stats().items():
+        metrics.set_gauge("pricecomp_batch", value, event=event)
+    for site, scraper in resilient_scrapers.items():
+        stats = scraper.stats()
+        metrics.set_gauge("pricecomp_breaker_open", int(stats.pop("state") != "closed"), site=site)
+        for event, value in stats.items():
+            if value is not None:
+                metrics.set_gauge("pricecomp_resilience", value, site=site, event=event)
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify(result_cache.stats())
+
+
+@app.route('/resilience/stats')
+def resilience_stats():
+    return jsonify({site: scraper.stats() for site, scraper in resilient_scrapers.items()})
+
+
+@app.route('/singleflight/stats')
+def single_flight_stats():
+    return jsonify(single_flight.stats())
+
+
+def _window_arg():
+    """Reads the optional `hours` query argument as a (since, until) pair of timestamps."""
+    hours = request.args.get("hours", type=float)
+    if hours is None:
+        return None, None
+    now = time.time()
+    return now - hours * 3600, now
+
+
+@app.route('/history')
+def history():
+    query = request.args.get("q")
+    if not query:
+        return jsonify({"error": "Missing query parameter 'q'."}), 400
+    since, until = _window_arg()
+    rows = price_history.history(query, site=request.args.get("site"), since=since, until=until,
+                                 limit=request.args.get("limit", 500, type=int))
+    return jsonify(rows)
+
+
+@app.route('/history/latest')
+def history_latest():
+    query = request.args.get("q")
+    if not query:
+        return jsonify({"error": "Missing query parameter 'q'."}), 400
+    return jsonify(price_history.latest(query))
+
+
+@app.route('/history/cheapest')
+def history_cheapest():
+    query = request.args.get("q")
+    if not query:
+        return jsonify({"error": "Missing query parameter 'q'."}), 400
+    since, until = _window_arg()
+    return jsonify(price_history.cheapest(query, since=since, until=until))
+
+
+@app.route('/history/product')
+def history_product():
+    site, title = request.args.get("site"), request.args.get("title")
+    if not site or not title:
+        return jsonify({"error": "Missing query parameter 'site' or 'title'."}), 400
+    row = price_history.latest_for_product(site, title)
+    if row is None:
+        return jsonify({"error": "No price recorded for that product."}), 404
+    return jsonify(row)
+
+
+@app.route('/watch', methods=['GET', 'POST', 'DELETE'])
+def watch():
+    """Lists (GET), adds (POST) or removes (DELETE) a watched product given as `q`."""
+    if request.method == 'GET':
+        watched = sorted(({"query": query, "demand": demand} for query, demand in watchlist.all().values()),
+                         key=lambda item: -item["demand"])
+        return jsonify({"watched": watched, "scheduler": _scheduler.stats() if _scheduler else None})
+    query = request.values.get("q") or (request.get_json(silent=True) or {}).get("q")
+    if not query:
+        return jsonify({"error": "Missing parameter 'q'."}), 400
+    if request.method == 'POST':
+        if _scheduler:
+            _scheduler.watch(query)
+        else:
+            watchlist.add(query)
+        return jsonify({"watching": query}), 201
+    removed = _scheduler.unwatch(query) if _scheduler else watchlist.remove(query)
+    return jsonify({"removed": removed}), 200 if removed else 404
+
+
+def store_fresh_result(site, query, result):
+    """Makes a background scrape result available to the web path."""
+    result_cache.put(site, query, result)
+    record_price(site, query, result)
+
+
+def record_price(site, query, result):
+    """Records `result` in the price history, unless it is a partial one from a scrape that ran out of time."""
+    if result and result.get("partial"):
+        logging.info(f"Not recording the partial {site} result for '{query}' in the price history.")
+        return
+    price_history.record(site, query, result)
+
+
+watchlist = Watchlist(PRICE_HISTORY_PATH)
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Creates and starts the watched-product scheduler on first use."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler(
+                resilient_scrapers,
+                store_fresh_result,
+                watchlist,
+                last_scraped=price_history.last_observed,
+                refresh_seconds=SCHEDULER_REFRESH_SECONDS,
+                concurrency=SCHEDULER_SITE_CONCURRENCY,
+                rate_per_minute=SCHEDULER_SITE_RATE_PER_MINUTE,
+                timeout=SCRAPE_DEADLINE_SECONDS,
+            )
+            _scheduler.start()
+            atexit.register(_scheduler.stop)
+        return _scheduler
+
+
+def cached_scraper(site, scrape, record=True):
+    """Wraps a site scraper so repeated searches are answered from the result cache or the price history.
+
+    Fresh results are recorded in the price history unless `record` is False (prefetches).
+    """
+    def scrape_and_record(product_name, timeout=None):
+        if PRICE_HISTORY_SERVE_SECONDS > 0:
+            result = price_history.recent_result(site, product_name, PRICE_HISTORY_SERVE_SECONDS)
+            if result:
+                metrics.inc("pricecomp_history_served_total", site=site)
+                return result
+
+        def scrape_once():
+            result = scrape(product_name, timeout=timeout)
+            if record:
+                record_price(site, product_name, result)
+            return result
+        # Concurrent identical searches wait for the first one instead of scraping again
+        return single_flight.do(result_cache.key(site, product_name), scrape_once, timeout=timeout)
+
+    def run(product_name, timeout=None):
+        try:
+            return result_cache.get_or_scrape(site, product_name, scrape_and_record, timeout=timeout)
+        except CircuitOpen as e:
+            return breaker_fallback(site, product_name, e)
+    return run
+
+
+def breaker_fallback(site, product_name, error):
+    """Answers a search for a site whose breaker is open from its last recorded result, marked stale.
+
+    Re-raises `error` when there is none, so the search fails instead of reading as "not found".
+    """
+    metrics.inc("pricecomp_breaker_fallback_total", site=site)
+    result = price_history.recent_result(site, product_name, BREAKER_FALLBACK_MAX_AGE)
+    if result:
+        logging.warning(f"{error} Serving the last recorded {site} result for '{product_name}'.")
+        return dict(result, stale=True)
+    logging.warning(f"{error} No recorded {site} result for '{product_name}' to fall back on.")
+    raise error
+
+
+_worker_group = None
+_worker_group_lock = threading.Lock()
+
+
+def get_worker_group():
+    global _worker_group
+    with _worker_group_lock:
+        if _worker_group is None:
+            _worker_group = WorkerGroup(os.path.join(SCRAPER_DIR, "scraper_worker.py"), size=SCRAPER_WORKERS)
+            atexit.register(_worker_group.stop)
+        return _worker_group
+
+
+def scrape_with_workers(site, product_name, timeout=None):
+    """Runs a site scrape on one of the persistent scraper worker processes."""
+    try:
+        response = get_worker_group().scrape(site, product_name, timeout=timeout)
+    except WorkerError as e:
+        logging.error(f"Error running {site} scrape on worker: {e}")
+        raise ScrapeFailed(f"{site} worker scrape failed: {e}") from e
+    metrics.observe_spans(response.get("spans"))
+    result = response.get("result")
+    logging.info(f"{site.capitalize()} worker result: {result}")
+    return result
+
+
+def scrape_with_pool(site, product_name, timeout=None):
+    """Runs a site scrape in-process: plain HTTP first, then a browser leased from a warm driver pool."""
+    if SCRAPER_DIR not in sys.path:
+        sys.path.insert(0, SCRAPER_DIR)
+    import scrape_runner
+    import tracing
+    trace = tracing.Trace(site)
+    try:
+        return scrape_runner.run_scrape(site, product_name, timeout=timeout, trace=trace)
+    except TimeoutError as e:
+        logging.error(f"{e} Pool stats: {scrape_runner.pool_stats(site)}")
+        raise ScrapeFailed(f"No {site} browser was free: {e}") from e
+    finally:
+        metrics.observe_spans(trace.spans + tracing.drain_background())
+
+
+def scrape_amazon(product_name, timeout=None):
+    if SCRAPER_BACKEND == "worker":
+        return scrape_with_workers("amazon", product_name, timeout=timeout)
+    if SCRAPER_BACKEND == "pool":
+        return scrape_with_pool("amazon", product_name, timeout=timeout)
     try:
-        base_dir = r"C:\Users\Aastha\Desktop\Price_Comp_final"
-        amazon_script_path = os.path.join(base_dir, "amazon_scraping.py")
+        amazon_script_path = os.path.join(SCRAPER_DIR, "amazon_scraping.py")
         # Use sys.executable to ensure the virtual environment's python is used
         amazon_command = [sys.executable, amazon_script_path, product_name]
-        result_str = subprocess.check_output(amazon_command, text=True, stderr=subprocess.PIPE).strip()
+        result_str = subprocess.check_output(amazon_command, text=True, stderr=subprocess.PIPE, timeout=timeout).strip()
         logging.info(f"Amazon scraper raw result: {result_str}")
         if result_str == "null":
             return None
@@ -89,30 +607,34 @@ def scrape_amazon(product_name):
         return result
     except subprocess.CalledProcessError as e:
         logging.error(f"Error running Amazon scraper: {e.output} {e.stderr}")
-        return None
+        raise ScrapeFailed(f"Amazon scraper exited with code {e.returncode}") from e
+    except subprocess.TimeoutExpired as e:
+        logging.error(f"Amazon scraper timed out after {timeout}s.")
+        raise ScrapeFailed(f"Amazon scraper timed out after {timeout}s") from e
     except json.JSONDecodeError as e:
         logging.error(f"Error decoding JSON from Amazon scraper: {e}, Raw Output: '{result_str}'")
-        return None
-    except FileNotFoundError:
+        raise ScrapeFailed(f"Amazon scraper printed invalid JSON: {e}") from e
+    except FileNotFoundError as e:
         logging.error(f"Amazon scraping script not found at {amazon_script_path}. Please check the path.")
-        return None
-    except Exception as e:
-        logging.error(f"General error in scrape_amazon: {e}", exc_info=True)
-        return None
+        raise ScrapeFailed(f"Amazon scraping script not found at {amazon_script_path}") from e
 
 
 # In app.py
-def scrape_flipkart(product_name):
+def scrape_flipkart(product_name, timeout=None):
+    if SCRAPER_BACKEND == "worker":
+        return scrape_with_workers("flipkart", product_name, timeout=timeout)
+    if SCRAPER_BACKEND == "pool":
+        return scrape_with_pool("flipkart", product_name, timeout=timeout)
     try:
-        base_dir = r"C:\Users\Aastha\Desktop\Price_Comp_final"
-        flipkart_script_path = os.path.join(base_dir, "flipkart_scraping.py")
+        flipkart_script_path = os.path.join(SCRAPER_DIR, "flipkart_scraping.py")
         
         # Capture stdout and stderr
         process = subprocess.run(
             [sys.executable, flipkart_script_path, product_name],
             capture_output=True, # Use capture_output for Python 3.7+
             text=True,
-            check=False # Do not raise CalledProcessError immediately
+            check=False, # Do not raise CalledProcessError immediately
+            timeout=timeout
         )
         
         result_str = process.stdout.strip()
@@ -124,22 +646,40 @@ def scrape_flipkart(product_name):
         
         if process.returncode != 0:
             logging.error(f"Flipkart scraper exited with non-zero code {process.returncode}")
-            return None
+            raise ScrapeFailed(f"Flipkart scraper exited with code {process.returncode}")
 
         if result_str == "null":
             return None
         
         result = json.loads(result_str)
         return result
+    except subprocess.TimeoutExpired as e:
+        logging.error(f"Flipkart scraper timed out after {timeout}s.")
+        raise ScrapeFailed(f"Flipkart scraper timed out after {timeout}s") from e
     except json.JSONDecodeError as e:
         logging.error(f"Error decoding JSON from Flipkart scraper: {e}, Raw Output: '{result_str}'")
-        return None
-    except FileNotFoundError:
+        raise ScrapeFailed(f"Flipkart scraper printed invalid JSON: {e}") from e
+    except FileNotFoundError as e:
         logging.error(f"Flipkart scraping script not found at {flipkart_script_path}. Please check the path.")
-        return None
-    except Exception as e:
-        logging.error(f"General error in scrape_flipkart: {e}", exc_info=True)
-        return None
+        raise ScrapeFailed(f"Flipkart scraping script not found at {flipkart_script_path}") from e
+
+resilient_scrapers = {
+    site: ResilientScraper(
+        site,
+        scrape,
+        window=RESILIENCE_WINDOW,
+        min_samples=BREAKER_MIN_SAMPLES,
+        error_threshold=BREAKER_ERROR_RATE,
+        cooldown=BREAKER_COOLDOWN_SECONDS,
+        hedge=HEDGE_ENABLED,
+        hedge_min_seconds=HEDGE_MIN_SECONDS,
+        admission=admission,
+    )
+    for site, scrape in (("amazon", scrape_amazon), ("flipkart", scrape_flipkart))
+}
+
+if SCHEDULER_ENABLED:
+    get_scheduler()
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=8000)
\ No newline at end of file
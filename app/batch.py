@@ -0,0 +1,85 @@
+"""Bulk comparisons for the /api/compare batch endpoint.
+
+Every batch runs on one pool shared by all batches, `workers` comparisons wide, so
+batches together never run more comparisons at once than that, however many are
+in flight. Within that, each batch keeps at most its own `concurrency` items
+running. The site scrapes themselves run on the shared fanout pool, and `compare`
+is expected to take an admission slot for an item that scrapes. A query that appears several times in a batch (after normalization) is
+compared once. Across batches, and with searches from the web pages, the result
+cache and single-flight still share site scrapes. Items are yielded as they finish,
+not in input order.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from result_cache import normalize_query
+
+DEFAULT_WORKERS = 4
+
+
+class BatchRunner:
+    """Runs `compare(query)` for every query of a batch with bounded parallelism."""
+
+    def __init__(self, compare, workers=DEFAULT_WORKERS):
+        self.compare = compare
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch")
+        self._lock = threading.Lock()
+        self.running = 0
+        self.counters = {"batches": 0, "items": 0, "compared": 0, "duplicates": 0, "errors": 0, "abandoned": 0}
+
+    def _count(self, event, amount=1):
+        with self._lock:
+            self.counters[event] += amount
+
+    def _compare(self, query):
+        with self._lock:
+            self.running += 1
+        try:
+            return self.compare(query), None
+        except Exception as e:
+            logging.error(f"Batch comparison of '{query}' failed: {e}", exc_info=True)
+            self._count("errors")
+            return None, str(e)
+        finally:
+            with self._lock:
+                self.running -= 1
+
+    def run(self, queries, concurrency=None):
+        """Yields (index, query, result, error) for every item of `queries` as it finishes.
+
+        `result` is what `compare` returned, or None with `error` set if it raised.
+        Closing the generator early drops the items that have not started yet.
+        """
+        concurrency = min(concurrency or self.workers, self.workers)
+        indexes = {}        # normalized query -> positions in `queries`
+        for index, query in enumerate(queries):
+            indexes.setdefault(normalize_query(query), []).append(index)
+        todo = list(indexes.items())
+        todo.reverse()      # popped from the end, so items start in input order
+        self._count("batches")
+        self._count("items", len(queries))
+        self._count("duplicates", len(queries) - len(indexes))
+
+        running = {}
+        try:
+            while todo or running:
+                while todo and len(running) < concurrency:
+                    _, positions = todo.pop()
+                    running[self._executor.submit(self._compare, queries[positions[0]])] = positions
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    positions = running.pop(future)
+                    result, error = future.result()
+                    self._count("compared")
+                    for index in positions:
+                        yield index, queries[index], result, error
+        finally:
+            if todo or running:
+                self._count("abandoned", sum(len(positions) for _, positions in todo))
+                for future in running:
+                    future.cancel()
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, running=self.running, workers=self.workers)
@@ -0,0 +1,83 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Both site scrapes for one comparison run side by side on this shared pool.
+# Worker threads spend their time waiting on I/O: a worker process, WebDriver
+# calls to a pooled browser, or a plain HTTP fetch, depending on the scraper
+# backend. So the pool can be wider than the number of CPUs.
+FANOUT_MAX_WORKERS = 8
+
+_executor = ThreadPoolExecutor(max_workers=FANOUT_MAX_WORKERS, thread_name_prefix="scrape")
+
+
+def _call(site, scraper, product_name, timeout):
+    """Runs one site scraper and returns (result, status)."""
+    try:
+        result = scraper(product_name, timeout=timeout)
+        return result, "empty" if result is None else "ok"
+    except TimeoutError as e:
+        # e.g. waiting on an identical search that is still running
+        logging.warning(f"Scraper for {site} timed out: {e}")
+        return None, "timeout"
+    except Exception as e:
+        logging.error(f"Scraper for {site} raised: {e}", exc_info=True)
+        return None, "error"
+
+
+def iter_site_scrapes(product_name, scrapers, deadline):
+    """Starts every site scraper at once and yields (site, result, timing) as each one finishes.
+
+    One `deadline` covers the whole comparison, measured from when the scrapes are
+    submitted. A scrape that waited for a free thread gets only what is left of it as
+    its timeout, and one still queued when it passes never starts. Sites that miss the
+    deadline are yielded with a "timeout" status. Timing seconds are measured from
+    submission too, queueing included. `scrapers` and `timing` are as in `run_site_scrapes`.
+    """
+    submitted = time.perf_counter()
+    expires_at = submitted + deadline
+
+    def run(site, scraper):
+        remaining = expires_at - time.perf_counter()
+        result, status = _call(site, scraper, product_name, remaining) if remaining > 0 else (None, "timeout")
+        return result, status, time.perf_counter()
+
+    futures = {_executor.submit(run, site, scraper): site for site, scraper in scrapers.items()}
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=max(0.0, expires_at - time.perf_counter()), return_when=FIRST_COMPLETED)
+        for future in done:
+            result, status, finished = future.result()
+            yield futures[future], result, {"seconds": round(finished - submitted, 3), "status": status}
+        if pending and time.perf_counter() >= expires_at:
+            for future in pending:
+                site = futures[future]
+                if future.cancel():
+                    logging.warning(f"{site} scrape for '{product_name}' waited {deadline}s for a free thread, dropped.")
+                else:
+                    logging.warning(f"{site} scrape missed the {deadline}s deadline for '{product_name}'.")
+                yield site, None, {"seconds": round(time.perf_counter() - submitted, 3), "status": "timeout"}
+            pending = set()
+
+
+def run_site_scrapes(product_name, scrapers, deadline):
+    """Starts every site scraper at once and waits for all of them under one shared deadline.
+
+    `scrapers` maps a site name to a callable taking (product_name, timeout=...).
+    Returns (results, timings): results maps site -> scraped dict or None, timings maps
+    site -> {"seconds": float, "status": "ok" | "empty" | "error" | "timeout"}.
+    """
+    started = time.perf_counter()
+    results = {}
+    timings = {}
+    for site, result, timing in iter_site_scrapes(product_name, scrapers, deadline):
+        results[site] = result
+        timings[site] = timing
+
+    total = time.perf_counter() - started
+    slowest = max(timings, key=lambda s: timings[s]["seconds"]) if timings else None
+    logging.info(
+        f"Site scrapes for '{product_name}' finished in {total:.2f}s "
+        f"(bottleneck: {slowest}) timings={timings}"
+    )
+    return results, timings
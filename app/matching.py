@@ -0,0 +1,187 @@
+"""Cross-site product matching.
+
+Each scraper returns its top few candidates; `best_match` scores every Amazon
+title against every Flipkart title in one call and keeps the closest pair, so a
+near-miss on the first result no longer ends the comparison.
+
+Titles are parsed once (and cached) into a normalized core plus structured
+fields: quantity, pack count, storage, RAM, colours and variant words. Two titles
+whose fields disagree, e.g. 1 kg vs 2 kg, a single pack vs a pack of 2, 128 GB vs
+256 GB, or "Galaxy S24" vs "Galaxy S24 Ultra", never match however close the rest
+of the text is. Cores are compared symmetrically, so words on only one side ("Back
+Cover", "Seeds", "Cookies") lower the score; only known descriptor words are left
+out of the core. The scoring backend is chosen with `MATCHER_BACKEND`.
+"""
+import logging
+import os
+import re
+from collections import namedtuple
+from functools import lru_cache
+import numpy as np
+from rapidfuzz import fuzz, process
+
+try:
+    from fuzzywuzzy import fuzz as legacy_fuzz
+except ImportError:  # only needed for the legacy backend and the benchmark
+    legacy_fuzz = None
+
+MATCH_THRESHOLD = 80
+MATCHER_BACKEND = os.environ.get("MATCHER_BACKEND", "rapidfuzz")
+TITLE_CACHE_SIZE = 4096
+
+# Units folded into one base unit so "1kg", "1000 g" and "1 Kilogram" compare equal
+_UNITS = {
+    "kg": ("g", 1000), "kgs": ("g", 1000), "kilo": ("g", 1000), "kilogram": ("g", 1000), "kilograms": ("g", 1000),
+    "g": ("g", 1), "gm": ("g", 1), "gms": ("g", 1), "gram": ("g", 1), "grams": ("g", 1),
+    "l": ("ml", 1000), "ltr": ("ml", 1000), "litre": ("ml", 1000), "litres": ("ml", 1000), "liter": ("ml", 1000), "liters": ("ml", 1000),
+    "ml": ("ml", 1),
+}
+_STORAGE_UNITS = {"gb": 1, "tb": 1024}
+COLORS = {
+    "black", "white", "blue", "red", "green", "yellow", "pink", "purple", "violet", "orange", "grey", "gray",
+    "silver", "gold", "brown", "beige", "navy", "maroon", "teal", "cyan", "graphite", "midnight", "starlight",
+}
+COLOR_BITS = {color: 1 << bit for bit, color in enumerate(sorted(COLORS))}
+# Model words too short to pull a long title under the threshold on their own ("Galaxy S24" vs "Galaxy S24 Ultra")
+VARIANT_WORDS = {"pro", "max", "plus", "ultra", "lite", "mini", "neo", "fe", "chips", "sweet"}
+# Words that say nothing about which product it is
+FILLER_WORDS = {"pack", "of", "the", "and", "with", "for", "a", "an", "in", "combo", "pcs", "pieces", "piece", "storage"}
+# Descriptors one site adds to the same product. Any other word on one side only counts against
+# a match, so an unknown word makes a pair fail to match rather than match the wrong product.
+DESCRIPTOR_WORDS = {"fresh", "iodized", "iodised", "pasteurised", "pasteurized", "bathing", "anticavity", "namkeen",
+                    "original", "premium", "new"}
+
+_NETWORK = re.compile(r"\b([2345])g\b")  # "5G" phones, not 5 grams
+_RAM = re.compile(r"\b(\d+(?:\.\d+)?)\s*(gb|tb)\s*ram\b")
+_STORAGE = re.compile(r"\b(\d+(?:\.\d+)?)\s*(gb|tb)\b")
+_QUANTITY = re.compile(r"\b(\d+(?:\.\d+)?)\s*(" + "|".join(sorted(_UNITS, key=len, reverse=True)) + r")\b")
+_PACK = re.compile(r"\bpack\s+of\s+(\d+)\b|\b(\d+)\s*(?:x|pcs|pieces|pack)\b|\bx\s*(\d+)\b")
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+ParsedTitle = namedtuple("ParsedTitle", "core quantity pack storage ram colors variants")
+
+
+@lru_cache(maxsize=TITLE_CACHE_SIZE)
+def parse_title(title):
+    """Splits a product title into a normalized, token-sorted core and its structured spec fields."""
+    text = (title or "").lower().replace(",", " ")
+    text = _NETWORK.sub(r"network\1g", text)
+
+    ram = None
+    for amount, unit in _RAM.findall(text):
+        ram = float(amount) * _STORAGE_UNITS[unit]
+    text = _RAM.sub(" ", text)
+
+    storage = None
+    for amount, unit in _STORAGE.findall(text):
+        storage = float(amount) * _STORAGE_UNITS[unit]
+    text = _STORAGE.sub(" ", text)
+
+    quantity = None
+    for amount, unit in _QUANTITY.findall(text):
+        base_unit, factor = _UNITS[unit]
+        quantity = f"{float(amount) * factor:g}{base_unit}"
+    text = _QUANTITY.sub(" ", text)
+
+    pack = None
+    for counts in _PACK.findall(text):
+        pack = float(next(count for count in counts if count))
+    text = _PACK.sub(" ", text)
+
+    tokens = _TOKEN.findall(text)
+    colors = frozenset(token for token in tokens if token in COLORS)
+    variants = frozenset(token for token in tokens if token in VARIANT_WORDS)
+    core = " ".join(sorted({token for token in tokens
+                            if token not in COLORS and token not in FILLER_WORDS and token not in DESCRIPTOR_WORDS}))
+    return ParsedTitle(core, quantity, pack, storage, ram, colors, variants)
+
+
+def _codes(values, count):
+    """Integer codes of `values` (None -> -1) split into a column for the first `count` and a row for the rest."""
+    ids = {}
+    codes = np.array([-1 if value is None else ids.setdefault(value, len(ids)) for value in values])
+    return codes[:count, None], codes[None, count:]
+
+
+def contradictions(left, right):
+    """N x M booleans, True where two parsed titles contradict each other, computed without a per-pair loop.
+
+    They contradict when they disagree on a spec both state, on the pack count (an unstated one
+    is a single pack), on their variant words, or on colours when both name some.
+    """
+    count = len(left)
+    titles = left + right
+    conflict = np.zeros((len(left), len(right)), dtype=bool)
+    for field in ("quantity", "storage", "ram"):
+        a, b = _codes([getattr(t, field) for t in titles], count)
+        conflict |= (a >= 0) & (b >= 0) & (a != b)
+    for values in ([t.pack or 1.0 for t in titles], [t.variants for t in titles]):
+        a, b = _codes(values, count)
+        conflict |= a != b
+    masks = np.array([sum(COLOR_BITS[color] for color in t.colors) for t in titles], dtype=np.int64)
+    a, b = masks[:count, None], masks[None, count:]
+    conflict |= (a != 0) & (b != 0) & ((a & b) == 0)
+    return conflict
+
+
+def rapidfuzz_scores(left_titles, right_titles):
+    """Scores parsed titles with rapidfuzz's C implementation in one batched call.
+
+    `token_sort_ratio` is symmetric: a word on either side only ("Seeds", "Back Cover") lowers
+    the score, where `token_set_ratio` scored any subset of the other title's words as 100.
+    Titles whose structured fields contradict each other score 0.
+    """
+    left = [parse_title(title) for title in left_titles]
+    right = [parse_title(title) for title in right_titles]
+    scores = process.cdist([t.core for t in left], [t.core for t in right], scorer=fuzz.token_sort_ratio, workers=-1)
+    scores = scores.astype(float)
+    scores[contradictions(left, right)] = 0.0
+    return scores
+
+
+def fuzzywuzzy_scores(left_titles, right_titles):
+    """The original matcher: pure-Python `fuzz.ratio` on lowercased raw titles, pair by pair."""
+    if legacy_fuzz is None:
+        raise RuntimeError("The fuzzywuzzy matcher backend needs the fuzzywuzzy package installed.")
+    return np.array([[float(legacy_fuzz.ratio(a.lower(), b.lower())) for b in right_titles] for a in left_titles])
+
+
+BACKENDS = {
+    "rapidfuzz": rapidfuzz_scores,
+    "fuzzywuzzy": fuzzywuzzy_scores,
+}
+
+
+def score_matrix(left_titles, right_titles, backend=None):
+    """Returns an N x M array of 0-100 similarity scores using the named (or configured) backend."""
+    name = backend or MATCHER_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown matcher backend: {name!r}")
+    return BACKENDS[name](left_titles, right_titles)
+
+
+def candidates_of(site_data):
+    """Returns the candidate list of one site's result, or just the result itself for older payloads."""
+    if not site_data:
+        return []
+    candidates = site_data.get("candidates") or [site_data]
+    return [candidate for candidate in candidates if candidate.get("title")]
+
+
+def best_match(amazon_candidates, flipkart_candidates, threshold=MATCH_THRESHOLD, backend=None):
+    """Returns (amazon_candidate, flipkart_candidate, score) of the most similar pair, or None below `threshold`."""
+    if not amazon_candidates or not flipkart_candidates:
+        return None
+    scores = score_matrix(
+        [candidate["title"] for candidate in amazon_candidates],
+        [candidate["title"] for candidate in flipkart_candidates],
+        backend=backend,
+    )
+    # Earlier (higher-ranked) candidates win ties since argmax returns the first maximum
+    i, j = divmod(int(scores.argmax()), scores.shape[1])
+    score = float(scores[i, j])
+    logging.info(f"Best title match {score:.1f} between Amazon #{i+1} and Flipkart #{j+1} "
+                 f"({len(amazon_candidates)}x{len(flipkart_candidates)} candidates)")
+    if score < threshold:
+        return None
+    return amazon_candidates[i], flipkart_candidates[j], score
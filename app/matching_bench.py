@@ -0,0 +1,58 @@
+"""Micro-benchmark of the title matcher backends.
+
+Scores every labeled pair in a title corpus with each backend and reports accuracy
+at the match threshold and throughput. Run from the `app` directory:
+
+    python matching_bench.py ../fixtures/title_pairs.json --rounds 200
+"""
+import argparse
+import json
+import time
+import matching
+
+
+def evaluate(backend, pairs, threshold):
+    """Returns (true positives, false positives, false negatives, correct) for `backend` on `pairs`."""
+    tp = fp = fn = correct = 0
+    for pair in pairs:
+        score = matching.score_matrix([pair["amazon"]], [pair["flipkart"]], backend=backend)[0, 0]
+        predicted = score >= threshold
+        correct += predicted == pair["same"]
+        tp += predicted and pair["same"]
+        fp += predicted and not pair["same"]
+        fn += not predicted and pair["same"]
+    return tp, fp, fn, correct
+
+
+def throughput(backend, pairs, rounds):
+    """Scores the corpus as one N x M grid `rounds` times; returns title comparisons per second."""
+    amazon_titles = [pair["amazon"] for pair in pairs]
+    flipkart_titles = [pair["flipkart"] for pair in pairs]
+    matching.parse_title.cache_clear()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        matching.score_matrix(amazon_titles, flipkart_titles, backend=backend)
+    elapsed = time.perf_counter() - started
+    return rounds * len(amazon_titles) * len(flipkart_titles) / elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare matcher backends on a labeled title corpus.")
+    parser.add_argument("corpus", help="JSON list of {\"amazon\", \"flipkart\", \"same\"} title pairs.")
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--threshold", type=float, default=matching.MATCH_THRESHOLD)
+    parser.add_argument("--backend", action="append", choices=sorted(matching.BACKENDS),
+                        help="Backend to run; repeat for several. Defaults to all of them.")
+    args = parser.parse_args()
+
+    with open(args.corpus, encoding="utf-8") as f:
+        pairs = json.load(f)
+
+    print(f"{len(pairs)} labeled pairs, threshold {args.threshold:g}")
+    print(f"{'backend':<12} {'accuracy':>9} {'precision':>10} {'recall':>7} {'pairs/s':>12}")
+    for backend in args.backend or sorted(matching.BACKENDS):
+        tp, fp, fn, correct = evaluate(backend, pairs, args.threshold)
+        precision = tp / (tp + fp) if tp + fp else 0.0
+        recall = tp / (tp + fn) if tp + fn else 0.0
+        rate = throughput(backend, pairs, args.rounds)
+        print(f"{backend:<12} {correct / len(pairs):>9.1%} {precision:>10.1%} {recall:>7.1%} {rate:>12,.0f}")
@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds in seconds; scrape phases range from milliseconds to minutes.
+LATENCY_BUCKETS = [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120]
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = defaultdict(float)
+_gauges = {}
+
+
+class _Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+
+
+def observe_phase(site, phase, seconds, ok=True):
+    """Records one timed phase and counts it as a success or failure."""
+    with _lock:
+        key = (site, phase)
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = _Histogram()
+        histogram.observe(seconds)
+        _counters[("pricecomp_phase_total", (("site", site), ("phase", phase), ("outcome", "success" if ok else "failure")))] += 1
+
+
+def observe_spans(spans):
+    for span in spans or []:
+        site = span.get("site", "unknown")
+        if "page" in span:
+            observe_page(site, span["page"])
+            if span["page"].get("dom_content_loaded_ms") is None:
+                continue    # No load timing over plain HTTP, only the weight
+        observe_phase(site, span.get("phase", "unknown"), span.get("seconds", 0.0), span.get("ok", True))
+
+
+def observe_page(site, page):
+    """Counts the bytes and requests of one scraped page (see tracing.page)."""
+    inc("pricecomp_page_loads_total", site=site)
+    inc("pricecomp_page_bytes_total", page.get("bytes", 0), site=site)
+    for field, outcome in (("requests", "loaded"), ("blocked", "blocked"), ("failed", "failed")):
+        inc("pricecomp_page_requests_total", page.get(field, 0), site=site, outcome=outcome)
+
+
+def inc(name, amount=1, **labels):
+    with _lock:
+        _counters[(name, tuple(sorted(labels.items())))] += amount
+
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _gauges[(name, tuple(sorted(labels.items())))] = value
+
+
+@contextmanager
+def timed(site, phase):
+    """Times the block as one phase; an exception marks it as a failure."""
+    started = time.perf_counter()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        observe_phase(site, phase, time.perf_counter() - started, ok)
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def render():
+    """Prometheus text exposition of everything recorded so far."""
+    lines = [
+        "# HELP pricecomp_phase_seconds Latency of each scrape and comparison phase.",
+        "# TYPE pricecomp_phase_seconds histogram",
+    ]
+    with _lock:
+        for (site, phase), histogram in sorted(_histograms.items()):
+            base = (("site", site), ("phase", phase))
+            for bound, bucket_count in zip(LATENCY_BUCKETS, histogram.buckets):
+                lines.append(f"pricecomp_phase_seconds_bucket{_labels(base + (('le', bound),))} {bucket_count}")
+            lines.append(f"pricecomp_phase_seconds_bucket{_labels(base + (('le', '+Inf'),))} {histogram.count}")
+            lines.append(f"pricecomp_phase_seconds_sum{_labels(base)} {histogram.sum:.6f}")
+            lines.append(f"pricecomp_phase_seconds_count{_labels(base)} {histogram.count}")
+
+        seen = set()
+        for (name, labels), value in sorted(_counters.items()):
+            if name not in seen:
+                lines.append(f"# TYPE {name} counter")
+                seen.add(name)
+            lines.append(f"{name}{_labels(labels)} {value:g}")
+        for (name, labels), value in sorted(_gauges.items()):
+            if name not in seen:
+                lines.append(f"# TYPE {name} gauge")
+                seen.add(name)
+            lines.append(f"{name}{_labels(labels)} {value:g}")
+    return "\n".join(lines) + "\n"
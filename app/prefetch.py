@@ -0,0 +1,85 @@
+"""Speculative prefetch of searches the user is still typing.
+
+The home page reports the search box text once it has been stable for a moment.
+Each browser tab keeps at most one pending prefetch: newer text replaces the older
+one before it starts. Prefetches run on a small pool of their own, newest first,
+and each one starts only once it can take a free admission slot without queueing,
+so they never compete with searches users have actually submitted. A prefetch that
+waited too long is dropped.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_WORKERS = 1
+DEFAULT_MAX_PENDING = 100
+DEFAULT_MAX_AGE = 30            # Seconds a queued prefetch stays worth running
+BUSY_RECHECK_SECONDS = 0.5
+
+
+class Prefetcher:
+    """Runs `fetch(query)` for the latest text of each client, holding a slot taken with `admission.try_acquire()`."""
+
+    def __init__(self, fetch, admission, workers=DEFAULT_WORKERS, max_pending=DEFAULT_MAX_PENDING, max_age=DEFAULT_MAX_AGE):
+        self.fetch = fetch
+        self.admission = admission
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_age = max_age
+        self._pending = OrderedDict()   # client -> (query, queued_at), oldest first
+        self._cond = threading.Condition()
+        self._started = False
+        self.counters = {"queued": 0, "superseded": 0, "dropped": 0, "expired": 0, "started": 0, "busy": 0, "errors": 0}
+
+    def _start(self):
+        for i in range(self.workers):
+            threading.Thread(target=self._work, name=f"prefetch-{i}", daemon=True).start()
+        self._started = True
+
+    def submit(self, client, query):
+        """Queues `query` for `client`, replacing that client's prefetch if it has not started yet."""
+        with self._cond:
+            if not self._started:
+                self._start()
+            if self._pending.pop(client, None) is not None:
+                self.counters["superseded"] += 1
+            self._pending[client] = (query, time.monotonic())
+            self.counters["queued"] += 1
+            while len(self._pending) > self.max_pending:
+                self._pending.popitem(last=False)
+                self.counters["dropped"] += 1
+            self._cond.notify()
+
+    def _next(self):
+        with self._cond:
+            while True:
+                while not self._pending:
+                    self._cond.wait()
+                if not self.admission.try_acquire():
+                    self.counters["busy"] += 1
+                    self._cond.wait(BUSY_RECHECK_SECONDS)
+                    continue
+                _, (query, queued_at) = self._pending.popitem(last=True)
+                if time.monotonic() - queued_at > self.max_age:
+                    self.admission.release()
+                    self.counters["expired"] += 1
+                    continue
+                self.counters["started"] += 1
+                return query
+
+    def _work(self):
+        while True:
+            query = self._next()
+            try:
+                self.fetch(query)
+            except Exception as e:
+                with self._cond:
+                    self.counters["errors"] += 1
+                logging.warning(f"Prefetch of '{query}' failed: {e}")
+            finally:
+                self.admission.release()
+
+    def stats(self):
+        with self._cond:
+            return dict(self.counters, pending=len(self._pending))
@@ -0,0 +1,187 @@
+"""Embedded price-history store.
+
+Every scrape result is queued in memory and written to SQLite (WAL mode) by a
+background thread in batched transactions, so recording a price never blocks the
+request that produced it. Each site result is stored as one row per candidate;
+`rank` 0 is the result the site put first.
+"""
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from result_cache import normalize_query
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_FLUSH_INTERVAL = 1.0     # Seconds the writer waits to fill a batch
+DEFAULT_MAX_PENDING = 10000      # Queued rows beyond this are dropped rather than blocking
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS prices ("
+    "id INTEGER PRIMARY KEY, query TEXT NOT NULL, site TEXT NOT NULL, rank INTEGER NOT NULL, "
+    "title TEXT, price REAL, link TEXT, observed_at REAL NOT NULL)",
+    # Latest observation of a query on one site, and a site's price over time
+    "CREATE INDEX IF NOT EXISTS prices_query_site_time ON prices (query, site, observed_at)",
+    # Cheapest site within a time window (covering, so the table itself is never read)
+    "CREATE INDEX IF NOT EXISTS prices_query_window ON prices (query, rank, observed_at, site, price)",
+    # Latest price of one product, looked up by its title
+    "CREATE INDEX IF NOT EXISTS prices_product_time ON prices (site, title, observed_at)",
+]
+
+COLUMNS = ("query", "site", "rank", "title", "price", "link", "observed_at")
+
+
+class PriceHistory:
+    def __init__(self, path, batch_size=DEFAULT_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 max_pending=DEFAULT_MAX_PENDING):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = queue.Queue(maxsize=max_pending)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.counters = {"recorded": 0, "written": 0, "batches": 0, "dropped": 0, "write_errors": 0}
+        with self._connect() as conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+        self._writer = threading.Thread(target=self._write_loop, name="price-history-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    # --- Writing ---
+
+    def record(self, site, query, result, observed_at=None):
+        """Queues `site`'s scrape result for `query`; returns immediately. `None` results are ignored."""
+        if not result:
+            return
+        observed_at = observed_at or time.time()
+        query = normalize_query(query)
+        for rank, candidate in enumerate(result.get("candidates") or [result]):
+            row = (query, site, rank, candidate.get("title"), candidate.get("price"), candidate.get("link"), observed_at)
+            try:
+                self._pending.put_nowait(row)
+                self._count("recorded")
+            except queue.Full:
+                self._count("dropped")
+
+    def _write_loop(self):
+        while True:
+            batch = [self._pending.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, batch):
+        try:
+            with self._connect() as conn:
+                conn.executemany(
+                    f"INSERT INTO prices ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})", batch
+                )
+            self._count("written", len(batch))
+            self._count("batches")
+        except sqlite3.Error as e:
+            self._count("write_errors")
+            logging.error(f"Could not write {len(batch)} price history rows: {e}")
+        finally:
+            for _ in batch:
+                self._pending.task_done()
+
+    def flush(self):
+        """Blocks until every queued row has been written (or failed)."""
+        self._pending.join()
+
+    # --- Reading ---
+
+    def _rows(self, sql, params):
+        return [dict(row) for row in self._connect().execute(sql, params).fetchall()]
+
+    def recent_result(self, site, query, max_age):
+        """Rebuilds `site`'s latest result for `query` if it was observed within `max_age` seconds, else None."""
+        observed_at = self.last_observed(site, query)
+        query = normalize_query(query)
+        if observed_at is None or time.time() - observed_at > max_age:
+            return None
+        candidates = self._rows(
+            "SELECT title, price, link FROM prices WHERE query = ? AND site = ? AND observed_at = ? ORDER BY rank",
+            (query, site, observed_at),
+        )
+        if not candidates:
+            return None
+        return dict(candidates[0], candidates=candidates)
+
+    def last_observed(self, site, query):
+        """Timestamp of the newest result recorded for `query` on `site`, or None."""
+        return self._connect().execute(
+            "SELECT MAX(observed_at) FROM prices WHERE query = ? AND site = ?", (normalize_query(query), site)
+        ).fetchone()[0]
+
+    def latest(self, query):
+        """Most recent top result of `query` on every site it was scraped from."""
+        return self._rows(
+            "SELECT p.site, p.title, p.price, p.link, p.observed_at FROM prices p "
+            "JOIN (SELECT site, MAX(observed_at) AS observed_at FROM prices WHERE query = ? GROUP BY site) newest "
+            "ON p.site = newest.site AND p.observed_at = newest.observed_at "
+            "WHERE p.query = ? AND p.rank = 0 ORDER BY p.site",
+            (normalize_query(query), normalize_query(query)),
+        )
+
+    def history(self, query, site=None, since=None, until=None, limit=500):
+        """Top-result prices of `query` over time, oldest first, optionally for one site and time window."""
+        sql = "SELECT site, title, price, link, observed_at FROM prices WHERE query = ? AND rank = 0"
+        params = [normalize_query(query)]
+        if site:
+            sql += " AND site = ?"
+            params.append(site)
+        if since is not None:
+            sql += " AND observed_at >= ?"
+            params.append(since)
+        if until is not None:
+            sql += " AND observed_at <= ?"
+            params.append(until)
+        sql += " ORDER BY observed_at DESC LIMIT ?"
+        params.append(limit)
+        return list(reversed(self._rows(sql, params)))
+
+    def cheapest(self, query, since=None, until=None):
+        """Lowest top-result price per site for `query` within the window, cheapest site first."""
+        return self._rows(
+            "SELECT site, MIN(price) AS price, COUNT(*) AS observations FROM prices "
+            "WHERE query = ? AND rank = 0 AND observed_at BETWEEN ? AND ? AND price IS NOT NULL "
+            "GROUP BY site ORDER BY price",
+            (normalize_query(query), since if since is not None else 0, until if until is not None else time.time()),
+        )
+
+    def latest_for_product(self, site, title):
+        """Most recent observation of the product titled `title` on `site`, or None."""
+        rows = self._rows(
+            "SELECT site, title, price, link, observed_at FROM prices "
+            "WHERE site = ? AND title = ? ORDER BY observed_at DESC LIMIT 1",
+            (site, title),
+        )
+        return rows[0] if rows else None
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        stats["pending"] = self._pending.qsize()
+        return stats
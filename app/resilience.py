@@ -0,0 +1,214 @@
+"""Hedged scrapes and a circuit breaker per site.
+
+`ResilientScraper` wraps one site's scraper and remembers the latency and outcome of
+its last `window` attempts. An attempt still running after the site's p95 latency gets
+a hedged second attempt, and the first one to come back without an error wins. A hedge
+is another browser, so with an `admission` controller it needs a free scrape slot
+(`try_acquire`) and is skipped when there is none. When the
+failure rate over the window reaches `error_threshold`, the breaker opens: calls fail
+fast with `CircuitOpen` for `cooldown` seconds, so callers answer from older data
+instead of waiting for a site that is down. After the cooldown, a single trial call
+decides whether the breaker closes again.
+
+Scrapers raise when they fail and return None only when the site has no match, so a
+None result counts as a success here. An exception or a missed deadline is a failure,
+and a call none of whose attempts succeeded raises `ScrapeFailed`.
+"""
+import logging
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from result_cache import ScrapeFailed
+
+DEFAULT_WINDOW = 50
+DEFAULT_MIN_SAMPLES = 10
+DEFAULT_ERROR_THRESHOLD = 0.5
+DEFAULT_COOLDOWN = 60
+DEFAULT_HEDGE_MIN_SECONDS = 1.0    # Never hedge sooner than this, however fast the site usually is
+DEFAULT_MAX_HEDGES = 2             # Hedged attempts allowed in flight at once per site
+ATTEMPT_WORKERS = 16
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpen(Exception):
+    def __init__(self, site, retry_in):
+        super().__init__(f"{site} circuit is open; retrying in {retry_in:.0f}s.")
+        self.site = site
+        self.retry_in = retry_in
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of an unsorted list."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+
+class ResilientScraper:
+    """Calls `scrape(product_name, timeout=...)` with hedging and a circuit breaker."""
+
+    def __init__(self, site, scrape, window=DEFAULT_WINDOW, min_samples=DEFAULT_MIN_SAMPLES,
+                 error_threshold=DEFAULT_ERROR_THRESHOLD, cooldown=DEFAULT_COOLDOWN, hedge=True,
+                 hedge_min_seconds=DEFAULT_HEDGE_MIN_SECONDS, max_hedges=DEFAULT_MAX_HEDGES, admission=None):
+        self.site = site
+        self.scrape = scrape
+        self.min_samples = min_samples
+        self.error_threshold = error_threshold
+        self.cooldown = cooldown
+        self.hedge = hedge
+        self.hedge_min_seconds = hedge_min_seconds
+        self.max_hedges = max_hedges
+        self.admission = admission
+        self._samples = deque(maxlen=window)    # (seconds, ok) per finished attempt
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = None
+        self._hedges_in_flight = 0
+        self._executor = ThreadPoolExecutor(max_workers=ATTEMPT_WORKERS, thread_name_prefix=f"{site}-attempt")
+        self.counters = {"calls": 0, "attempts": 0, "failures": 0, "hedges": 0, "hedges_busy": 0, "hedge_wins": 0, "rejected": 0,
+                         "opened": 0, "closed": 0}
+
+    # --- Latency and errors ---
+
+    def _record(self, seconds, ok):
+        with self._lock:
+            self._samples.append((seconds, ok))
+            self.counters["attempts"] += 1
+            if not ok:
+                self.counters["failures"] += 1
+            if self._state == CLOSED and len(self._samples) >= self.min_samples \
+                    and self._error_rate() >= self.error_threshold:
+                self._open("error rate %.0f%%" % (100 * self._error_rate()))
+
+    def _error_rate(self):
+        return sum(1 for _, ok in self._samples if not ok) / len(self._samples) if self._samples else 0.0
+
+    def hedge_delay(self):
+        """Seconds to wait before hedging: the p95 of successful attempts, or None until enough are known."""
+        with self._lock:
+            latencies = [seconds for seconds, ok in self._samples if ok]
+        if len(latencies) < self.min_samples:
+            return None
+        return max(self.hedge_min_seconds, percentile(latencies, 0.95))
+
+    # --- Breaker ---
+
+    def _open(self, reason):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self.counters["opened"] += 1
+        logging.warning(f"[{self.site}] Circuit opened ({reason}); failing fast for {self.cooldown}s.")
+
+    def _admit(self):
+        """Returns True for a half-open trial call, False for a normal one; raises while open."""
+        with self._lock:
+            if self._state == CLOSED:
+                return False
+            waited = time.monotonic() - self._opened_at
+            if self._state == OPEN and waited >= self.cooldown:
+                self._state = HALF_OPEN
+                logging.info(f"[{self.site}] Circuit half-open, sending a trial scrape.")
+                return True
+            self.counters["rejected"] += 1
+            raise CircuitOpen(self.site, max(0.0, self.cooldown - waited))
+
+    def _settle_trial(self, ok):
+        with self._lock:
+            if ok:
+                self._state = CLOSED
+                self._samples.clear()   # the failures that opened the breaker no longer apply
+                self.counters["closed"] += 1
+                logging.info(f"[{self.site}] Trial scrape succeeded, circuit closed.")
+            else:
+                self._open("trial scrape failed")
+
+    # --- Calls ---
+
+    def _attempt(self, product_name, timeout, hedged):
+        started = time.perf_counter()
+        ok = False
+        try:
+            result = self.scrape(product_name, timeout=timeout)
+            ok = True
+            return result
+        except Exception as e:
+            logging.warning(f"[{self.site}] Scrape attempt for '{product_name}' raised: {e}")
+            raise
+        finally:
+            if hedged:
+                with self._lock:
+                    self._hedges_in_flight -= 1
+                if self.admission is not None:
+                    self.admission.release()
+            self._record(time.perf_counter() - started, ok)
+
+    def _start_hedge(self):
+        with self._lock:
+            if self._hedges_in_flight >= self.max_hedges:
+                return False
+            if self.admission is not None and not self.admission.try_acquire():
+                self.counters["hedges_busy"] += 1
+                return False
+            self._hedges_in_flight += 1
+            self.counters["hedges"] += 1
+        return True
+
+    def __call__(self, product_name, timeout=None):
+        trial = self._admit()
+        with self._lock:
+            self.counters["calls"] += 1
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+        first = self._executor.submit(self._attempt, product_name, timeout, False)
+        pending = {first}
+        hedge_at = None
+        if self.hedge and not trial:
+            delay = self.hedge_delay()
+            hedge_at = None if delay is None else started + delay
+
+        winner = None
+        error = None
+        while pending:
+            now = time.monotonic()
+            wake_at = min(t for t in (hedge_at, deadline) if t is not None) if (hedge_at or deadline) else None
+            done, pending = wait(pending, timeout=None if wake_at is None else max(0, wake_at - now),
+                                 return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    winner = winner or future
+                else:
+                    error = future.exception()
+            if winner is not None:
+                if winner is not first:
+                    with self._lock:
+                        self.counters["hedge_wins"] += 1
+                    logging.info(f"[{self.site}] Hedged scrape of '{product_name}' beat the original.")
+                break
+            now = time.monotonic()
+            if deadline is not None and now >= deadline and pending:
+                logging.warning(f"[{self.site}] Scrape of '{product_name}' missed its {timeout}s deadline.")
+                error = ScrapeFailed(f"{self.site} scrape of '{product_name}' missed its {timeout}s deadline.")
+                break
+            if hedge_at is not None and now >= hedge_at and pending:
+                hedge_at = None
+                if self._start_hedge():
+                    remaining = None if deadline is None else deadline - now
+                    logging.info(f"[{self.site}] '{product_name}' is past p95 after {now - started:.1f}s, hedging.")
+                    pending.add(self._executor.submit(self._attempt, product_name, remaining, True))
+
+        if trial:
+            self._settle_trial(winner is not None)
+        if winner is None:
+            raise error
+        return winner.result()
+
+    def stats(self):
+        with self._lock:
+            samples = list(self._samples)
+            stats = dict(self.counters, state=self._state, samples=len(samples), error_rate=round(self._error_rate(), 3))
+        latencies = [seconds for seconds, ok in samples if ok]
+        stats["p50_seconds"] = round(percentile(latencies, 0.50), 3) if latencies else None
+        stats["p95_seconds"] = round(percentile(latencies, 0.95), 3) if latencies else None
+        return stats
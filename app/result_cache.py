@@ -0,0 +1,208 @@
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_HIT_TTL = 15 * 60        # Seconds a found product is served as fresh
+DEFAULT_NEGATIVE_TTL = 2 * 60    # Seconds a `null` result is served as fresh
+DEFAULT_STALE_TTL = 60 * 60      # Extra seconds an expired entry may be served while it refreshes
+DEFAULT_PARTIAL_TTL = 60         # Seconds a partial result (the scrape ran out of time) is served
+
+
+class ScrapeFailed(Exception):
+    """Raised by a scraper that could not tell whether the site has the product. Never cached."""
+
+
+def normalize_query(query):
+    """Case-, whitespace- and token-order-insensitive form of a search query."""
+    tokens = re.findall(r"\w+", (query or "").lower())
+    return " ".join(sorted(tokens))
+
+
+class MemoryBackend:
+    """In-process LRU store of cache entries."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskBackend:
+    """SQLite-backed LRU store, shared by every process that points at the same file."""
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self.evictions = 0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT, stored_at REAL, last_access REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_last_access ON cache (last_access)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._connect()
+        row = conn.execute("SELECT value, stored_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        with conn:
+            conn.execute("UPDATE cache SET last_access = ? WHERE key = ?", (time.time(), key))
+        return {"value": json.loads(row[0]), "stored_at": row[1]}
+
+    def set(self, key, entry):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, stored_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(entry["value"]), entry["stored_at"], time.time()),
+            )
+            evicted = conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                "SELECT key FROM cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+        self.evictions += max(evicted, 0)
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+class ResultCache:
+    """Per-site scrape result cache keyed by normalized query.
+
+    Found products and `None` results have separate TTLs. Once an entry expires it is
+    still served for `stale_ttl` seconds while a background refresh replaces it.
+    Partial results (marked "partial" by a scrape that ran out of time) only live for
+    `partial_ttl` and are never served stale. With an `admission` controller, a refresh
+    only starts if it can take a free scrape slot (`try_acquire`); otherwise the stale
+    entry is served as is and a later hit tries again.
+    Scrapers return None only when the site has no match; a failed scrape raises, so it
+    is neither negative-cached nor allowed to replace a stale entry.
+    """
+
+    def __init__(self, backend, hit_ttl=DEFAULT_HIT_TTL, negative_ttl=DEFAULT_NEGATIVE_TTL, stale_ttl=DEFAULT_STALE_TTL,
+                 partial_ttl=DEFAULT_PARTIAL_TTL, admission=None):
+        self.backend = backend
+        self.hit_ttl = hit_ttl
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+        self.partial_ttl = partial_ttl
+        self.admission = admission
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "negative_hits": 0, "misses": 0, "stale": 0, "refreshes": 0, "refresh_errors": 0,
+                         "refreshes_busy": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    @staticmethod
+    def key(site, query):
+        return f"{site}:{normalize_query(query)}"
+
+    def peek(self, site, query):
+        """Returns (found, value, state) without scraping; state is "fresh", "stale" or None."""
+        entry = self.backend.get(self.key(site, query))
+        if entry is None:
+            return False, None, None
+        age = time.time() - entry["stored_at"]
+        value = entry["value"]
+        if value is not None and value.get("partial"):
+            return (True, value, "fresh") if age < self.partial_ttl else (False, None, None)
+        ttl = self.hit_ttl if value is not None else self.negative_ttl
+        if age < ttl:
+            return True, value, "fresh"
+        if age < ttl + self.stale_ttl:
+            return True, entry["value"], "stale"
+        return False, None, None
+
+    def put(self, site, query, value):
+        self.backend.set(self.key(site, query), {"value": value, "stored_at": time.time()})
+
+    def get_or_scrape(self, site, query, scrape, timeout=None):
+        """Serves `site`'s result for `query` from cache, calling `scrape(query, timeout=...)` on a miss.
+
+        Exceptions from `scrape` propagate and leave the cache untouched.
+        """
+        found, value, state = self.peek(site, query)
+        if state == "fresh":
+            self._count("hits" if value is not None else "negative_hits")
+            return value
+        if state == "stale":
+            self._count("stale")
+            self._refresh_in_background(site, query, scrape, timeout)
+            return value
+
+        self._count("misses")
+        value = scrape(query, timeout=timeout)
+        self.put(site, query, value)
+        return value
+
+    def _refresh_in_background(self, site, query, scrape, timeout):
+        key = self.key(site, query)
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        if self.admission is not None and not self.admission.try_acquire():
+            self._count("refreshes_busy")
+            with self._lock:
+                self._refreshing.discard(key)
+            return
+
+        def refresh():
+            try:
+                self.put(site, query, scrape(query, timeout=timeout))
+                self._count("refreshes")
+            except Exception as e:
+                self._count("refresh_errors")
+                logging.error(f"Background refresh of {key} failed: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+                if self.admission is not None:
+                    self.admission.release()
+
+        threading.Thread(target=refresh, name=f"refresh-{key}", daemon=True).start()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        stats["entries"] = len(self.backend)
+        stats["evictions"] = self.backend.evictions
+        return stats
@@ -0,0 +1,316 @@
+"""Background re-scraping of watched products.
+
+Each site has its own lane: a priority queue of watched queries ordered by when
+they next fall due, a concurrency cap and a request-rate cap. A query falls due
+sooner the more users search for it. Successful results are handed to
+`on_result` (the app writes them to the result cache and price history); a
+`null` result or an error backs off exponentially with jitter.
+
+Run `python scheduler.py` from the `app` directory to refresh the watchlist in a
+process of its own, with the same configuration as the web app.
+"""
+import heapq
+import itertools
+import logging
+import math
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from result_cache import normalize_query
+
+DEFAULT_REFRESH_SECONDS = 3600      # Refresh interval of a watched product nobody is searching for
+DEFAULT_SITE_CONCURRENCY = 1
+DEFAULT_SITE_RATE_PER_MINUTE = 10
+DEFAULT_BACKOFF_BASE = 60           # First retry delay after a null result, doubled per failure
+DEFAULT_BACKOFF_MAX = 6 * 3600
+
+
+class Watchlist:
+    """SQLite table of watched queries and how often users searched for them."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS watched ("
+                "key TEXT PRIMARY KEY, query TEXT NOT NULL, demand INTEGER NOT NULL DEFAULT 0, added_at REAL)"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, query):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO watched (key, query, demand, added_at) VALUES (?, ?, 0, ?)",
+                (normalize_query(query), query, time.time()),
+            )
+
+    def remove(self, query):
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM watched WHERE key = ?", (normalize_query(query),)).rowcount > 0
+
+    def bump(self, query):
+        """Counts one user search for `query`; returns its new demand, or None if it is not watched."""
+        with self._connect() as conn:
+            conn.execute("UPDATE watched SET demand = demand + 1 WHERE key = ?", (normalize_query(query),))
+            row = conn.execute("SELECT demand FROM watched WHERE key = ?", (normalize_query(query),)).fetchone()
+        return row[0] if row else None
+
+    def all(self):
+        """Returns {key: (query, demand)} for every watched query."""
+        rows = self._connect().execute("SELECT key, query, demand FROM watched").fetchall()
+        return {key: (query, demand) for key, query, demand in rows}
+
+
+class RateLimiter:
+    """Token bucket allowing `rate_per_minute` starts per minute, with bursts of at most `burst`."""
+
+    def __init__(self, rate_per_minute, burst=1):
+        self.interval = 60.0 / rate_per_minute if rate_per_minute else 0.0
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self, stopped):
+        """Blocks until a token is available or `stopped` is set; returns False if stopped."""
+        while not stopped.is_set():
+            with self._lock:
+                now = time.monotonic()
+                if self.interval:
+                    self._tokens = min(self.burst, self._tokens + (now - self._updated) / self.interval)
+                else:
+                    self._tokens = self.burst
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                delay = (1 - self._tokens) * self.interval
+            stopped.wait(delay)
+        return False
+
+
+class _SiteLane:
+    def __init__(self, site, scrape, concurrency, rate_per_minute):
+        self.site = site
+        self.scrape = scrape
+        self.heap = []
+        self.due = {}           # key -> due time of its live heap entry; older entries are skipped
+        self.failures = {}
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.limiter = RateLimiter(rate_per_minute)
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"sched-{site}")
+        self.counters = {"scrapes": 0, "results": 0, "empty": 0, "errors": 0}
+
+
+class Scheduler:
+    """Keeps watched products fresh by re-scraping them in the background.
+
+    `scrapers` maps a site to a callable taking (product_name, timeout=...), the same
+    entry points the web app uses. `on_result(site, query, result)` receives every
+    non-empty result. `last_scraped(site, query)` returns when a query was last
+    scraped (or None) so a restart does not refresh everything at once.
+    """
+
+    def __init__(self, scrapers, on_result, watchlist, last_scraped=None,
+                 refresh_seconds=DEFAULT_REFRESH_SECONDS, concurrency=DEFAULT_SITE_CONCURRENCY,
+                 rate_per_minute=DEFAULT_SITE_RATE_PER_MINUTE, backoff_base=DEFAULT_BACKOFF_BASE,
+                 backoff_max=DEFAULT_BACKOFF_MAX, timeout=None):
+        self.on_result = on_result
+        self.watchlist = watchlist
+        self.last_scraped = last_scraped
+        self.refresh_seconds = refresh_seconds
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.lanes = {site: _SiteLane(site, scrape, concurrency, rate_per_minute) for site, scrape in scrapers.items()}
+        self._watched = {}      # key -> (query, demand)
+        self._cond = threading.Condition()
+        self._stopped = threading.Event()
+        self._seq = itertools.count()
+        self._threads = []
+
+    # --- Lifecycle ---
+
+    def start(self):
+        now = time.time()
+        watched = self.watchlist.all()
+        with self._cond:
+            self._watched = dict(watched)
+            for key, (query, demand) in watched.items():
+                for lane in self.lanes.values():
+                    last = self.last_scraped(lane.site, query) if self.last_scraped else None
+                    self._push(lane, key, now if last is None else last + self._interval(demand))
+        for lane in self.lanes.values():
+            thread = threading.Thread(target=self._dispatch, args=(lane,), name=f"scheduler-{lane.site}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logging.info(f"Scheduler started with {len(watched)} watched products on {len(self.lanes)} sites.")
+
+    def stop(self):
+        self._stopped.set()
+        with self._cond:
+            self._cond.notify_all()
+        for lane in self.lanes.values():
+            lane.executor.shutdown(wait=False)
+
+    # --- Watchlist ---
+
+    def watch(self, query):
+        self.watchlist.add(query)
+        key = normalize_query(query)
+        with self._cond:
+            if key not in self._watched:
+                self._watched[key] = (query, 0)
+                for lane in self.lanes.values():
+                    self._push(lane, key, time.time())
+
+    def unwatch(self, query):
+        key = normalize_query(query)
+        with self._cond:
+            self._watched.pop(key, None)
+            for lane in self.lanes.values():
+                lane.due.pop(key, None)
+                lane.failures.pop(key, None)
+        return self.watchlist.remove(query)
+
+    def note_demand(self, query):
+        """Counts a user search; a watched query then falls due sooner on every site."""
+        demand = self.watchlist.bump(query)
+        if demand is None:
+            return
+        key = normalize_query(query)
+        with self._cond:
+            if key not in self._watched:
+                return
+            self._watched[key] = (self._watched[key][0], demand)
+            for lane in self.lanes.values():
+                due = lane.due.get(key)
+                if due is not None and not lane.failures.get(key):
+                    earlier = due - self._interval(demand - 1) + self._interval(demand)
+                    if earlier < due:
+                        self._push(lane, key, earlier)
+
+    # --- Scheduling ---
+
+    def _interval(self, demand):
+        """Refresh interval shrinking with demand: one search cuts it to ~60%, ten searches to ~30%."""
+        return self.refresh_seconds / (1 + math.log1p(max(demand, 0)))
+
+    def _push(self, lane, key, due_at):
+        """Schedules `key` on `lane`; caller holds `_cond`."""
+        lane.due[key] = due_at
+        heapq.heappush(lane.heap, (due_at, next(self._seq), key))
+        self._cond.notify_all()
+
+    def _next_due(self, lane):
+        """Waits for the most overdue live entry of `lane` and pops it; returns None once stopped."""
+        with self._cond:
+            while not self._stopped.is_set():
+                if lane.heap:
+                    due_at, _, key = lane.heap[0]
+                    if lane.due.get(key) != due_at or key not in self._watched:
+                        heapq.heappop(lane.heap)
+                        continue
+                    delay = due_at - time.time()
+                    if delay <= 0:
+                        heapq.heappop(lane.heap)
+                        del lane.due[key]
+                        return key
+                else:
+                    delay = None
+                self._cond.wait(delay)
+        return None
+
+    def _dispatch(self, lane):
+        while True:
+            key = self._next_due(lane)
+            if key is None:
+                return
+            lane.slots.acquire()
+            if not lane.limiter.wait(self._stopped):
+                lane.slots.release()
+                return
+            with self._cond:
+                watched = self._watched.get(key)
+            if watched is None:
+                lane.slots.release()
+                continue
+            try:
+                lane.executor.submit(self._run, lane, key, watched[0])
+            except RuntimeError:  # executor shut down
+                lane.slots.release()
+                return
+
+    def _run(self, lane, key, query):
+        result = None
+        try:
+            self._count(lane, "scrapes")
+            result = lane.scrape(query, timeout=self.timeout)
+            if result:
+                self._count(lane, "results")
+                self.on_result(lane.site, query, result)
+            else:
+                self._count(lane, "empty")
+        except Exception as e:
+            self._count(lane, "errors")
+            logging.error(f"Scheduled {lane.site} scrape of '{query}' failed: {e}")
+        finally:
+            lane.slots.release()
+            self._reschedule(lane, key, ok=bool(result))
+
+    def _count(self, lane, name):
+        with self._cond:
+            lane.counters[name] += 1
+
+    def _reschedule(self, lane, key, ok):
+        with self._cond:
+            if key not in self._watched:
+                return
+            if ok:
+                lane.failures.pop(key, None)
+                delay = self._interval(self._watched[key][1])
+            else:
+                failures = lane.failures[key] = lane.failures.get(key, 0) + 1
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (failures - 1)) * random.uniform(0.5, 1.5)
+                logging.info(f"{lane.site} returned nothing for '{self._watched[key][0]}' "
+                             f"({failures} in a row), retrying in {delay:.0f}s.")
+            self._push(lane, key, time.time() + delay)
+
+    def stats(self):
+        with self._cond:
+            now = time.time()
+            return {
+                "watched": len(self._watched),
+                "sites": {
+                    lane.site: dict(
+                        lane.counters,
+                        queued=len(lane.due),
+                        overdue=sum(1 for due in lane.due.values() if due <= now),
+                        backing_off=sum(1 for failures in lane.failures.values() if failures),
+                    )
+                    for lane in self.lanes.values()
+                },
+            }
+
+
+if __name__ == '__main__':
+    import app as web
+
+    scheduler = web.get_scheduler()
+    try:
+        while True:
+            time.sleep(60)
+            logging.info(f"Scheduler stats: {scheduler.stats()}")
+    except KeyboardInterrupt:
+        scheduler.stop()
+        web.price_history.flush()
@@ -0,0 +1,172 @@
+"""Production serving mode: the Flask app behind an ASGI layer with admission control.
+
+Run from the `app` directory with either of:
+
+    python serve.py
+    uvicorn serve:application --host 0.0.0.0 --port 8000
+
+Comparisons that would have to scrape (searches from the home page and
+/compare/stream) wait on the event loop for one of a bounded number of scrape
+slots (`web.admission`) before a server thread picks them up. Beyond the queue they
+get a fast 429, and after waiting too long a 503, both with Retry-After. Batch
+comparisons (/api/compare) take a slot per item inside the app and prefetches only
+ever take a free one, so here they are just turned away early when the slots are
+taken. Searches the result cache can answer skip all of this. Queue depth and wait
+times are at /admission/stats and /metrics.
+"""
+import asyncio
+import json
+import logging
+import os
+from urllib.parse import parse_qs
+from a2wsgi import WSGIMiddleware
+import app as web
+import metrics
+from admission import Rejected
+
+SERVE_HOST = os.environ.get("SERVE_HOST", "0.0.0.0")
+SERVE_PORT = int(os.environ.get("SERVE_PORT", "8000"))
+# Threads running Flask itself: admitted comparisons, cache hits, streams and every other route
+SERVE_THREADS = int(os.environ.get("SERVE_THREADS", "32"))
+
+admission = web.admission
+flask_app = WSGIMiddleware(web.app, workers=SERVE_THREADS)
+
+# Routes that may start a scrape: where each one carries its search text, and how it is admitted.
+# "queue" waits here for a slot; "items" (a batch, whose items take slots in the app) is only
+# rejected here when the queue is full; "free" (a prefetch) is rejected unless a slot is free now.
+COMPARISON_ROUTES = {
+    ("POST", "/"): ("form", "sproduct", "queue"),
+    ("GET", "/compare/stream"): ("query", "q", "queue"),
+    ("POST", "/api/compare"): ("json", "queries", "items"),
+    ("POST", "/prefetch"): ("form", "q", "free"),
+}
+
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+def replay(body, receive):
+    """A `receive` that hands the already-read body to the app once, then defers to the server."""
+    sent = False
+
+    async def replayed():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+    return replayed
+
+
+def content_type(scope):
+    return dict(scope.get("headers", [])).get(b"content-type", b"").decode("latin-1").split(";")[0].strip()
+
+
+async def comparison_queries(scope, receive, source, field):
+    """Returns (search texts in the request, receive to pass on); a batch carries a list of them."""
+    if source == "query":
+        return parse_qs(scope.get("query_string", b"").decode("latin-1")).get(field, [])[:1], receive
+    body = await read_body(receive)
+    if source == "json" or content_type(scope) == "application/json":
+        try:
+            value = json.loads(body).get(field)
+        except (ValueError, AttributeError):
+            value = None
+        values = value if isinstance(value, list) else [value]
+    else:
+        values = parse_qs(body.decode("utf-8", "replace")).get(field, [])[:1]
+    return [value for value in values if isinstance(value, str)], replay(body, receive)
+
+
+def needs_scrape(queries):
+    """True if any of `queries` would have to scrape."""
+    return any(web.needs_scrape(query) for query in queries if query.strip())
+
+
+async def send_response(send, status, body, content_type, headers=()):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())]
+                   + [(name.encode(), value.encode()) for name, value in headers],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def reject(scope, send, error):
+    metrics.inc("pricecomp_admission_rejected_total", status=error.status)
+    headers = [("retry-after", str(error.retry_after))]
+    message = f"{error.reason} Please try again in {error.retry_after} seconds."
+    if scope["path"] == "/":
+        body = f"<!DOCTYPE html><html><body><h1>Busy</h1><p>{message}</p><p><a href=\"/\">Back</a></p></body></html>"
+        await send_response(send, error.status, body.encode(), "text/html; charset=utf-8", headers)
+    else:
+        body = json.dumps({"error": message, "retry_after": error.retry_after}).encode()
+        await send_response(send, error.status, body, "application/json", headers)
+
+
+def publish_gauges():
+    stats = admission.stats()
+    metrics.set_gauge("pricecomp_admission_queue_depth", stats["waiting"])
+    metrics.set_gauge("pricecomp_admission_running", stats["running"])
+    metrics.set_gauge("pricecomp_admission_capacity", stats["capacity"])
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            logging.info(f"Admission control: {admission.capacity} concurrent comparisons, "
+                         f"{admission.queue_size} queued, {admission.max_wait:g}s max wait.")
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        return await flask_app(scope, receive, send)
+    if scope["path"] == "/admission/stats":
+        return await send_response(send, 200, json.dumps(admission.stats()).encode(), "application/json")
+
+    route = COMPARISON_ROUTES.get((scope["method"], scope["path"]))
+    if route is None:
+        return await flask_app(scope, receive, send)
+    source, field, mode = route
+    queries, receive = await comparison_queries(scope, receive, source, field)
+    if not await asyncio.to_thread(needs_scrape, queries):
+        return await flask_app(scope, receive, send)
+
+    if mode == "items" and admission.full():
+        return await reject(scope, send, Rejected(429, admission.retry_after(admission.waiting + 1),
+                                                  "Too many searches are waiting for a browser."))
+    if mode == "free" and admission.busy():
+        return await reject(scope, send, Rejected(429, admission.retry_after(admission.waiting + 1),
+                                                  "Every browser is busy."))
+    if mode != "queue":
+        return await flask_app(scope, receive, send)
+
+    try:
+        async with admission.slot() as waited:
+            metrics.observe_phase("admission", "queue_wait", waited)
+            publish_gauges()
+            await flask_app(scope, receive, send)
+    except Rejected as e:
+        await reject(scope, send, e)
+    finally:
+        publish_gauges()
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(application, host=SERVE_HOST, port=SERVE_PORT)
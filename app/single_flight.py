@@ -0,0 +1,182 @@
+"""Single-flight coalescing of identical in-flight scrapes.
+
+The first caller for a key runs the scrape; callers arriving while it runs wait for
+and share its result instead of starting their own browser. Threads of one process
+coalesce in memory. With a `SQLiteFlightStore`, the leader also takes a lease row in
+a SQLite file shared by every server process, and other processes poll that row
+until the leader publishes its result.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_LEASE_TTL = 120          # Seconds before an unfinished lease is considered abandoned
+DEFAULT_RESULT_RETENTION = 5     # Seconds a finished result is still handed to late arrivals
+DEFAULT_POLL_INTERVAL = 0.2
+
+
+class FlightTimeout(TimeoutError):
+    """A caller stopped waiting for another caller's scrape of the same key, which is still running."""
+
+    def __init__(self, key, timeout):
+        super().__init__(f"Gave up after {timeout}s waiting for the running scrape of {key}.")
+        self.key = key
+
+
+class SQLiteFlightStore:
+    """Cross-process lease table: one row per key, owned by the process running its scrape."""
+
+    def __init__(self, path, lease_ttl=DEFAULT_LEASE_TTL, retention=DEFAULT_RESULT_RETENTION):
+        self.path = path
+        self.lease_ttl = lease_ttl
+        self.retention = retention
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS flights ("
+                "key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL, "
+                "done INTEGER NOT NULL DEFAULT 0, value TEXT, finished_at REAL)"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def acquire(self, key, owner):
+        """Returns ("leader", None), ("done", value) or ("follower", None) for `owner` on `key`."""
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT expires_at, done, value, finished_at FROM flights WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                expires_at, done, value, finished_at = row
+                if done and finished_at >= now - self.retention:
+                    return "done", json.loads(value)
+                if not done and expires_at >= now:
+                    return "follower", None
+            conn.execute(
+                "INSERT OR REPLACE INTO flights (key, owner, expires_at, done, value, finished_at) "
+                "VALUES (?, ?, ?, 0, NULL, NULL)",
+                (key, owner, now + self.lease_ttl),
+            )
+            return "leader", None
+        finally:
+            conn.execute("COMMIT")
+
+    def complete(self, key, owner, value):
+        self._connect().execute(
+            "UPDATE flights SET done = 1, value = ?, finished_at = ? WHERE key = ? AND owner = ?",
+            (json.dumps(value), time.time(), key, owner),
+        )
+
+    def abandon(self, key, owner):
+        """Drops `owner`'s lease so a waiting process can take over."""
+        self._connect().execute("DELETE FROM flights WHERE key = ? AND owner = ?", (key, owner))
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, store=None, poll_interval=DEFAULT_POLL_INTERVAL):
+        self.store = store
+        self.poll_interval = poll_interval
+        self.owner = f"{os.getpid()}-{id(self)}"
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.counters = {"scrapes": 0, "coalesced_local": 0, "coalesced_remote": 0, "takeovers": 0, "wait_timeouts": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def do(self, key, fn, timeout=None):
+        """Returns `fn()`, sharing one call among everyone asking for `key` at the same time.
+
+        Waiters give up after `timeout` seconds with `FlightTimeout`, which tells "still
+        running" apart from a scrape that found nothing.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            self._count("coalesced_local")
+            if not flight.done.wait(timeout):
+                self._count("wait_timeouts")
+                raise FlightTimeout(key, timeout)
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = self._run_shared(key, fn, timeout)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def _run_shared(self, key, fn, timeout):
+        """Runs `fn` unless another process already is, in which case its result is awaited."""
+        if self.store is None:
+            self._count("scrapes")
+            return fn()
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        waited = False
+        while True:
+            try:
+                state, value = self.store.acquire(key, self.owner)
+            except sqlite3.Error as e:
+                logging.warning(f"Single-flight store unavailable, scraping {key} without coalescing: {e}")
+                self._count("scrapes")
+                return fn()
+            if state == "done":
+                self._count("coalesced_remote")
+                return value
+            if state == "leader":
+                if waited:
+                    self._count("takeovers")
+                return self._lead(key, fn)
+            waited = True
+            if deadline is not None and time.monotonic() >= deadline:
+                self._count("wait_timeouts")
+                raise FlightTimeout(key, timeout)
+            time.sleep(self.poll_interval)
+
+    def _lead(self, key, fn):
+        self._count("scrapes")
+        try:
+            value = fn()
+        except Exception:
+            self.store.abandon(key, self.owner)
+            raise
+        try:
+            self.store.complete(key, self.owner, value)
+        except sqlite3.Error as e:
+            logging.warning(f"Could not publish single-flight result for {key}: {e}")
+        return value
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats["in_flight"] = len(self._flights)
+        stats["saved"] = stats["coalesced_local"] + stats["coalesced_remote"]
+        return stats
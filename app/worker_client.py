@@ -0,0 +1,207 @@
+import itertools
+import json
+import logging
+import subprocess
+import sys
+import threading
+import time
+
+# Minimum gap between restarts of one crashed worker, so a broken install cannot spin.
+RESTART_BACKOFF_SECONDS = 2
+# A worker still busy with a cancelled request this long after the cancel is stuck: it gets no new
+# requests and is restarted once the requests still waiting on it are answered.
+CANCEL_GRACE_SECONDS = 30
+
+
+class WorkerError(Exception):
+    pass
+
+
+class ScraperWorker:
+    """Client for one long-lived `scraper_worker.py` process.
+
+    Requests are written as JSON lines with an id; a reader thread matches response
+    lines back to waiting callers. A crashed worker is restarted on the next request.
+    A request that times out is cancelled in the worker. It still counts as pending
+    until the worker answers it. A worker that has not answered within
+    CANCEL_GRACE_SECONDS of the cancel is `stuck`. Only its cancelled requests are
+    lost: it is restarted once no caller is waiting on it any more.
+    """
+
+    def __init__(self, script_path, name="worker"):
+        self.script_path = script_path
+        self.name = name
+        self._process = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pending = {}
+        self._cancelled = {}     # request id -> when it was cancelled, until the worker answers it
+        self._ids = itertools.count(1)
+        self._last_start = 0
+        self.restarts = 0
+        self.timeouts = 0
+
+    @property
+    def pending(self):
+        return len(self._pending) + len(self._cancelled)
+
+    @property
+    def cancelled(self):
+        return len(self._cancelled)
+
+    @property
+    def stuck(self):
+        oldest = min(self._cancelled.values(), default=None)
+        return oldest is not None and time.monotonic() - oldest >= CANCEL_GRACE_SECONDS
+
+    def _waiting_on(self, process):
+        return any(waiter["process"] is process for waiter in list(self._pending.values()))
+
+    def _start(self, request_id, waiter):
+        """Registers `waiter` for `request_id` on a running worker process, starting one if needed."""
+        with self._lock:
+            self._kill_if_stuck()
+            process = self._ensure_started()
+            waiter["process"] = process
+            self._pending[request_id] = waiter
+            return process
+
+    def _ensure_started(self):
+        if self._process and self._process.poll() is None:
+            return self._process
+        if self._process is not None:
+            self.restarts += 1
+            logging.warning(f"[{self.name}] Scraper worker exited with code {self._process.returncode}, restarting.")
+            wait = RESTART_BACKOFF_SECONDS - (time.monotonic() - self._last_start)
+            if wait > 0:
+                time.sleep(wait)
+        self._last_start = time.monotonic()
+        self._process = subprocess.Popen(
+            [sys.executable, self.script_path],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=None,  # Worker logs go straight to the server's stderr
+            text=True,
+            bufsize=1,
+        )
+        threading.Thread(target=self._read_loop, args=(self._process,), name=f"{self.name}-reader", daemon=True).start()
+        logging.info(f"[{self.name}] Started scraper worker pid {self._process.pid}.")
+        return self._process
+
+    def restart_if_stuck(self):
+        """Restarts the worker if it is stuck and nobody waits on it; it starts again on its next request."""
+        with self._lock:
+            self._kill_if_stuck()
+
+    def _kill_if_stuck(self):
+        """Restarts a stuck worker, but only once no caller is still waiting on it."""
+        if not self.stuck or self._waiting_on(self._process):
+            return
+        oldest = min(self._cancelled.values())
+        logging.warning(f"[{self.name}] Scraper worker is still busy with a request cancelled "
+                        f"{time.monotonic() - oldest:.0f}s ago, restarting it.")
+        self._cancelled.clear()
+        if self._process and self._process.poll() is None:
+            self._process.kill()
+            self._process.wait()
+
+    def _cancel(self, process, request_id):
+        self._cancelled[request_id] = time.monotonic()
+        try:
+            with self._write_lock:
+                process.stdin.write(json.dumps({"op": "cancel", "target": request_id}) + "\n")
+                process.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            logging.debug(f"[{self.name}] Could not cancel request {request_id}: {e}")
+
+    def _read_loop(self, process):
+        for line in process.stdout:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                message = json.loads(line)
+            except json.JSONDecodeError as e:
+                logging.error(f"[{self.name}] Error decoding JSON from scraper worker: {e}, Raw Output: '{line}'")
+                continue
+            if self._cancelled.pop(message.get("id"), None) is not None:
+                continue
+            waiter = self._pending.pop(message.get("id"), None)
+            if waiter is None:
+                logging.debug(f"[{self.name}] Dropping late response for request {message.get('id')}.")
+                continue
+            waiter["response"] = message
+            waiter["event"].set()
+            if self.stuck:
+                with self._lock:
+                    if process is self._process:
+                        self._kill_if_stuck()
+
+        # stdout closed: the worker died. Fail everything still waiting on it.
+        if process is self._process:
+            self._cancelled.clear()
+        for request_id, waiter in list(self._pending.items()):
+            if waiter["process"] is process and self._pending.pop(request_id, None):
+                waiter["response"] = {"id": request_id, "ok": False, "error": "scraper worker exited"}
+                waiter["event"].set()
+
+    def request(self, payload, timeout=None):
+        """Sends one request and returns its response message. Raises WorkerError on failure or timeout."""
+        request_id = str(next(self._ids))
+        waiter = {"event": threading.Event(), "response": None, "process": None}
+        process = self._start(request_id, waiter)
+        try:
+            with self._write_lock:
+                process.stdin.write(json.dumps(dict(payload, id=request_id)) + "\n")
+                process.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            self._pending.pop(request_id, None)
+            raise WorkerError(f"Could not write to scraper worker: {e}")
+
+        if not waiter["event"].wait(timeout):
+            if self._pending.pop(request_id, None) is not None:
+                self._cancel(process, request_id)
+            self.timeouts += 1
+            raise WorkerError(f"Scraper worker did not answer request {request_id} within {timeout}s.")
+
+        response = waiter["response"]
+        if not response.get("ok"):
+            raise WorkerError(response.get("error", "unknown worker error"))
+        return response
+
+    def stop(self):
+        with self._lock:
+            if self._process and self._process.poll() is None:
+                self._process.stdin.close()
+                try:
+                    self._process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    self._process.kill()
+
+
+class WorkerGroup:
+    """A fixed set of scraper workers; each request goes to the least busy one that is not stuck."""
+
+    def __init__(self, script_path, size=2):
+        self.workers = [ScraperWorker(script_path, name=f"worker-{i}") for i in range(size)]
+        self._lock = threading.Lock()
+
+    def scrape(self, site, product_name, timeout=None):
+        """Returns the worker's response message: "result" plus "spans" with per-phase timings."""
+        with self._lock:
+            for w in self.workers:
+                w.restart_if_stuck()
+            workers = [w for w in self.workers if not w.stuck] or self.workers
+            worker = min(workers, key=lambda w: w.pending)
+        return worker.request({"site": site, "query": product_name, "timeout": timeout}, timeout=timeout)
+
+    def stop(self):
+        for worker in self.workers:
+            worker.stop()
+
+    def stats(self):
+        return [
+            {"name": w.name, "pending": w.pending, "cancelled": w.cancelled, "stuck": w.stuck,
+             "restarts": w.restarts, "timeouts": w.timeouts}
+            for w in self.workers
+        ]
@@ -0,0 +1,289 @@
+"""Offline benchmarks of scraping and comparison against the local mock storefront.
+
+    python benchmark.py --output bench.json
+    python benchmark.py --compare bench.json        # exits 1 if p95 latency regressed
+
+Scenarios:
+    cold        a fresh interpreter per scrape (`fast_fetch.py`, or the scraper script with --engine browser)
+    warm        sequential scrapes in this process after one warm-up call per site
+    concurrent  --users simultaneous comparisons: both sites scraped in parallel, then title matching
+    missing     warm scrapes against pages whose primary selectors were renamed
+    tail        warm scrapes with --slow-rate of responses delayed by --slow-ms, with and without hedging
+    outage      warm scrapes through a circuit breaker while Amazon answers every request with a 503
+
+`--engine http` (default) uses the browser-free path; `--engine browser` drives pooled
+Chrome sessions through `scrape_runner` and needs Chrome installed. Results are JSON with
+p50/p95/p99 latency in milliseconds, throughput and mean page weight per scenario.
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from mock_storefront import start_storefront
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(REPO_DIR, "app"))    # resilience.py and the app's other modules
+from resilience import percentile  # noqa: E402
+
+SITES = ("amazon", "flipkart")
+SCENARIOS = ("cold", "warm", "concurrent", "missing", "tail", "outage")
+DEFAULT_QUERY = "potato"
+
+
+def summarize(samples, wall_seconds):
+    """Turns [(seconds, outcome)] into latency percentiles, outcome counts and throughput."""
+    latencies = sorted(seconds * 1000 for seconds, _ in samples)
+    outcomes = [outcome for _, outcome in samples]
+    return {
+        "requests": len(samples),
+        "ok": outcomes.count("ok"),
+        "empty": outcomes.count("empty"),
+        "errors": outcomes.count("error"),
+        "p50_ms": round(percentile(latencies, 0.50), 2) if latencies else None,
+        "p95_ms": round(percentile(latencies, 0.95), 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99), 2) if latencies else None,
+        "mean_ms": round(sum(latencies) / len(latencies), 2) if latencies else None,
+        "max_ms": round(latencies[-1], 2) if latencies else None,
+        "throughput_per_s": round(len(samples) / wall_seconds, 2) if wall_seconds else None,
+        "wall_seconds": round(wall_seconds, 3),
+    }
+
+
+def timed(call):
+    started = time.perf_counter()
+    try:
+        outcome = "ok" if call() else "empty"
+    except Exception as e:
+        logging.warning(f"Benchmark call failed: {e}")
+        outcome = "error"
+    return time.perf_counter() - started, outcome
+
+
+class Bench:
+    def __init__(self, root_url, engine, query):
+        self.root_url = root_url
+        self.engine = engine
+        self.query = query
+        # The scrapers read their base URLs at import time
+        os.environ["AMAZON_BASE_URL"] = f"{root_url}/amazon"
+        os.environ["FLIPKART_BASE_URL"] = f"{root_url}/flipkart"
+        import amazon_scraping
+        import flipkart_scraping
+        import fast_fetch
+        import matching
+        import resilience
+        import tracing
+        self.site_modules = {"amazon": (amazon_scraping, "AMAZON_BASE_URL"), "flipkart": (flipkart_scraping, "FLIPKART_BASE_URL")}
+        self.fast_fetch = fast_fetch
+        self.matching = matching
+        self.resilience = resilience
+        self.tracing = tracing
+        self.pages = []     # "page" metrics of every scrape since the last page_weight()
+        if engine == "browser":
+            import scrape_runner
+            scrape_runner.FAST_EXTRACTION = False
+            self.scrape_runner = scrape_runner
+
+    def scrape(self, site):
+        trace = self.tracing.Trace(site)
+        with self.tracing.activate(trace):
+            try:
+                if self.engine == "browser":
+                    return self.scrape_runner.run_scrape(site, self.query, trace=trace)
+                return self.fast_fetch.scrape_fast(site, self.query)
+            finally:
+                self.pages.extend(span["page"] for span in trace.spans if "page" in span)
+
+    def page_weight(self):
+        """Mean size and request count of the pages scraped since the last call, or None if there were none."""
+        pages, self.pages = self.pages, []
+        if not pages:
+            return None
+        return {
+            "pages": len(pages),
+            "mean_kb": round(sum(page.get("bytes", 0) for page in pages) / len(pages) / 1024, 1),
+            "mean_requests": round(sum(page.get("requests", 0) for page in pages) / len(pages), 1),
+            "blocked_requests": sum(page.get("blocked", 0) for page in pages),
+        }
+
+    def compare(self):
+        with ThreadPoolExecutor(max_workers=len(SITES)) as pool:
+            amazon, flipkart = pool.map(self.scrape, SITES)
+        return self.matching.best_match(self.matching.candidates_of(amazon), self.matching.candidates_of(flipkart))
+
+    @contextmanager
+    def broken_pages(self):
+        """Points both scrapers at the /broken variant of the storefront for the duration of the block."""
+        previous = {}
+        for site, (module, attribute) in self.site_modules.items():
+            previous[site] = getattr(module, attribute)
+            setattr(module, attribute, f"{self.root_url}/broken/{site}")
+        try:
+            yield
+        finally:
+            for site, (module, attribute) in self.site_modules.items():
+                setattr(module, attribute, previous[site])
+
+    @contextmanager
+    def faults(self, **settings):
+        """Injects storefront faults (see mock_storefront.py) for the duration of the block."""
+        def set_faults(query):
+            with urllib.request.urlopen(f"{self.root_url}/_faults?{query}") as response:
+                response.read()
+        set_faults("&".join(f"{name}={value}" for name, value in settings.items()))
+        try:
+            yield
+        finally:
+            set_faults("error_rate=0&slow_rate=0")
+
+    def resilient(self, site, **options):
+        """A ResilientScraper around this bench's scrape of `site`; open-circuit calls return None."""
+        scraper = self.resilience.ResilientScraper(site, lambda query, timeout=None: self.scrape(site), **options)
+
+        def call():
+            try:
+                return scraper(self.query)
+            except self.resilience.CircuitOpen:
+                return None
+        return scraper, call
+
+    def prime(self, scrapers):
+        """Gives each scraper the healthy attempts it needs before it will hedge or open its breaker."""
+        for scraper, call in scrapers.values():
+            for _ in range(scraper.min_samples):
+                call()
+
+    def _resilient_run(self, iterations, scrapers):
+        samples = []
+        started = time.perf_counter()
+        for i in range(iterations):
+            samples.append(timed(scrapers[SITES[i % len(SITES)]][1]))
+        stats = summarize(samples, time.perf_counter() - started)
+        stats["sites"] = {site: scraper.stats() for site, (scraper, _) in scrapers.items()}
+        return stats
+
+    # --- Scenarios ---
+
+    def cold(self, iterations):
+        env = dict(os.environ, FAST_EXTRACTION="1")
+        samples = []
+        started = time.perf_counter()
+        for i in range(iterations):
+            site = SITES[i % len(SITES)]
+            if self.engine == "browser":
+                command = [sys.executable, os.path.join(REPO_DIR, f"{site}_scraping.py"), self.query]
+            else:
+                command = [sys.executable, os.path.join(REPO_DIR, "fast_fetch.py"), site, self.query]
+            samples.append(timed(lambda: json.loads(subprocess.run(
+                command, capture_output=True, text=True, env=env, check=True, timeout=120).stdout.strip() or "null")))
+        return summarize(samples, time.perf_counter() - started)
+
+    def warm(self, iterations):
+        for site in SITES:
+            self.scrape(site)
+        samples = []
+        started = time.perf_counter()
+        for i in range(iterations):
+            site = SITES[i % len(SITES)]
+            samples.append(timed(lambda: self.scrape(site)))
+        return summarize(samples, time.perf_counter() - started)
+
+    def concurrent(self, iterations, users):
+        self.compare()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=users) as pool:
+            samples = list(pool.map(lambda _: timed(self.compare), range(iterations)))
+        return summarize(samples, time.perf_counter() - started)
+
+    def missing(self, iterations):
+        with self.broken_pages():
+            return self.warm(iterations)
+
+    def tail(self, iterations, slow_rate, slow_ms):
+        # Hedging fires at p95, so it only helps while fewer than 5% of responses are slow
+        stats = {}
+        for hedge in (False, True):
+            scrapers = {site: self.resilient(site, hedge=hedge, hedge_min_seconds=0, error_threshold=1.1) for site in SITES}
+            self.prime(scrapers)
+            with self.faults(slow_rate=slow_rate, slow_ms=slow_ms):
+                stats["hedged" if hedge else "unhedged"] = self._resilient_run(iterations, scrapers)
+        result = dict(stats["hedged"], unhedged=stats["unhedged"])
+        result.update(slow_rate=slow_rate, slow_ms=slow_ms)
+        return result
+
+    def outage(self, iterations):
+        # A short window, so the breaker opens within a few failed calls and the rest are rejected
+        scrapers = {site: self.resilient(site, hedge=False, window=10, min_samples=5) for site in SITES}
+        self.prime(scrapers)
+        with self.faults(site="amazon", error_rate=1):
+            return self._resilient_run(iterations, scrapers)
+
+
+def regressions(current, baseline, tolerance):
+    """Lists scenarios whose p95 grew by more than `tolerance` (a fraction) over the baseline run."""
+    found = []
+    for name, stats in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before or not before.get("p95_ms") or stats["p95_ms"] is None:
+            continue
+        if stats["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            found.append(f"{name}: p95 {before['p95_ms']}ms -> {stats['p95_ms']}ms")
+    return found
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark scraping and comparison against a local mock storefront.")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--engine", choices=("http", "browser"), default="http")
+    parser.add_argument("--iterations", type=int, default=50, help="Scrapes (or comparisons) per scenario.")
+    parser.add_argument("--cold-iterations", type=int, default=6)
+    parser.add_argument("--users", type=int, default=8, help="Concurrent users in the concurrent scenario.")
+    parser.add_argument("--query", default=DEFAULT_QUERY)
+    parser.add_argument("--delay-ms", type=float, default=0, help="Latency the storefront adds to every response.")
+    parser.add_argument("--slow-rate", type=float, default=0.04, help="Share of responses delayed in the tail scenario.")
+    parser.add_argument("--slow-ms", type=float, default=1500, help="Delay of those responses.")
+    parser.add_argument("--output", help="Also write the JSON results to this file.")
+    parser.add_argument("--compare", help="Baseline JSON from an earlier run; exit 1 if any p95 regressed.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed p95 growth over the baseline.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+    server, root_url = start_storefront(delay=args.delay_ms / 1000)
+    bench = Bench(root_url, args.engine, args.query)
+    logging.getLogger().setLevel(logging.WARNING)  # the scrapers' imports reconfigure logging
+
+    results = {"engine": args.engine, "query": args.query, "delay_ms": args.delay_ms, "scenarios": {}}
+    for scenario in args.scenarios:
+        if scenario == "cold":
+            stats = bench.cold(args.cold_iterations)
+        elif scenario == "concurrent":
+            stats = bench.concurrent(args.iterations, args.users)
+            stats["users"] = args.users
+        elif scenario == "tail":
+            stats = bench.tail(args.iterations, args.slow_rate, args.slow_ms)
+        else:
+            stats = getattr(bench, scenario)(args.iterations)
+        page_weight = bench.page_weight()
+        if page_weight:
+            stats["page_weight"] = page_weight
+        results["scenarios"][scenario] = stats
+    server.shutdown()
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for line in found:
+            print(f"Regression: {line}", file=sys.stderr)
+        sys.exit(1 if found else 0)
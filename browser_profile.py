@@ -0,0 +1,125 @@
+"""Chrome profile shared by the Amazon and Flipkart scrapers.
+
+The "lean" profile (default) runs headless with an eager page-load strategy and
+blocks images, media, fonts and tracking scripts, which the scrapers never need.
+The "full" profile keeps a visible, maximized browser for debugging.
+Both record network activity so page weight and load time can be reported per scrape.
+"""
+import json
+import logging
+import os
+from selenium.webdriver.chrome.options import Options
+import tracing
+
+BROWSER_PROFILE = os.environ.get("BROWSER_PROFILE", "lean")
+PAGE_LOAD_STRATEGY = os.environ.get("PAGE_LOAD_STRATEGY", "eager")  # "eager" or "none" for the lean profile
+LEAN_WINDOW_SIZE = os.environ.get("LEAN_WINDOW_SIZE", "1280,900")
+
+BLOCKED_URL_PATTERNS = [
+    # Fonts and media
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.mp4", "*.webm", "*.m3u8", "*.mp3",
+    # Images (also disabled through content settings; this catches CSS backgrounds)
+    "*.jpg", "*.jpeg", "*.png", "*.gif", "*.webp", "*.avif", "*.ico",
+    # Ads, analytics and tracking
+    "*doubleclick.net*", "*googlesyndication.com*", "*google-analytics.com*", "*googletagmanager.com*",
+    "*amazon-adsystem.com*", "*fls-eu.amazon.*", "*unagi.amazon.*", "*facebook.net*", "*facebook.com/tr*",
+    "*scorecardresearch.com*", "*hotjar.com*", "*clarity.ms*", "*rukminim*.flixcart.com*",
+]
+
+
+def is_lean():
+    return BROWSER_PROFILE == "lean"
+
+
+def build_options(user_agent, extra_arguments=()):
+    """Chrome options for the configured profile, with a site's user agent and extra flags."""
+    options = Options()
+    for argument in extra_arguments:
+        options.add_argument(argument)
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument(f"user-agent={user_agent}")
+
+    if is_lean():
+        options.add_argument("--headless=new")
+        options.add_argument(f"--window-size={LEAN_WINDOW_SIZE}")
+        options.add_argument("--blink-settings=imagesEnabled=false")
+        options.add_argument("--mute-audio")
+        options.page_load_strategy = PAGE_LOAD_STRATEGY
+        options.add_experimental_option("prefs", {
+            "profile.managed_default_content_settings.images": 2,
+            "profile.managed_default_content_settings.media_stream": 2,
+            "profile.default_content_setting_values.notifications": 2,
+        })
+    else:
+        options.add_argument("--start-maximized")
+
+    # Network events feed the per-scrape page weight report
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    options.add_experimental_option("perfLoggingPrefs", {"enableNetwork": True, "enablePage": False})
+    return options
+
+
+def prepare_driver(driver):
+    """Applies per-session settings that cannot be expressed as launch options."""
+    if not is_lean():
+        return
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+    except Exception as e:
+        logging.warning(f"Could not install URL blocklist on the browser: {e}")
+
+
+def reset_page_metrics(driver):
+    """Drops network events recorded before this scrape started."""
+    try:
+        driver.get_log("performance")
+    except Exception:
+        pass
+
+
+def collect_page_metrics(driver):
+    """Returns bytes transferred, request counts and load timings since the last reset."""
+    metrics = {"bytes": 0, "requests": 0, "blocked": 0, "failed": 0}
+    try:
+        for entry in driver.get_log("performance"):
+            message = json.loads(entry["message"])["message"]
+            method = message.get("method")
+            if method == "Network.loadingFinished":
+                metrics["requests"] += 1
+                metrics["bytes"] += int(message["params"].get("encodedDataLength", 0))
+            elif method == "Network.loadingFailed":
+                if message["params"].get("blockedReason"):
+                    metrics["blocked"] += 1
+                else:
+                    metrics["failed"] += 1
+    except Exception as e:
+        logging.debug(f"Could not read performance log: {e}")
+
+    try:
+        timing = driver.execute_script(
+            "const n = performance.getEntriesByType('navigation')[0];"
+            "return n ? {dcl: n.domContentLoadedEventEnd, load: n.loadEventEnd} : null;"
+        )
+        if timing:
+            metrics["dom_content_loaded_ms"] = round(timing["dcl"])
+            metrics["load_ms"] = round(timing["load"]) or None  # 0 while the eager strategy skips onload
+    except Exception as e:
+        logging.debug(f"Could not read navigation timing: {e}")
+    return metrics
+
+
+def log_page_metrics(driver, site):
+    """Logs the page's weight and load timings, records them on the current trace and returns them."""
+    metrics = collect_page_metrics(driver)
+    tracing.page(metrics)
+    logging.info(
+        f"{site} page weight [{BROWSER_PROFILE}]: {metrics['bytes'] / 1024:.0f} KB over {metrics['requests']} requests "
+        f"({metrics['blocked']} blocked), DOMContentLoaded {metrics.get('dom_content_loaded_ms')} ms, "
+        f"load {metrics.get('load_ms')} ms"
+    )
+    return metrics
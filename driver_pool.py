@@ -0,0 +1,275 @@
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from webdriver_manager.chrome import ChromeDriverManager
+import browser_profile
+import tracing
+
+try:
+    import psutil
+except ImportError:  # RSS-based recycling is skipped without psutil
+    psutil = None
+
+DEFAULT_POOL_SIZE = 2
+DEFAULT_MAX_USES = 50        # Recycle a browser after this many leases
+DEFAULT_MAX_RSS_MB = 1500    # ...or once Chrome and its children use more memory than this
+
+_chromedriver_path = None
+_chromedriver_lock = threading.Lock()
+
+
+def chromedriver_path():
+    """Resolves the chromedriver binary once per process instead of once per browser."""
+    global _chromedriver_path
+    with _chromedriver_lock:
+        if _chromedriver_path is None:
+            with tracing.span("driver_install"):
+                _chromedriver_path = ChromeDriverManager().install()
+            logging.info(f"Resolved chromedriver at {_chromedriver_path}")
+        return _chromedriver_path
+
+
+def launch_driver(options):
+    """Starts a new Chrome session with the cached chromedriver."""
+    service = Service(chromedriver_path())
+    with tracing.span("chrome_launch"):
+        driver = webdriver.Chrome(service=service, options=options)
+        browser_profile.prepare_driver(driver)
+    return driver
+
+
+def driver_rss_mb(driver):
+    """Returns the resident memory of chromedriver plus every Chrome process it spawned, in MB."""
+    if psutil is None:
+        return None
+    try:
+        root = psutil.Process(driver.service.process.pid)
+        processes = [root] + root.children(recursive=True)
+        total = 0
+        for process in processes:
+            try:
+                total += process.memory_info().rss
+            except psutil.Error:
+                continue
+        return total / (1024 * 1024)
+    except Exception as e:
+        logging.debug(f"Could not read driver memory usage: {e}")
+        return None
+
+
+class _PooledDriver:
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+        self.created_at = time.time()
+
+
+class DriverPool:
+    """Keeps pre-launched Chrome sessions warm and leases one per scrape.
+
+    Drivers are reset between leases, health-checked before being handed out and
+    recycled after `max_uses` leases or once their memory passes `max_rss_mb`.
+    """
+
+    def __init__(self, options_factory, size=DEFAULT_POOL_SIZE, max_uses=DEFAULT_MAX_USES,
+                 max_rss_mb=DEFAULT_MAX_RSS_MB, reset_origins=(), name="drivers"):
+        self.options_factory = options_factory
+        self.size = size
+        self.max_uses = max_uses
+        self.max_rss_mb = max_rss_mb
+        self.reset_origins = list(reset_origins)
+        self.name = name
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._live = 0
+        self._closed = False
+        self.launched = 0
+        self.recycled = 0
+        self.leases = 0
+
+    # --- Lifecycle ---
+
+    def start(self):
+        """Launches drivers until the pool is full. Safe to call more than once."""
+        while True:
+            with self._lock:
+                if self._closed or self._live >= self.size:
+                    return
+                self._live += 1
+            self._launch_into_pool()
+
+    def start_in_background(self):
+        threading.Thread(target=self.start, name=f"{self.name}-warmup", daemon=True).start()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                entry = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._quit(entry)
+        logging.info(f"[{self.name}] Driver pool closed.")
+
+    def _launch_into_pool(self):
+        started = time.perf_counter()
+        try:
+            entry = _PooledDriver(launch_driver(self.options_factory()))
+        except Exception as e:
+            with self._lock:
+                self._live -= 1
+            logging.error(f"[{self.name}] Failed to launch Chrome for the pool: {e}")
+            return
+        self.launched += 1
+        logging.info(f"[{self.name}] Launched pooled driver in {time.perf_counter() - started:.2f}s.")
+        if not self._retire_if_closed(entry):
+            self._idle.put(entry)
+
+    def _quit(self, entry):
+        try:
+            entry.driver.quit()
+        except Exception as e:
+            logging.debug(f"[{self.name}] Error while quitting driver: {e}")
+
+    def _replace(self, entry):
+        """Quits a driver and launches its replacement, keeping the pool at size."""
+        self._quit(entry)
+        with self._lock:
+            if self._closed:
+                self._live -= 1
+                return
+        self.recycled += 1
+        self._launch_into_pool()
+
+    # --- Leasing ---
+
+    @contextmanager
+    def lease(self, timeout=None):
+        """Yields a clean, healthy WebDriver and returns it to the pool afterwards."""
+        with tracing.span("pool_lease", site=self.name):
+            entry = self._acquire(timeout)
+        self.leases += 1
+        try:
+            yield entry.driver
+        finally:
+            self._release(entry)
+
+    def _acquire(self, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError(f"Driver pool '{self.name}' is closed.")
+                can_grow = self._live < self.size and self._idle.empty()
+                if can_grow:
+                    self._live += 1
+            if can_grow:
+                self._launch_into_pool()
+
+            remaining = None if deadline is None else max(0, deadline - time.monotonic())
+            try:
+                entry = self._idle.get(timeout=remaining)
+            except queue.Empty:
+                raise TimeoutError(f"No driver available in pool '{self.name}' within {timeout}s.")
+
+            if self._healthy(entry):
+                return entry
+            logging.warning(f"[{self.name}] Pooled driver failed its health check, replacing it.")
+            self._quit(entry)
+            with self._lock:
+                self._live -= 1
+
+    def _release(self, entry):
+        entry.uses += 1
+        if self._retire_if_closed(entry):
+            return
+        if self._should_recycle(entry):
+            threading.Thread(target=self._replace, args=(entry,), daemon=True).start()
+            return
+        try:
+            self._reset(entry.driver)
+        except Exception as e:
+            logging.warning(f"[{self.name}] Could not reset driver state, recycling it: {e}")
+            threading.Thread(target=self._replace, args=(entry,), daemon=True).start()
+            return
+        if not self._retire_if_closed(entry):
+            self._idle.put(entry)
+
+    def _retire_if_closed(self, entry):
+        """Quits `entry` instead of pooling it once the pool is closed. Returns True if it did."""
+        with self._lock:
+            if not self._closed:
+                return False
+            self._live -= 1
+        self._quit(entry)
+        return True
+
+    # --- Health and hygiene ---
+
+    def _healthy(self, entry):
+        try:
+            return entry.driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    def _should_recycle(self, entry):
+        if self.max_uses and entry.uses >= self.max_uses:
+            logging.info(f"[{self.name}] Recycling driver after {entry.uses} uses.")
+            return True
+        if self.max_rss_mb:
+            rss = driver_rss_mb(entry.driver)
+            if rss is not None and rss > self.max_rss_mb:
+                logging.info(f"[{self.name}] Recycling driver using {rss:.0f} MB (limit {self.max_rss_mb} MB).")
+                return True
+        return False
+
+    def _reset(self, driver):
+        """Drops tabs, cookies, cache and site storage left behind by the previous lease."""
+        handles = driver.window_handles
+        for handle in handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(handles[0])
+        driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        driver.execute_cdp_cmd("Network.clearBrowserCache", {})
+        for origin in self.reset_origins:
+            driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+        driver.get("about:blank")
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "size": self.size,
+            "live": self._live,
+            "idle": self._idle.qsize(),
+            "leases": self.leases,
+            "launched": self.launched,
+            "recycled": self.recycled,
+        }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(name, options_factory, size=DEFAULT_POOL_SIZE, **kwargs):
+    """Returns the process-wide pool registered under `name`, creating and warming it on first use."""
+    with _pools_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            pool = DriverPool(options_factory, size=size, name=name, **kwargs)
+            pool.start_in_background()
+            _pools[name] = pool
+        return pool
+
+
+def close_all_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
@@ -0,0 +1,192 @@
+"""Extraction of search results from a results page's HTML.
+
+The Selenium scrapers hand over one `page_source` snapshot instead of calling
+`find_element` per card and selector; the HTTP fast path and saved fixtures go
+through the same parsers, so selector fallback always runs in memory.
+"""
+import logging
+import os
+import time
+from urllib.parse import urljoin
+from bs4 import BeautifulSoup
+import selector_stats
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+# How many complete results each site hands to cross-site matching
+CANDIDATES_PER_SITE = int(os.environ.get("CANDIDATES_PER_SITE", "5"))
+
+# Used to resolve relative links when the caller does not pass the page URL
+AMAZON_BASE_URL = os.environ.get("AMAZON_BASE_URL", "https://www.amazon.in").rstrip("/")
+FLIPKART_BASE_URL = os.environ.get("FLIPKART_BASE_URL", "https://www.flipkart.com").rstrip("/")
+
+# --- Amazon selectors ---
+AMAZON_RESULT_SELECTOR = "div[data-component-type='s-search-result']"
+AMAZON_TITLE_SELECTOR = "h2 span"
+AMAZON_LINK_SELECTOR = "a.a-link-normal.s-underline-text, a.a-link-normal.s-no-outline"
+AMAZON_PRICE_WHOLE_SELECTOR = "span.a-price-whole"
+AMAZON_PRICE_FRACTION_SELECTOR = "span.a-price-fraction"
+
+# --- Flipkart selectors ---
+FLIPKART_CONTAINER_SELECTORS = [
+    "div[data-id]",
+    "div._1AtVbE",
+    "div.slAVV4",  # Seen in your onion screenshot for individual product containers
+]
+FLIPKART_TITLE_SELECTORS = [
+    "a.wjcEIp",            # New: Found for 'tomato ketchup' and likely for veggies too
+    "div._4rR01T",        # Common for electronics
+    "a.s1Q9rs",            # Another common product title/link
+    "h1[itemprop='name']", # Generic high-level title
+    "span.B_NuCI",         # Another common title class
+    "div.col.col-7-12 > div:nth-child(1)", # Common for text in product card
+]
+FLIPKART_PRICE_SELECTORS = [
+    "div.Nx9bqj",
+    "div.Nx9bqj._4b5DiR",
+    "div._30jeq3._1_WHN1",
+    "div._30jeq3",
+    "span.current-price",
+    "span._8VnyB",
+]
+FLIPKART_LINK_SELECTORS = [
+    "a.wjcEIp",          # New: Found for 'tomato ketchup' and likely for veggies too
+    "a._1fQZEK",        # Common for electronics
+    "a.CGtC98",          # Specific for iPhone 15 link
+    "a.IRpwQq",           # Another general link class
+    "a[rel='noopener noreferrer']" # Generic link that opens in new tab
+]
+
+
+def parse_html(html):
+    return BeautifulSoup(html, HTML_PARSER)
+
+
+def _text(element):
+    return " ".join(element.get_text(" ", strip=True).split())
+
+
+def _is_excluded(product_name, title):
+    # Searching for potatoes should not return potato chips
+    return product_name.lower() == "potato" and "chips" in title.lower()
+
+
+def with_candidates(candidates):
+    """Shapes a site's result: the top candidate's fields plus the full "candidates" list, or None."""
+    if not candidates:
+        return None
+    return dict(candidates[0], candidates=candidates)
+
+
+def parse_amazon_results(html, product_name, base_url=AMAZON_BASE_URL, limit=CANDIDATES_PER_SITE):
+    """Returns the first complete Amazon result in `html` as {"title", "price", "link", "candidates"}, or None.
+
+    "candidates" lists up to `limit` complete results in page order, the first one included.
+    """
+    return with_candidates(parse_amazon_candidates(html, product_name, base_url, limit))
+
+
+def parse_amazon_candidates(html, product_name, base_url=AMAZON_BASE_URL, limit=CANDIDATES_PER_SITE):
+    soup = parse_html(html)
+    candidates = []
+    results = soup.select(AMAZON_RESULT_SELECTOR)
+    logging.info(f"Found {len(results)} potential Amazon result containers in HTML.")
+
+    for i, result_element in enumerate(results):
+        title_element = result_element.select_one(AMAZON_TITLE_SELECTOR)
+        title = _text(title_element) if title_element else ""
+        if not title or _is_excluded(product_name, title):
+            continue
+
+        link_element = result_element.select_one(AMAZON_LINK_SELECTOR)
+        link = urljoin(base_url, link_element.get("href")) if link_element and link_element.get("href") else None
+
+        price = None
+        whole_element = result_element.select_one(AMAZON_PRICE_WHOLE_SELECTOR)
+        if whole_element:
+            price_str = _text(whole_element).replace(",", "").rstrip(".").strip()
+            fraction_element = result_element.select_one(AMAZON_PRICE_FRACTION_SELECTOR)
+            if fraction_element and _text(fraction_element):
+                price_str += f".{_text(fraction_element)}"
+            try:
+                price = float(price_str)
+            except ValueError:
+                logging.warning(f"Could not convert price string '{price_str}' to float for title: {title}")
+
+        if title and link and price is not None:
+            candidates.append({"title": title, "price": price, "link": link})
+            if len(candidates) >= limit:
+                break
+        else:
+            logging.debug(f"Skipping Amazon result {i+1} due to missing data: Title='{title}', Price='{price}', Link='{link}'")
+    return candidates
+
+
+def _matches(container, role, selectors):
+    """Yields elements matched by `selectors` in their listed order.
+
+    In-memory lookups are too cheap to reorder, and a fixed order keeps the output independent of
+    the shared stats file; hits and misses are only recorded for `selector_stats.py` reports.
+    """
+    for selector in selectors:
+        started = time.perf_counter()
+        element = container.select_one(selector)
+        selector_stats.record("flipkart", role, selector, element is not None, time.perf_counter() - started)
+        if element is not None:
+            yield element
+
+
+def parse_flipkart_results(html, product_name, base_url=FLIPKART_BASE_URL, limit=CANDIDATES_PER_SITE):
+    """Returns the first complete Flipkart result in `html` as {"title", "price", "link", "candidates"}, or None.
+
+    "candidates" lists up to `limit` complete results in page order, the first one included.
+    """
+    return with_candidates(parse_flipkart_candidates(html, product_name, base_url, limit))
+
+
+def parse_flipkart_candidates(html, product_name, base_url=FLIPKART_BASE_URL, limit=CANDIDATES_PER_SITE):
+    soup = parse_html(html)
+    candidates = []
+    containers = []
+    for selector in FLIPKART_CONTAINER_SELECTORS:
+        started = time.perf_counter()
+        containers = soup.select(selector)
+        selector_stats.record("flipkart", "container", selector, bool(containers), time.perf_counter() - started)
+        if containers:
+            break
+    logging.info(f"Found {len(containers)} potential Flipkart result containers in HTML.")
+
+    for container in containers:
+        title = None
+        for element in _matches(container, "title", FLIPKART_TITLE_SELECTORS):
+            candidate = _text(element)
+            if candidate and not _is_excluded(product_name, candidate):
+                title = candidate
+                break
+
+        price = None
+        for element in _matches(container, "price", FLIPKART_PRICE_SELECTORS):
+            price_str = _text(element).replace("₹", "").replace(",", "").strip()
+            if price_str:
+                try:
+                    price = float(price_str)
+                except ValueError:
+                    logging.warning(f"Could not convert price string '{price_str}' to float from container {container.get('data-id')}.")
+                break
+
+        link = None
+        for element in _matches(container, "link", FLIPKART_LINK_SELECTORS):
+            href = element.get("href")
+            if href:
+                link = urljoin(base_url, href)
+                break
+
+        if title and price is not None and link:
+            candidates.append({"title": title, "price": price, "link": link})
+            if len(candidates) >= limit:
+                break
+    return candidates
@@ -0,0 +1,105 @@
+"""Browser-free scraping: fetch a search results page over HTTP and parse it locally.
+
+Run `python fast_fetch.py amazon "basmati rice" --html saved_page.html` to test the
+parser against a saved page without touching the network.
+"""
+import argparse
+import json
+import logging
+import sys
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+import amazon_scraping
+import flipkart_scraping
+import extraction
+import snapshots
+import tracing
+
+logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+
+FETCH_TIMEOUT_SECONDS = 10
+HTTP_POOL_SIZE = 16
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-IN,en;q=0.9",
+}
+
+SITES = {
+    "amazon": (amazon_scraping.build_search_url, extraction.parse_amazon_results),
+    "flipkart": (flipkart_scraping.build_search_url, extraction.parse_flipkart_results),
+}
+
+
+class FetchFailed(Exception):
+    """The search page could not be fetched or parsed, so it is unknown whether the site has the product."""
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Process-wide keep-alive session so repeated fetches reuse TCP/TLS connections."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=len(SITES), pool_maxsize=HTTP_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update(HEADERS)
+            _session = session
+        return _session
+
+
+def fetch_search_page(site, product_name, timeout=FETCH_TIMEOUT_SECONDS):
+    """Returns (url, html) of `site`'s search results page, or (url, None) if the fetch failed."""
+    build_url, _ = SITES[site]
+    url = build_url(product_name)
+    try:
+        response = get_session().get(url, timeout=timeout)
+        if response.status_code != 200:
+            logging.info(f"{site} fast fetch got HTTP {response.status_code} for {url}")
+            return url, None
+        tracing.page({"bytes": len(response.content), "requests": 1 + len(response.history)})
+        return response.url, response.text
+    except requests.RequestException as e:
+        logging.info(f"{site} fast fetch failed for {url}: {e}")
+        return url, None
+
+
+def scrape_fast(site, product_name, timeout=FETCH_TIMEOUT_SECONDS):
+    """Scrapes `site` without a browser. Returns {"title", "price", "link"}, or None if the page lists no match.
+
+    Raises FetchFailed if the page could not be fetched or parsed.
+    """
+    with tracing.span("http_fetch"):
+        url, html = fetch_search_page(site, product_name, timeout=timeout)
+    if not html:
+        raise FetchFailed(f"{site} search page for '{product_name}' could not be fetched.")
+    snapshots.record(site, product_name, html, url)
+    _, parse = SITES[site]
+    try:
+        with tracing.span("http_extraction"):
+            return parse(html, product_name, base_url=url)
+    except Exception as e:
+        logging.warning(f"{site} fast extraction failed for '{product_name}': {e}")
+        raise FetchFailed(f"{site} search page for '{product_name}' could not be parsed: {e}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Scrape one site over plain HTTP.")
+    parser.add_argument("site", choices=sorted(SITES))
+    parser.add_argument("product_name")
+    parser.add_argument("--html", help="Parse this saved HTML file instead of fetching the live page.")
+    args = parser.parse_args()
+
+    if args.html:
+        with open(args.html, encoding="utf-8") as f:
+            result = SITES[args.site][1](f.read(), args.product_name)
+    else:
+        result = scrape_fast(args.site, args.product_name)
+    print(json.dumps(result))
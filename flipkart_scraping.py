@@ -1,299 +1,281 @@
 import logging
 import json
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
+from driver_pool import launch_driver
+import extraction
+import browser_profile
+import tracing
+import snapshots
+import waits
+import warm_profiles
 import sys
-import time
+import os
+from urllib.parse import quote_plus
 
 logging.basicConfig(level=logging.INFO)
 
-def scrape_flipkart(product_name):
-    driver = None
+# Storefront root; point it at a local stand-in site for testing
+FLIPKART_BASE_URL = os.environ.get("FLIPKART_BASE_URL", "https://www.flipkart.com").rstrip("/")
+
+# Origins whose storage is wiped when a pooled driver is handed back
+FLIPKART_ORIGINS = [FLIPKART_BASE_URL]
+
+# "direct" opens the search results URL; "interactive" types into the home page search box
+NAVIGATION_MODE = os.environ.get("NAVIGATION_MODE", "direct")
+
+FLIPKART_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.88 Safari/537.36"
+
+# Close button of the login popup shown to new visitors
+LOGIN_POPUP_SELECTORS = ["button._2doB4z"]
+
+# Header search box, newest class first
+SEARCH_BOX_SELECTORS = [
+    "input._3704LK",
+    "input.Pke_EE",
+    "input[title='Search for products, brands and more']" # Robust selector by title
+]
+
+grocery_keywords_for_filter = ["potato", "onion", "tomato", "ginger", "garlic", "vegetable", "fruit"] # Add more
+
+RESULT_CONTAINER_SELECTORS = [
+    "div[data-id]",
+    "div._1AtVbE",
+    "div.slAVV4", # Seen in your onion screenshot for individual product containers
+    "div._7UHT_c" # Another common product wrapper
+]
+
+
+def is_grocery(product_name):
+    return any(keyword in product_name.lower() for keyword in grocery_keywords_for_filter)
+
+
+def build_search_url(product_name):
+    """URL of Flipkart's search results page for `product_name`, scoped to Flipkart Grocery for groceries."""
+    url = f"{FLIPKART_BASE_URL}/search?q={quote_plus(product_name)}"
+    if is_grocery(product_name):
+        url += "&marketplace=GROCERY"  # Flipkart Grocery, so fresh produce ranks above snacks and seeds
+    return url
+
+
+def build_chrome_options():
+    """Chrome options used for every Flipkart browser, pooled or not."""
+    # Set BROWSER_PROFILE=full to get a visible, maximized browser for debugging
+    options = browser_profile.build_options(FLIPKART_USER_AGENT)
+    options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    options.add_experimental_option('useAutomationExtension', False)
+    return options
+
+
+def close_login_popup(driver):
+    """Closes the login popup if it is showing."""
+    tracing.phase("modal_dismissal")
+    if not warm_profiles.wait_for_overlays(driver, LOGIN_POPUP_SELECTORS, SEARCH_BOX_SELECTORS):
+        logging.info("No login popup on the page, skipping dismissal.")
+        return
     try:
-        options = Options()
-        # options.add_argument("--headless") # Uncomment this for production without browser GUI
-        options.add_argument("--disable-gpu")
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-dev-shm-usage")
-        options.add_argument("start-maximized")
-        options.add_experimental_option("excludeSwitches", ["enable-automation"])
-        options.add_experimental_option('useAutomationExtension', False)
-        options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.88 Safari/537.36")
-
-        logging.info("Initializing WebDriver for Flipkart...")
-        service = Service(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service, options=options)
-        
-        # Always start on the main Flipkart page for consistent behavior
-        driver.get("https://www.flipkart.com/")
-        logging.info("Navigated to Flipkart.com")
-
-        # Attempt to close login popup
-        try:
-            WebDriverWait(driver, 5).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "button._2doB4z"))
-            ).click()
-            logging.info("Closed login popup.")
-        except Exception as e:
-            logging.info(f"No login popup found or could not close it: {e}")
-
-        # Search for the product
-        logging.info("Attempting to find search box...")
-        search_box_selectors = [
-            "input._3704LK",
-            "input.Pke_EE",
-            "input[title='Search for products, brands and more']" # Robust selector by title
-        ]
-        search_box = None
-        for selector in search_box_selectors:
-            try:
-                search_box = WebDriverWait(driver, 10).until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, selector))
-                )
-                break
-            except:
-                continue
-
-        if not search_box:
-            raise Exception("Search box element not found.")
-
-        # Potentially use a more specific query for certain items
-        # Example: if user searched "potato", use "fresh potato" for the search query
-        # This is a small optimization but filtering is the main solution
-        # product_name_for_search = product_name
-        # if product_name.lower() == "potato":
-        #     product_name_for_search = "fresh potato" # Still might not be enough on its own
-
-        search_box.send_keys(product_name) # Use original product_name
-        logging.info(f"Entered '{product_name}' into search box.")
-
-        logging.info("Attempting to find and click search button...")
-        search_button_selectors = [
-            "button.L0Z3Pu",
-            "button[type='submit']",
-            "button._2iLDpG",
-            "svg._34RNph" # Magnifying glass icon
-        ]
-        search_button = None
-        for selector in search_button_selectors:
-            try:
-                search_button = WebDriverWait(driver, 5).until(
-                    EC.element_to_be_clickable((By.CSS_SELECTOR, selector))
-                )
-                search_button.click()
-                logging.info(f"Clicked search button using selector: {selector}")
-                break
-            except Exception as e:
-                logging.debug(f"Search button selector '{selector}' failed: {e}")
-                continue
-
-        if not search_button:
-            logging.info("No explicit search button found, attempting to press ENTER on search box.")
-            search_box.send_keys(Keys.ENTER)
-            logging.info("Pressed ENTER on search box.")
-            time.sleep(2) # Give a little extra time after ENTER
-
-        # --- NEW: Attempt to apply category filter for groceries ---
-        grocery_keywords_for_filter = ["potato", "onion", "tomato", "ginger", "garlic", "vegetable", "fruit"] # Add more
-        if any(keyword in product_name.lower() for keyword in grocery_keywords_for_filter):
-            logging.info(f"'{product_name}' identified as potential grocery item. Attempting to apply 'Vegetables' filter.")
-            try:
-                # Based on your screenshot, this XPath should be robust
-                # Look for the link within the "Fresh Vegetables" category
-                # It's an anchor tag with title "Fresh Vegetables" likely under CATEGORIES
-                
-                # First, ensure the CATEGORIES section is visible if it's collapsible
-                # (Not strictly necessary if always expanded, but good practice)
-                # category_header = WebDriverWait(driver, 5).until(
-                #     EC.presence_of_element_located((By.XPATH, "//div[text()='CATEGORIES']"))
-                # )
-
-                # Find the 'Fresh Vegetables' link/element
-                # Try by title attribute, or exact text, or specific classes
-                fresh_vegetables_filter_selectors = [
-                    # This XPath finds an 'a' tag whose 'title' attribute contains 'Fresh Vegetables'
-                    "//a[contains(@title, 'Fresh Vegetables')]",
-                    # This XPath finds an 'a' tag within a div with class '_1KOcBL' and span text 'Fresh Vegetables'
-                    "//div[@class='_1KOcBL']//span[text()='Fresh Vegetables']/ancestor::a",
-                    # Direct link class for Fresh Vegetables if it's common
-                    "a[href*='/fresh-vegetables/']"
-                ]
-                
-                fresh_vegetables_filter = None
-                for selector in fresh_vegetables_filter_selectors:
-                    try:
-                        # Use XPath or CSS_SELECTOR as appropriate
-                        if selector.startswith("//"): # It's an XPath
-                            fresh_vegetables_filter = WebDriverWait(driver, 7).until(
-                                EC.element_to_be_clickable((By.XPATH, selector))
-                            )
-                        else: # It's a CSS Selector
-                            fresh_vegetables_filter = WebDriverWait(driver, 7).until(
-                                EC.element_to_be_clickable((By.CSS_SELECTOR, selector))
-                            )
+        selector = waits.wait_for_any(driver, LOGIN_POPUP_SELECTORS, 5)
+        if not selector:
+            logging.info("No login popup found.")
+            return
+        driver.find_element(By.CSS_SELECTOR, selector).click()
+        logging.info("Closed login popup.")
+    except waits.BudgetExhausted:
+        raise
+    except Exception as e:
+        logging.info(f"No login popup found or could not close it: {e}")
+
+
+def warm_up_session(driver):
+    """Visits the Flipkart home page once to close its login popup, for the saved warm profile."""
+    waits.navigate(driver, f"{FLIPKART_BASE_URL}/")
+    close_login_popup(driver)
+
+
+def search_interactively(driver, product_name):
+    """Reaches the results page the slow way: home page, login popup, typed search."""
+    # Always start on the main Flipkart page for consistent behavior
+    tracing.phase("navigation")
+    waits.navigate(driver, f"{FLIPKART_BASE_URL}/")
+    logging.info("Navigated to Flipkart.com")
+
+    close_login_popup(driver)
+
+    # Search for the product
+    tracing.phase("search_submit")
+    logging.info("Attempting to find search box...")
+    _, search_box = waits.race_selectors(driver, "flipkart", "search_box", SEARCH_BOX_SELECTORS, 10, visible=False)
+
+    if not search_box:
+        raise Exception("Search box element not found.")
+
+    # Potentially use a more specific query for certain items
+    # Example: if user searched "potato", use "fresh potato" for the search query
+    # This is a small optimization but filtering is the main solution
+    # product_name_for_search = product_name
+    # if product_name.lower() == "potato":
+    #     product_name_for_search = "fresh potato" # Still might not be enough on its own
+
+    search_box.send_keys(product_name) # Use original product_name
+    logging.info(f"Entered '{product_name}' into search box.")
+
+    logging.info("Attempting to find and click search button...")
+    search_button_selectors = [
+        "button.L0Z3Pu",
+        "button[type='submit']",
+        "button._2iLDpG",
+        "svg._34RNph" # Magnifying glass icon
+    ]
+
+    selector, search_button = waits.race_selectors(driver, "flipkart", "search_button", search_button_selectors, 5)
+    if search_button:
+        search_button.click()
+        logging.info(f"Clicked search button using selector: {selector}")
+    else:
+        logging.info("No explicit search button found, attempting to press ENTER on search box.")
+        search_box.send_keys(Keys.ENTER)
+        logging.info("Pressed ENTER on search box.")
+
+
+def open_search_results(driver, product_name):
+    """Loads the results page straight from its URL. Returns False if no product card showed up."""
+    url = build_search_url(product_name)
+    try:
+        tracing.phase("navigation")
+        waits.navigate(driver, url)
+        tracing.phase("result_wait")
+        if not waits.wait_for_any(driver, RESULT_CONTAINER_SELECTORS, 15):
+            raise Exception("No product card appeared.")
+        logging.info(f"Opened search results directly: {url}")
+        return True
+    except waits.BudgetExhausted:
+        raise
+    except Exception as e:
+        logging.info(f"Direct navigation to {url} did not reach the result list, using the interactive search. ({e})")
+        return False
+
+
+def scrape_flipkart(product_name, driver=None):
+    """Searches Flipkart for `product_name` and returns {"title", "price", "link"} or None.
+
+    Pass a leased `driver` to reuse a pooled browser; otherwise a fresh one is
+    launched and quit when the scrape ends. The scrape gets SCRAPE_BUDGET_SECONDS;
+    if that runs out, whatever the page shows by then is returned with "partial" set.
+    None means the site listed no match; a scrape that failed before it could tell raises.
+    """
+    owns_driver = driver is None
+    try:
+        if owns_driver:
+            logging.info("Initializing WebDriver for Flipkart...")
+            driver = launch_driver(build_chrome_options())
+        with waits.budget():
+            browser_profile.reset_page_metrics(driver)
+            warm_profiles.apply("flipkart", driver, warm_up_session, build_chrome_options, rewarm=not owns_driver)
+
+            results_loaded = False
+            if NAVIGATION_MODE == "direct":
+                results_loaded = open_search_results(driver, product_name)
+            if not results_loaded:
+                search_interactively(driver, product_name)
+
+            # --- NEW: Attempt to apply category filter for groceries ---
+            # The direct URL is already scoped to Flipkart Grocery; a typed search is not
+            if is_grocery(product_name) and not results_loaded:
+                tracing.phase("category_filter")
+                logging.info(f"'{product_name}' identified as potential grocery item. Attempting to apply 'Vegetables' filter.")
+                try:
+                    # Based on your screenshot, this XPath should be robust
+                    # Look for the link within the "Fresh Vegetables" category
+                    # It's an anchor tag with title "Fresh Vegetables" likely under CATEGORIES
+
+                    # First, ensure the CATEGORIES section is visible if it's collapsible
+                    # (Not strictly necessary if always expanded, but good practice)
+                    # category_header = WebDriverWait(driver, 5).until(
+                    #     EC.presence_of_element_located((By.XPATH, "//div[text()='CATEGORIES']"))
+                    # )
+
+                    # Find the 'Fresh Vegetables' link/element
+                    # Try by title attribute, or exact text, or specific classes
+                    fresh_vegetables_filter_selectors = [
+                        # This XPath finds an 'a' tag whose 'title' attribute contains 'Fresh Vegetables'
+                        "//a[contains(@title, 'Fresh Vegetables')]",
+                        # This XPath finds an 'a' tag within a div with class '_1KOcBL' and span text 'Fresh Vegetables'
+                        "//div[@class='_1KOcBL']//span[text()='Fresh Vegetables']/ancestor::a",
+                        # Direct link class for Fresh Vegetables if it's common
+                        "a[href*='/fresh-vegetables/']"
+                    ]
+
+                    # XPath and CSS selectors are raced together
+                    selector, fresh_vegetables_filter = waits.race_selectors(
+                        driver, "flipkart", "vegetables_filter", fresh_vegetables_filter_selectors, 7
+                    )
+                    if fresh_vegetables_filter:
+                        token = waits.mark_page(driver)
                         fresh_vegetables_filter.click()
                         logging.info(f"Clicked 'Fresh Vegetables' filter using selector: {selector}")
-                        time.sleep(5) # Wait for results to re-filter
-                        break # Filter applied, exit loop
-                    except Exception as e:
-                        logging.debug(f"Filter selector '{selector}' failed: {e}")
-                        continue
-
-                if not fresh_vegetables_filter:
-                    logging.warning("Could not find or click 'Fresh Vegetables' filter. Proceeding with unfiltered results.")
-
-            except Exception as e:
-                logging.warning(f"Error attempting to apply 'Fresh Vegetables' filter: {e}")
-
-        # --- End NEW filtering logic ---
-
-
-        # Wait for search results to load (first product card)
-        logging.info("Waiting for first product result to appear...")
-        product_container_selectors = [
-            "div[data-id]",
-            "div._1AtVbE",
-            "div.slAVV4", # Seen in your onion screenshot for individual product containers
-            "div._7UHT_c" # Another common product wrapper
-        ]
-
-        found_container = False
-        for selector in product_container_selectors:
-            try:
-                WebDriverWait(driver, 15).until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, selector))
-                )
-                found_container = True
-                break
-            except:
-                continue
-        
-        if not found_container:
-            raise Exception("Search results or first product card did not load within timeout.")
-        
-        logging.info("Search results or first product card loaded.")
-
-        # Find all product containers
-        product_containers = driver.find_elements(By.CSS_SELECTOR, "div[data-id]")
-        if not product_containers: # Also try other main container if data-id doesn't yield
-             product_containers = driver.find_elements(By.CSS_SELECTOR, "div._1AtVbE")
-        if not product_containers:
-            product_containers = driver.find_elements(By.CSS_SELECTOR, "div.slAVV4") # From onion screenshot
-
-        logging.info(f"Found {len(product_containers)} potential product result containers after filtering attempt.")
-
-        output_data = None
-
-        if not product_containers:
-            logging.warning("No product containers found on the page after all attempts.")
+                        # Wait for results to re-filter: a new page, or the list changing and settling
+                        if not waits.wait_for_update(driver, token, 5):
+                            logging.info("Results did not visibly change after the filter click.")
+
+                    if not fresh_vegetables_filter:
+                        logging.warning("Could not find or click 'Fresh Vegetables' filter. Proceeding with unfiltered results.")
+
+                except waits.BudgetExhausted:
+                    raise
+                except Exception as e:
+                    logging.warning(f"Error attempting to apply 'Fresh Vegetables' filter: {e}")
+
+            # --- End NEW filtering logic ---
+
+
+            # Wait for search results to load (first product card)
+            tracing.phase("result_wait")
+            logging.info("Waiting for first product result to appear...")
+            found_selector, _ = waits.race_selectors(
+                driver, "flipkart", "results_wait", RESULT_CONTAINER_SELECTORS, 15, visible=False
+            )
+
+            if not found_selector:
+                raise Exception("Search results or first product card did not load within timeout.")
+
+            logging.info("Search results or first product card loaded.")
+            browser_profile.log_page_metrics(driver, "flipkart")
+
+        # Pull the whole result list in one round trip and extract locally
+        tracing.phase("extraction")
+        html = driver.page_source
+        snapshots.record("flipkart", product_name, html, driver.current_url)
+        output_data = extraction.parse_flipkart_results(html, product_name, base_url=driver.current_url)
+        if output_data:
+            logging.info(f"Successfully extracted data for: {output_data['title']}")
         else:
-            for container in product_containers:
-                title = None
-                price_str = None
-                link = None
-
-                # ---- Title Extraction ----
-                title_selectors = [
-                    "a.wjcEIp",            # New: Found for 'tomato ketchup' and likely for veggies too
-                    "div._4rR01T",        # Common for electronics
-                    "a.s1Q9rs",            # Another common product title/link
-                    "h1[itemprop='name']", # Generic high-level title
-                    "span.B_NuCI",         # Another common title class
-                    "div.col.col-7-12 > div:nth-child(1)", # Common for text in product card
-                    "a.s1Q9rs"             # Specific for onion link text from your screenshot
-                ]
-                for selector in title_selectors:
-                    try:
-                        title_element = container.find_element(By.CSS_SELECTOR, selector)
-                        title = title_element.text.strip()
-                        if title:
-                            # Optional: Add a check here to ensure it's not "chips" if searching for "potato"
-                            if product_name.lower() == "potato" and "chips" in title.lower():
-                                title = None # Skip this if it's chips and we're looking for potato
-                                continue
-                            break
-                    except:
-                        continue
-
-                # ---- Price Extraction ----
-                price_selectors = [
-                    "div.Nx9bqj",
-                    "div.Nx9bqj._4b5DiR",
-                    "div._30jeq3._1_WHN1",
-                    "div._30jeq3",
-                    "span.current-price",
-                    "span._8VnyB",
-                    "div._30jeq3" # Very common price class
-                ]
-                for selector in price_selectors:
-                    try:
-                        price_element = container.find_element(By.CSS_SELECTOR, selector)
-                        price_str = price_element.text.replace("₹", "").replace(",", "").strip()
-                        if price_str:
-                            break
-                    except:
-                        continue
-                
-                price = None
-                if price_str:
-                    try:
-                        price = float(price_str)
-                    except ValueError:
-                        logging.warning(f"Could not convert price string '{price_str}' to float from container {container.get_attribute('data-id')}.")
-
-                # ---- Link Extraction ----
-                link_selectors = [
-                    "a.wjcEIp",          # New: Found for 'tomato ketchup' and likely for veggies too
-                    "a._1fQZEK",        # Common for electronics
-                    "a.CGtC98",          # Specific for iPhone 15 link
-                    "a.IRpwQq",           # Another general link class
-                    "a[rel='noopener noreferrer']" # Generic link that opens in new tab
-                ]
-                for selector in link_selectors:
-                    try:
-                        link_element = container.find_element(By.CSS_SELECTOR, selector)
-                        link = link_element.get_attribute('href')
-                        if link and not link.startswith("http"):
-                            link = "https://www.flipkart.com" + link
-                        if link:
-                            break
-                    except:
-                        continue
-
-                if title and price is not None and link:
-                    output_data = {
-                        "title": title,
-                        "price": price,
-                        "link": link
-                    }
-                    logging.info(f"Successfully extracted data for: {title}")
-                    break
-
-            if output_data:
-                print(json.dumps(output_data))
-            else:
-                logging.warning("No complete product data found after trying all containers.")
-                print(json.dumps(None))
+            logging.warning("No complete product data found after trying all containers.")
+        tracing.end_phase()
+
+        return output_data
+
+    except waits.BudgetExhausted as e:
+        tracing.fail_phase()
+        logging.warning(f"{e} Returning what the Flipkart page shows so far.")
+        result = waits.partial_result(driver, extraction.parse_flipkart_results, product_name)
+        if result is None:
+            raise   # Nothing usable yet is not the same as "no results"
+        return result
 
     except Exception as e:
+        tracing.fail_phase()
         logging.error(f"An unexpected error occurred during scraping: {e}", exc_info=True)
-        print(json.dumps(None))
+        raise
 
     finally:
-        if driver:
+        if owns_driver and driver:
             driver.quit()
             logging.info("WebDriver closed.")
 
 if __name__ == '__main__':
     if len(sys.argv) > 1:
         product_name = sys.argv[1]
-        scrape_flipkart(product_name)
+        print(json.dumps(scrape_flipkart(product_name)))
     else:
         logging.error("Please provide a product name as an argument.")
         print(json.dumps(None))
\ No newline at end of file
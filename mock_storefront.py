@@ -0,0 +1,179 @@
+"""Local stand-in for the Amazon and Flipkart storefronts, serving the saved pages in fixtures/.
+
+    python mock_storefront.py --port 8765
+    AMAZON_BASE_URL=http://127.0.0.1:8765/amazon FLIPKART_BASE_URL=http://127.0.0.1:8765/flipkart python fast_fetch.py amazon potato
+
+Every search returns the same saved results page, with the DOM the scrapers expect.
+Home pages carry just the search box and button the interactive flow looks for.
+Prefix a site with /broken (http://127.0.0.1:8765/broken/amazon) to get pages whose
+primary selectors were renamed, so the scrapers have to fall back or give up.
+
+Faults can be injected per site to exercise hedging and the circuit breakers:
+--error-rate answers that share of requests with a 503, picked at random, and
+--slow-rate delays that share by --slow-ms. Slow requests are spread evenly, starting
+with the first one after the rate is set, so even a short run sees its share. They can
+be changed on a running storefront too:
+
+    curl 'http://127.0.0.1:8765/_faults?site=amazon&error_rate=1'
+    curl 'http://127.0.0.1:8765/_faults?site=amazon&error_rate=0&slow_rate=0.1&slow_ms=3000'
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+SEARCH_PAGES = {
+    "amazon": ("/s", "amazon_search.html"),
+    "flipkart": ("/search", "flipkart_search.html"),
+}
+
+HOME_PAGES = {
+    "amazon": (
+        '<html><body><form action="s" method="get">'
+        '<input id="twotabsearchtextbox" name="k" type="text">'
+        '<input id="nav-search-submit-button" type="submit" value="Go">'
+        "</form></body></html>"
+    ),
+    "flipkart": (
+        '<html><body><form action="search" method="get">'
+        "<input name=\"q\" type=\"text\" title=\"Search for products, brands and more\">"
+        '<button type="submit">Search</button>'
+        "</form></body></html>"
+    ),
+}
+
+# Renames applied under /broken: Amazon loses its only result selector, while Flipkart's
+# price moves to an older class that is further down its fallback list.
+BROKEN_REPLACEMENTS = {
+    "amazon": [('data-component-type="s-search-result"', 'data-component-type="s-search-result-v2"')],
+    "flipkart": [('class="Nx9bqj', 'class="_30jeq3')],
+}
+
+
+def load_page(site, broken=False):
+    with open(os.path.join(FIXTURE_DIR, SEARCH_PAGES[site][1]), encoding="utf-8") as f:
+        html = f.read()
+    if broken:
+        for old, new in BROKEN_REPLACEMENTS[site]:
+            html = html.replace(old, new)
+    return html
+
+
+def no_faults():
+    return {"error_rate": 0.0, "slow_rate": 0.0, "slow_ms": 0.0}
+
+
+class StorefrontHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive, like the real sites
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+    delay = 0.0                     # Seconds added to every response
+    pages = {}                      # (site, broken) -> search page HTML
+    faults = {}                     # site -> no_faults()-shaped dict
+    slow_credit = {}                # site -> slow requests owed; one is served whenever it reaches 1
+    lock = threading.Lock()
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/_faults":
+            return self._set_faults(dict(parse_qsl(url.query)))
+        parts = url.path.strip("/").split("/")
+        broken = parts[0] == "broken"
+        if broken:
+            parts = parts[1:]
+        site, rest = parts[0], "/" + "/".join(parts[1:])
+        if site not in SEARCH_PAGES:
+            return self._send(404, "<html><body>Not found</body></html>")
+
+        if self.delay:
+            time.sleep(self.delay)
+        faults = self.faults[site]
+        if self._slow(site):
+            time.sleep(faults["slow_ms"] / 1000)
+        if random.random() < faults["error_rate"]:
+            return self._send(503, "<html><body>Service Unavailable</body></html>")
+        if rest == SEARCH_PAGES[site][0]:
+            return self._send(200, self.pages[(site, broken)])
+        if rest == "/":
+            return self._send(200, HOME_PAGES[site])
+        return self._send(404, "<html><body>Not found</body></html>")
+
+    def _slow(self, site):
+        with self.lock:
+            rate = self.faults[site]["slow_rate"]
+            credit = self.slow_credit.get(site, 1.0)
+            slow = rate > 0 and credit >= 1 - 1e-9
+            self.slow_credit[site] = credit - slow + rate
+            return slow
+
+    def _set_faults(self, params):
+        sites = [params.pop("site")] if "site" in params else list(SEARCH_PAGES)
+        try:
+            for site in sites:
+                self.faults[site].update({name: float(value) for name, value in params.items() if name in self.faults[site]})
+                if "slow_rate" in params:
+                    self.slow_credit[site] = 1.0
+        except (KeyError, ValueError) as e:
+            return self._send(400, f"<html><body>Bad fault setting: {e}</body></html>")
+        logging.info(f"storefront faults: {self.faults}")
+        return self._send(200, json.dumps(self.faults), "application/json")
+
+    def _send(self, status, html, content_type="text/html; charset=utf-8"):
+        body = html.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug(f"storefront: {format % args}")
+
+
+def start_storefront(host="127.0.0.1", port=0, delay=0.0, faults=None):
+    """Serves the mock storefront on a background thread. Returns (server, root_url).
+
+    `faults` maps a site to its initial fault settings (see `no_faults`); the live
+    settings are `server.RequestHandlerClass.faults`.
+    """
+    handler = type("Handler", (StorefrontHandler,), {
+        "delay": delay,
+        "faults": {site: dict(no_faults(), **(faults or {}).get(site, {})) for site in SEARCH_PAGES},
+        "slow_credit": {},
+        "lock": threading.Lock(),
+        "pages": {(site, broken): load_page(site, broken) for site in SEARCH_PAGES for broken in (False, True)},
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="mock-storefront", daemon=True).start()
+    root_url = f"http://{host}:{server.server_address[1]}"
+    logging.info(f"Mock storefront serving {', '.join(f'{root_url}/{site}' for site in SEARCH_PAGES)}")
+    return server, root_url
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve saved Amazon and Flipkart pages locally.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay-ms", type=float, default=0, help="Latency added to every response.")
+    parser.add_argument("--error-rate", type=float, default=0, help="Share of requests answered with a 503.")
+    parser.add_argument("--slow-rate", type=float, default=0, help="Share of requests delayed by --slow-ms, spread evenly.")
+    parser.add_argument("--slow-ms", type=float, default=3000)
+    parser.add_argument("--fault-site", choices=list(SEARCH_PAGES), help="Inject faults into this site only.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    fault = {"error_rate": args.error_rate, "slow_rate": args.slow_rate, "slow_ms": args.slow_ms}
+    faults = {site: fault for site in SEARCH_PAGES if args.fault_site in (None, site)}
+    server, root_url = start_storefront(args.host, args.port, args.delay_ms / 1000, faults)
+    print(f"AMAZON_BASE_URL={root_url}/amazon FLIPKART_BASE_URL={root_url}/flipkart")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,126 @@
+"""Single entry point for running one site scrape inside a long-lived process.
+
+Tries the browser-free HTTP path first and falls back to Selenium on a pooled
+driver only when that finds nothing.
+"""
+import logging
+import os
+import threading
+import amazon_scraping
+import flipkart_scraping
+import driver_pool
+import fast_fetch
+import shared_browser
+import tracing
+import waits
+
+FAST_EXTRACTION = os.environ.get("FAST_EXTRACTION", "1") == "1"
+DRIVER_POOL_SIZE = int(os.environ.get("DRIVER_POOL_SIZE", "1"))
+DRIVER_POOL_MAX_USES = int(os.environ.get("DRIVER_POOL_MAX_USES", "50"))
+DRIVER_POOL_MAX_RSS_MB = int(os.environ.get("DRIVER_POOL_MAX_RSS_MB", "1500"))
+# "separate" keeps a pool of browsers per site; "shared" runs each site in its own tab of a
+# browser shared by both sites, DRIVER_POOL_SIZE browsers in all (see shared_browser.py)
+BROWSER_MODE = os.environ.get("BROWSER_MODE", "separate")
+
+SITES = {
+    "amazon": (amazon_scraping.scrape_amazon, amazon_scraping.build_chrome_options, amazon_scraping.AMAZON_ORIGINS),
+    "flipkart": (flipkart_scraping.scrape_flipkart, flipkart_scraping.build_chrome_options, flipkart_scraping.FLIPKART_ORIGINS),
+}
+
+USER_AGENTS = {
+    "amazon": amazon_scraping.AMAZON_USER_AGENT,
+    "flipkart": flipkart_scraping.FLIPKART_USER_AGENT,
+}
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def shared_browser_options():
+    """Launch options of a shared browser; each tab sets its own site's user agent."""
+    return flipkart_scraping.build_chrome_options()
+
+
+def shared_pool():
+    """Returns the process-wide shared browser pool, creating and warming it on first use."""
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            # Limits are per browser, and a shared browser serves every site
+            _shared_pool = shared_browser.SharedBrowserPool(
+                shared_browser_options,
+                USER_AGENTS,
+                size=DRIVER_POOL_SIZE,
+                max_uses=DRIVER_POOL_MAX_USES * len(SITES),
+                max_rss_mb=DRIVER_POOL_MAX_RSS_MB * len(SITES),
+            )
+            _shared_pool.start_in_background()
+        return _shared_pool
+
+
+def pool_for(site):
+    _, options_factory, origins = SITES[site]
+    return driver_pool.get_pool(
+        site,
+        options_factory,
+        size=DRIVER_POOL_SIZE,
+        max_uses=DRIVER_POOL_MAX_USES,
+        max_rss_mb=DRIVER_POOL_MAX_RSS_MB,
+        reset_origins=origins,
+    )
+
+
+def warm_up():
+    """Starts launching pooled browsers for every site before the first request arrives."""
+    if BROWSER_MODE == "shared":
+        shared_pool()
+        return
+    for site in SITES:
+        pool_for(site)
+
+
+def lease_driver(site, timeout=None):
+    """Leases a browser for one scrape of `site`, in whichever browser mode is configured."""
+    if BROWSER_MODE == "shared":
+        return shared_pool().lease(site, timeout=timeout)
+    return pool_for(site).lease(timeout=timeout)
+
+
+def pool_stats(site):
+    if BROWSER_MODE == "shared":
+        return shared_pool().stats()
+    return pool_for(site).stats()
+
+
+def close_pools():
+    with _shared_pool_lock:
+        if _shared_pool is not None:
+            _shared_pool.close()
+    driver_pool.close_all_pools()
+
+
+def run_scrape(site, product_name, timeout=None, trace=None):
+    """Scrapes `site` for `product_name`, returning {"title", "price", "link"} or None.
+
+    None means the site listed no matching product; a scrape that could not tell
+    raises instead. Pass a `tracing.Trace` to collect per-phase timings of this scrape.
+    """
+    if site not in SITES:
+        raise ValueError(f"Unknown site: {site!r}")
+
+    # One budget covers the HTTP fetch, the lease and the scrape; the scraper's own waits stay within it
+    with tracing.activate(trace or tracing.Trace(site)), waits.budget(timeout or waits.SCRAPE_BUDGET_SECONDS) as budget:
+        if FAST_EXTRACTION:
+            try:
+                result = fast_fetch.scrape_fast(site, product_name, timeout=budget.cap(fast_fetch.FETCH_TIMEOUT_SECONDS))
+            except fast_fetch.FetchFailed as e:
+                logging.info(f"{e} Falling back to the browser.")
+                result = None
+            if result:
+                logging.info(f"{site} answered over plain HTTP for '{product_name}'.")
+                return result
+            logging.info(f"{site} HTTP extraction found nothing for '{product_name}', falling back to the browser.")
+
+        scrape = SITES[site][0]
+        with lease_driver(site, timeout=budget.cap(budget.remaining())) as driver:
+            return scrape(product_name, driver=driver)
@@ -0,0 +1,127 @@
+"""Long-lived scraper worker speaking newline-delimited JSON over stdin/stdout.
+
+Each request line looks like
+    {"id": "42", "site": "amazon", "query": "iphone 15", "timeout": 60}
+and is answered, possibly out of order, with
+    {"id": "42", "ok": true, "result": {"title": ..., "price": ..., "link": ...}, "seconds": 12.3, "spans": [...]}
+or {"id": "42", "ok": false, "error": "..."}.
+
+Successful responses also carry "spans": the per-phase timings of that scrape.
+A {"id": ..., "op": "ping"} request is answered with {"id": ..., "ok": true, "result": "pong"}.
+A {"op": "cancel", "target": "42"} request, sent when the client stopped waiting, drops
+request 42 if it has not started yet. If it is running, its time budget is cancelled, so
+the scrape gives up at its next wait. It is not answered.
+Logging goes to stderr so stdout carries protocol lines only.
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Keep stray prints from Selenium or webdriver_manager off the protocol stream.
+_protocol_out = sys.stdout
+sys.stdout = sys.stderr
+
+logging.basicConfig(level=logging.INFO, stream=sys.stderr, format='%(asctime)s - worker %(process)d - %(levelname)s - %(message)s')
+
+import scrape_runner
+import tracing
+import waits
+
+WORKER_CONCURRENCY = int(os.environ.get("WORKER_CONCURRENCY", "2"))
+
+_write_lock = threading.Lock()
+_requests_lock = threading.Lock()
+_budgets = {}         # request id -> time budget of its running scrape
+_cancelled = set()    # request ids the client stopped waiting for
+
+
+def send(message):
+    line = json.dumps(message)
+    with _write_lock:
+        _protocol_out.write(line + "\n")
+        _protocol_out.flush()
+
+
+def handle(request):
+    request_id = request.get("id")
+    started = time.perf_counter()
+    try:
+        if request.get("op") == "ping":
+            send({"id": request_id, "ok": True, "result": "pong"})
+            return
+
+        site = request.get("site")
+        query = request.get("query")
+        if site not in scrape_runner.SITES or not query:
+            send({"id": request_id, "ok": False, "error": f"Bad request for site={site!r} query={query!r}"})
+            return
+
+        trace = tracing.Trace(site)
+        with waits.budget(request.get("timeout") or waits.SCRAPE_BUDGET_SECONDS) as budget:
+            with _requests_lock:
+                if request_id in _cancelled:
+                    _cancelled.discard(request_id)
+                    logging.info(f"Request {request_id} was cancelled before it started.")
+                    send({"id": request_id, "ok": False, "error": "cancelled"})
+                    return
+                _budgets[request_id] = budget
+            try:
+                result = scrape_runner.run_scrape(site, query, timeout=request.get("timeout"), trace=trace)
+            finally:
+                with _requests_lock:
+                    _budgets.pop(request_id, None)
+                    _cancelled.discard(request_id)
+        send({
+            "id": request_id,
+            "ok": True,
+            "result": result,
+            "seconds": round(time.perf_counter() - started, 3),
+            "spans": trace.spans + tracing.drain_background(),
+        })
+    except Exception as e:
+        logging.error(f"Request {request_id} failed: {e}", exc_info=True)
+        send({"id": request_id, "ok": False, "error": str(e), "seconds": round(time.perf_counter() - started, 3)})
+
+
+def cancel(request_id):
+    with _requests_lock:
+        budget = _budgets.get(request_id)
+        if budget is None:
+            _cancelled.add(request_id)
+    if budget is not None:
+        logging.info(f"Request {request_id} was cancelled, stopping its scrape.")
+        budget.cancel()
+
+
+def main():
+    scrape_runner.warm_up()
+    logging.info(f"Scraper worker ready (concurrency={WORKER_CONCURRENCY}, pool size={scrape_runner.DRIVER_POOL_SIZE}, "
+                 f"browser mode={scrape_runner.BROWSER_MODE}).")
+
+    executor = ThreadPoolExecutor(max_workers=WORKER_CONCURRENCY, thread_name_prefix="worker")
+    try:
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as e:
+                logging.error(f"Ignoring malformed request line: {e}, Raw Input: '{line}'")
+                continue
+            if request.get("op") == "cancel":
+                cancel(request.get("target"))
+                continue
+            executor.submit(handle, request)
+    finally:
+        executor.shutdown(wait=True)
+        scrape_runner.close_pools()
+        logging.info("Scraper worker exiting.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""Per-selector hit-rate and latency statistics.
+
+WebDriver waits (`waits.race_selectors`) use them to prefer the historically best
+selector. Parsing already-loaded HTML keeps its fixed selector order and only records
+outcomes here for reporting. Stats are kept per site and page role (e.g. "flipkart" /
+"search_box") and persisted to a JSON file shared by every scraper process; saves
+merge into it under a file lock. Run `python selector_stats.py` to print them.
+"""
+import atexit
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; saves there are not serialized across processes
+    fcntl = None
+
+SELECTOR_STATS_PATH = os.environ.get(
+    "SELECTOR_STATS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "selector_stats.json")
+)
+SAVE_INTERVAL_SECONDS = 30
+# A selector that has been tried this often without matching for this long is tried last.
+DEMOTE_MIN_TRIES = 5
+DEMOTE_AFTER_SECONDS = 7 * 24 * 3600
+
+
+def _empty():
+    return {"tries": 0, "hits": 0, "hit_ms": 0.0, "miss_ms": 0.0, "last_hit": None}
+
+
+class SelectorStats:
+    def __init__(self, path=SELECTOR_STATS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stats = self._load()
+        self._deltas = {}
+        self._last_save = time.monotonic()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, json.JSONDecodeError) as e:
+            logging.warning(f"Could not read selector stats from {self.path}: {e}")
+            return {}
+
+    def _entry(self, tree, site, role, selector):
+        return tree.setdefault(site, {}).setdefault(role, {}).setdefault(selector, _empty())
+
+    def record(self, site, role, selector, hit, seconds):
+        """Records one attempt of `selector` for `site`/`role`."""
+        now = time.time()
+        with self._lock:
+            for tree in (self._stats, self._deltas):
+                entry = self._entry(tree, site, role, selector)
+                entry["tries"] += 1
+                if hit:
+                    entry["hits"] += 1
+                    entry["hit_ms"] += seconds * 1000
+                    entry["last_hit"] = now
+                else:
+                    entry["miss_ms"] += seconds * 1000
+            due = time.monotonic() - self._last_save > SAVE_INTERVAL_SECONDS
+        if due:
+            self.save()
+
+    def _sort_key(self, site, role, selectors):
+        role_stats = self._stats.get(site, {}).get(role, {})
+        now = time.time()
+
+        def key(indexed):
+            index, selector = indexed
+            entry = role_stats.get(selector)
+            if not entry or not entry["tries"]:
+                return (False, -0.5, 0.0, index)
+            stale = entry["last_hit"] is None or now - entry["last_hit"] > DEMOTE_AFTER_SECONDS
+            demoted = stale and entry["tries"] >= DEMOTE_MIN_TRIES
+            hit_rate = (entry["hits"] + 1) / (entry["tries"] + 2)
+            mean_ms = (entry["hit_ms"] + entry["miss_ms"]) / entry["tries"]
+            return (demoted, -round(hit_rate, 2), mean_ms, index)
+
+        return key
+
+    def order(self, site, role, selectors):
+        """Returns `selectors` best-first: highest hit rate, then lowest latency, then original order."""
+        with self._lock:
+            key = self._sort_key(site, role, selectors)
+            return [selector for _, selector in sorted(enumerate(selectors), key=key)]
+
+    @contextmanager
+    def _file_lock(self):
+        """Holds an exclusive lock on a sidecar file, so processes merging into the stats file take turns."""
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def save(self):
+        """Merges this process's new counts into the stats file."""
+        with self._lock:
+            deltas, self._deltas = self._deltas, {}
+            self._last_save = time.monotonic()
+        if not deltas:
+            return
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with self._file_lock():
+                # Read, merge and replace under the lock, or another process's save in between is lost
+                merged = self._load()
+                for site, roles in deltas.items():
+                    for role, selectors in roles.items():
+                        for selector, delta in selectors.items():
+                            entry = self._entry(merged, site, role, selector)
+                            for field in ("tries", "hits", "hit_ms", "miss_ms"):
+                                entry[field] += delta[field]
+                            if delta["last_hit"] and (entry["last_hit"] or 0) < delta["last_hit"]:
+                                entry["last_hit"] = delta["last_hit"]
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(merged, f, indent=1, sort_keys=True)
+                os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.warning(f"Could not write selector stats to {self.path}: {e}")
+            return
+        with self._lock:
+            self._stats = merged
+            # Counts recorded while we were writing are not in `merged` yet
+            for site, roles in self._deltas.items():
+                for role, selectors in roles.items():
+                    for selector, delta in selectors.items():
+                        entry = self._entry(self._stats, site, role, selector)
+                        for field in ("tries", "hits", "hit_ms", "miss_ms"):
+                            entry[field] += delta[field]
+
+    def report(self):
+        """Rows of (site, role, rank, selector, tries, hit_rate, mean_ms, last_hit) in current try order."""
+        rows = []
+        with self._lock:
+            snapshot = json.loads(json.dumps(self._stats))
+        for site, roles in sorted(snapshot.items()):
+            for role, selectors in sorted(roles.items()):
+                for rank, selector in enumerate(self.order(site, role, list(selectors)), 1):
+                    entry = selectors[selector]
+                    tries = entry["tries"] or 1
+                    rows.append((
+                        site, role, rank, selector, entry["tries"],
+                        entry["hits"] / tries, (entry["hit_ms"] + entry["miss_ms"]) / tries, entry["last_hit"],
+                    ))
+        return rows
+
+
+stats = SelectorStats()
+atexit.register(stats.save)
+
+order = stats.order
+record = stats.record
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else SELECTOR_STATS_PATH
+    for site, role, rank, selector, tries, hit_rate, mean_ms, last_hit in SelectorStats(path).report():
+        last = time.strftime("%Y-%m-%d %H:%M", time.localtime(last_hit)) if last_hit else "never"
+        print(f"{site:9} {role:18} #{rank:<2} {hit_rate:6.1%} {mean_ms:8.0f}ms {tries:6} tries  last hit {last:16}  {selector}")
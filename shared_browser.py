@@ -0,0 +1,347 @@
+"""One Chrome for a whole comparison: each site drives its own tab in an isolated browser context.
+
+The separate mode (default) keeps one browser per site, so a comparison costs two
+Chrome process trees. In shared mode a browser is launched once, and every site
+attaches its own chromedriver session to it over the DevTools port. For each scrape,
+the site's session opens a tab in a fresh browser context, with its own cookies,
+cache and storage, and disposes of the context afterwards. The sites share the
+browser, GPU and network processes. Their sessions send commands independently,
+so both tabs load at the same time.
+
+    python shared_browser.py --comparisons 3    # memory and launch time per comparison, both modes
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+import browser_profile
+import tracing
+from driver_pool import chromedriver_path, driver_rss_mb, launch_driver, DEFAULT_MAX_USES, DEFAULT_MAX_RSS_MB
+
+DEFAULT_POOL_SIZE = 1
+
+
+def attach_driver(debugger_address):
+    """Starts a chromedriver session on an already running Chrome instead of launching one."""
+    options = Options()
+    options.debugger_address = debugger_address
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    with tracing.span("chrome_attach"):
+        return webdriver.Chrome(service=Service(chromedriver_path()), options=options)
+
+
+class SharedBrowser:
+    """A Chrome instance plus one attached session per site."""
+
+    def __init__(self, options, user_agents):
+        started = time.perf_counter()
+        self.owner = launch_driver(options)
+        address = self.owner.capabilities["goog:chromeOptions"]["debuggerAddress"]
+        self.user_agents = dict(user_agents)
+        self.sessions = {}
+        self.home = {}
+        try:
+            for site in self.user_agents:
+                session = attach_driver(address)
+                self.sessions[site] = session
+                self.home[site] = session.current_window_handle
+        except Exception:
+            self.quit()
+            raise
+        self.launch_seconds = time.perf_counter() - started
+        self.uses = 0
+        self.leased = 0
+        self.retiring = False
+        self.closed = False
+
+    @contextmanager
+    def tab(self, site):
+        """Yields `site`'s session focused on a new tab in its own browser context."""
+        driver = self.sessions[site]
+        context = driver.execute_cdp_cmd("Target.createBrowserContext", {"disposeOnDetach": False})["browserContextId"]
+        target = driver.execute_cdp_cmd("Target.createTarget", {"url": "about:blank", "browserContextId": context})["targetId"]
+        try:
+            driver.switch_to.window(target)
+            driver.execute_cdp_cmd("Network.setUserAgentOverride", {"userAgent": self.user_agents[site]})
+            browser_profile.prepare_driver(driver)
+            yield driver
+        finally:
+            driver.switch_to.window(self.home[site])
+            driver.execute_cdp_cmd("Target.closeTarget", {"targetId": target})
+            driver.execute_cdp_cmd("Target.disposeBrowserContext", {"browserContextId": context})
+
+    def healthy(self, site):
+        try:
+            return self.sessions[site].execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    def rss_mb(self):
+        """Memory of Chrome, every process it spawned and all chromedriver sessions, in MB."""
+        total = 0
+        for driver in [self.owner] + list(self.sessions.values()):
+            rss = driver_rss_mb(driver)
+            if rss is None:
+                return None
+            total += rss
+        return total
+
+    def quit(self):
+        # Attached sessions leave the browser running; quitting the owner ends it
+        for driver in list(self.sessions.values()) + [self.owner]:
+            try:
+                driver.quit()
+            except Exception as e:
+                logging.debug(f"Error while quitting shared browser session: {e}")
+
+
+class SharedBrowserPool:
+    """Keeps `size` shared browsers warm. Each one offers one slot per site.
+
+    A site scrape leases any browser whose slot for that site is free, so `size`
+    browsers serve `size` concurrent comparisons. A browser is recycled once it
+    has served `max_uses` scrapes or uses more than `max_rss_mb` of memory.
+    Replacement waits until none of its slots are leased.
+    """
+
+    def __init__(self, options_factory, user_agents, size=DEFAULT_POOL_SIZE, max_uses=DEFAULT_MAX_USES,
+                 max_rss_mb=DEFAULT_MAX_RSS_MB, name="shared"):
+        self.options_factory = options_factory
+        self.user_agents = dict(user_agents)
+        self.size = size
+        self.max_uses = max_uses
+        self.max_rss_mb = max_rss_mb
+        self.name = name
+        self._idle = {site: queue.Queue() for site in self.user_agents}
+        self._lock = threading.Lock()
+        self._live = 0
+        self._closed = False
+        self._browsers = set()
+        self.launched = 0
+        self.recycled = 0
+        self.leases = 0
+        self.launch_seconds_total = 0.0
+
+    # --- Lifecycle ---
+
+    def start(self):
+        """Launches browsers until the pool is full. Safe to call more than once."""
+        while True:
+            with self._lock:
+                if self._closed or self._live >= self.size:
+                    return
+                self._live += 1
+            self._launch_into_pool()
+
+    def start_in_background(self):
+        threading.Thread(target=self.start, name=f"{self.name}-warmup", daemon=True).start()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            browsers = list(self._browsers)
+            self._browsers.clear()
+        for browser in browsers:
+            browser.closed = True
+            browser.quit()
+        logging.info(f"[{self.name}] Shared browser pool closed.")
+
+    def _launch_into_pool(self):
+        try:
+            browser = SharedBrowser(self.options_factory(), self.user_agents)
+        except Exception as e:
+            with self._lock:
+                self._live -= 1
+            logging.error(f"[{self.name}] Failed to launch a shared browser: {e}")
+            return
+        with self._lock:
+            closed = self._closed
+            if closed:
+                self._live -= 1
+            else:
+                self._browsers.add(browser)
+        if closed:
+            browser.closed = True
+            browser.quit()
+            return
+        self.launched += 1
+        self.launch_seconds_total += browser.launch_seconds
+        logging.info(f"[{self.name}] Launched shared browser with {len(self.user_agents)} sessions "
+                     f"in {browser.launch_seconds:.2f}s.")
+        for site in self.user_agents:
+            self._idle[site].put(browser)
+
+    def _retire(self, browser):
+        """Quits `browser` once no site is using it and launches its replacement."""
+        with self._lock:
+            if browser.leased or browser.closed:
+                return
+            browser.closed = True
+            self._browsers.discard(browser)
+            self._live -= 1
+        browser.quit()
+        self.recycled += 1
+        self.start()
+
+    # --- Leasing ---
+
+    @contextmanager
+    def lease(self, site, timeout=None):
+        """Yields a WebDriver focused on a fresh, isolated tab for `site` in a shared browser."""
+        with tracing.span("pool_lease", site=f"{self.name}:{site}"):
+            browser = self._acquire(site, timeout)
+        self.leases += 1
+        try:
+            with browser.tab(site) as driver:
+                yield driver
+        finally:
+            self._release(site, browser)
+
+    def _acquire(self, site, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError(f"Shared browser pool '{self.name}' is closed.")
+                can_grow = self._live < self.size and self._idle[site].empty()
+                if can_grow:
+                    self._live += 1
+            if can_grow:
+                self._launch_into_pool()
+
+            remaining = None if deadline is None else max(0, deadline - time.monotonic())
+            try:
+                browser = self._idle[site].get(timeout=remaining)
+            except queue.Empty:
+                raise TimeoutError(f"No shared browser free for {site} in pool '{self.name}' within {timeout}s.")
+
+            with self._lock:
+                usable = not browser.closed and not browser.retiring
+                if usable:
+                    browser.leased += 1
+            if not usable:
+                continue  # the other site's slot of a browser that has been recycled
+            if browser.healthy(site):
+                return browser
+            logging.warning(f"[{self.name}] Shared browser failed its health check for {site}, replacing it.")
+            browser.retiring = True
+            self._release(site, browser)
+
+    def _release(self, site, browser):
+        with self._lock:
+            browser.leased -= 1
+            browser.uses += 1
+        if not browser.retiring and self._should_recycle(browser):
+            browser.retiring = True
+        if browser.retiring:
+            threading.Thread(target=self._retire, args=(browser,), daemon=True).start()
+            return
+        self._idle[site].put(browser)
+
+    def _should_recycle(self, browser):
+        if self.max_uses and browser.uses >= self.max_uses:
+            logging.info(f"[{self.name}] Recycling shared browser after {browser.uses} scrapes.")
+            return True
+        if self.max_rss_mb:
+            rss = browser.rss_mb()
+            if rss is not None and rss > self.max_rss_mb:
+                logging.info(f"[{self.name}] Recycling shared browser using {rss:.0f} MB (limit {self.max_rss_mb} MB).")
+                return True
+        return False
+
+    def stats(self):
+        with self._lock:
+            browsers = list(self._browsers)
+        memory = [browser.rss_mb() for browser in browsers]
+        return {
+            "name": self.name,
+            "size": self.size,
+            "live": self._live,
+            "idle": {site: slots.qsize() for site, slots in self._idle.items()},
+            "leases": self.leases,
+            "launched": self.launched,
+            "recycled": self.recycled,
+            "launch_seconds_mean": round(self.launch_seconds_total / self.launched, 3) if self.launched else None,
+            "rss_mb_per_browser": [round(rss) for rss in memory if rss is not None] or None,
+        }
+
+
+# --- Footprint report: one comparison's memory and launch time in each mode ---
+
+def measure_separate(sites, query):
+    """Launches one browser per site, runs both scrapes side by side and reports the cost."""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(sites)) as pool:
+        drivers = dict(zip(sites, pool.map(lambda site: launch_driver(sites[site][1]()), sites)))
+    launch_seconds = time.perf_counter() - started
+    try:
+        with ThreadPoolExecutor(max_workers=len(sites)) as pool:
+            found = list(pool.map(lambda site: sites[site][0](query, driver=drivers[site]), sites))
+        memory = [driver_rss_mb(driver) for driver in drivers.values()]
+        rss = None if None in memory else sum(memory)
+    finally:
+        for driver in drivers.values():
+            driver.quit()
+    return launch_seconds, rss, sum(1 for result in found if result)
+
+
+def measure_shared(sites, query, options_factory, user_agents):
+    """Launches one shared browser, runs both scrapes in its tabs side by side and reports the cost."""
+    browser = SharedBrowser(options_factory(), user_agents)
+    try:
+        def scrape(site):
+            with browser.tab(site) as driver:
+                return sites[site][0](query, driver=driver)
+        with ThreadPoolExecutor(max_workers=len(sites)) as pool:
+            found = list(pool.map(scrape, sites))
+        rss = browser.rss_mb()
+    finally:
+        browser.quit()
+    return browser.launch_seconds, rss, sum(1 for result in found if result)
+
+
+def footprint(comparisons, query):
+    import scrape_runner
+    sites = {site: (scrape, options_factory) for site, (scrape, options_factory, _) in scrape_runner.SITES.items()}
+    report = {}
+    for mode in ("separate", "shared"):
+        samples = []
+        for _ in range(comparisons):
+            if mode == "separate":
+                samples.append(measure_separate(sites, query))
+            else:
+                samples.append(measure_shared(sites, query, scrape_runner.shared_browser_options,
+                                              scrape_runner.USER_AGENTS))
+        memory = [rss for _, rss, _ in samples if rss is not None]
+        report[mode] = {
+            "browsers_per_comparison": len(sites) if mode == "separate" else 1,
+            "launch_seconds_mean": round(sum(seconds for seconds, _, _ in samples) / len(samples), 3),
+            "rss_mb_mean": round(sum(memory) / len(memory)) if memory else None,
+            "sites_found": [found for _, _, found in samples],
+        }
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare one comparison's memory and launch time with one browser per site and with a shared browser.")
+    parser.add_argument("--comparisons", type=int, default=3)
+    parser.add_argument("--query", default="potato")
+    parser.add_argument("--storefront", action="store_true", help="Scrape the local mock storefront instead of the live sites.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.storefront:
+        from mock_storefront import start_storefront
+        server, root_url = start_storefront()
+        # The scrapers read their base URLs at import time
+        os.environ["AMAZON_BASE_URL"] = f"{root_url}/amazon"
+        os.environ["FLIPKART_BASE_URL"] = f"{root_url}/flipkart"
+    print(json.dumps(footprint(args.comparisons, args.query), indent=2))
@@ -0,0 +1,316 @@
+"""Archive of search results pages, for re-running extraction offline.
+
+With SNAPSHOTS=1, every results page a scraper extracts from (over HTTP or from a
+browser's page_source) is also recorded here. Pages are stored content-addressed
+under SNAPSHOT_DIR/objects/, named by the SHA-256 of the HTML, so a page seen
+again is stored only once. They are compressed with zstd when the `zstandard`
+package is installed and with gzip otherwise. An SQLite index maps site, query
+and capture time to the page. Recording happens on a background thread and
+never slows down or fails a scrape.
+
+    python snapshots.py stats
+    python snapshots.py reextract --site flipkart --hours 48 --output after.jsonl
+    python snapshots.py reextract --compare before.jsonl     # what a selector change fixed or broke
+
+`reextract` runs the current extraction code over archived pages on a process pool.
+It writes one JSON line per snapshot and prints a per-site summary. Selector hits
+and misses from these runs go to a selector_stats file of their own, so archived
+pages do not skew the live selector ordering.
+"""
+import argparse
+import atexit
+import gzip
+import hashlib
+import json
+import logging
+import multiprocessing.util
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import zstandard
+except ImportError:  # pages are gzip-compressed without zstandard
+    zstandard = None
+
+SNAPSHOTS = os.environ.get("SNAPSHOTS", "0") == "1"
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshots"))
+SNAPSHOT_CODEC = os.environ.get("SNAPSHOT_CODEC", "zstd" if zstandard else "gzip")
+ZSTD_LEVEL = 10
+GZIP_LEVEL = 6
+MAX_PENDING = 200                # Pages waiting to be written before new ones are dropped
+EXTENSIONS = {"zstd": ".zst", "gzip": ".gz"}
+
+# Extraction functions by site, looked up in `extraction` by the re-extraction workers
+PARSERS = {"amazon": "parse_amazon_results", "flipkart": "parse_flipkart_results"}
+
+
+def compress(data, codec):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def decompress(data, codec):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Reading zstd snapshots needs the zstandard package.")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class SnapshotStore:
+    def __init__(self, root=SNAPSHOT_DIR, codec=SNAPSHOT_CODEC):
+        if codec == "zstd" and zstandard is None:
+            logging.warning("SNAPSHOT_CODEC=zstd but zstandard is not installed; using gzip.")
+            codec = "gzip"
+        self.root = root
+        self.codec = codec
+        self._local = threading.local()
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS objects (digest TEXT PRIMARY KEY, codec TEXT NOT NULL, "
+                "size INTEGER NOT NULL, stored_size INTEGER NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS snapshots (id INTEGER PRIMARY KEY, site TEXT NOT NULL, query TEXT NOT NULL, "
+                "captured_at REAL NOT NULL, digest TEXT NOT NULL REFERENCES objects(digest), url TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS snapshots_site_time ON snapshots (site, captured_at)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(os.path.join(self.root, "index.sqlite3"), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def object_path(self, digest, codec):
+        return os.path.join(self.root, "objects", digest[:2], digest + EXTENSIONS[codec])
+
+    def put(self, site, query, html, url=None, captured_at=None):
+        """Archives one page. Returns its digest; a page already stored is only indexed again."""
+        data = html.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        conn = self._connect()
+        if conn.execute("SELECT 1 FROM objects WHERE digest = ?", (digest,)).fetchone() is None:
+            path = self.object_path(digest, self.codec)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            stored = compress(data, self.codec)
+            temporary = f"{path}.{os.getpid()}.tmp"
+            with open(temporary, "wb") as f:
+                f.write(stored)
+            os.replace(temporary, path)
+            with conn:
+                conn.execute("INSERT OR IGNORE INTO objects VALUES (?, ?, ?, ?)", (digest, self.codec, len(data), len(stored)))
+        with conn:
+            conn.execute(
+                "INSERT INTO snapshots (site, query, captured_at, digest, url) VALUES (?, ?, ?, ?, ?)",
+                (site, query, captured_at or time.time(), digest, url),
+            )
+        return digest
+
+    def read(self, digest):
+        """Returns the HTML of the page stored under `digest`."""
+        row = self._connect().execute("SELECT codec FROM objects WHERE digest = ?", (digest,)).fetchone()
+        if row is None:
+            raise KeyError(digest)
+        with open(self.object_path(digest, row["codec"]), "rb") as f:
+            return decompress(f.read(), row["codec"]).decode("utf-8")
+
+    def select(self, site=None, query=None, since=None, until=None, limit=None):
+        """Snapshots matching the filters, oldest first, as dicts of their index row."""
+        sql = "SELECT id, site, query, captured_at, digest, url FROM snapshots WHERE 1 = 1"
+        params = []
+        for clause, value in (("site = ?", site), ("query = ?", query), ("captured_at >= ?", since),
+                              ("captured_at < ?", until)):
+            if value is not None:
+                sql += f" AND {clause}"
+                params.append(value)
+        sql += " ORDER BY captured_at, id"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [dict(row) for row in self._connect().execute(sql, params)]
+
+    def stats(self):
+        conn = self._connect()
+        snapshots = conn.execute("SELECT COUNT(*), COUNT(DISTINCT query) FROM snapshots").fetchone()
+        objects = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(stored_size), 0) FROM objects").fetchone()
+        return {
+            "snapshots": snapshots[0],
+            "queries": snapshots[1],
+            "pages": objects[0],
+            "html_bytes": objects[1],
+            "stored_bytes": objects[2],
+            "by_site": dict(conn.execute("SELECT site, COUNT(*) FROM snapshots GROUP BY site").fetchall()),
+        }
+
+
+class Recorder:
+    """Archives pages from a background thread, so scrapes never wait on compression or disk."""
+
+    def __init__(self, store_factory):
+        self.store_factory = store_factory
+        self._pending = queue.Queue(maxsize=MAX_PENDING)
+        self._writer = threading.Thread(target=self._write_loop, name="snapshot-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.flush)
+
+    def record(self, site, query, html, url=None):
+        try:
+            self._pending.put_nowait((site, query, html, url, time.time()))
+        except queue.Full:
+            logging.warning(f"Snapshot queue is full, dropping the {site} page for '{query}'.")
+
+    def _write_loop(self):
+        try:
+            store = self.store_factory()
+        except Exception as e:
+            logging.error(f"Could not open the snapshot archive, pages will not be recorded: {e}")
+            store = None
+        while True:
+            site, query, html, url, captured_at = self._pending.get()
+            try:
+                if store is not None:
+                    store.put(site, query, html, url, captured_at)
+            except Exception as e:
+                logging.warning(f"Could not archive the {site} page for '{query}': {e}")
+            finally:
+                self._pending.task_done()
+
+    def flush(self):
+        """Blocks until every queued page has been written (or failed)."""
+        self._pending.join()
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def record(site, query, html, url=None):
+    """Archives a results page if SNAPSHOTS is on. Cheap and safe to call from any scrape."""
+    global _recorder
+    if not SNAPSHOTS or not html:
+        return
+    with _recorder_lock:
+        if _recorder is None:
+            _recorder = Recorder(SnapshotStore)
+    _recorder.record(site, query, html, url)
+
+
+# --- Re-extraction ---
+
+_worker_store = None
+
+
+def _init_worker(root):
+    global _worker_store
+    import selector_stats
+    _worker_store = SnapshotStore(root)
+    logging.getLogger().setLevel(logging.WARNING)   # the extraction module logs every page
+    # Pool workers skip atexit, where selector_stats normally saves
+    multiprocessing.util.Finalize(None, selector_stats.stats.save, exitpriority=10)
+
+
+def _reextract(snapshot):
+    import extraction
+    started = time.perf_counter()
+    row = {key: snapshot[key] for key in ("id", "site", "query", "captured_at", "digest")}
+    try:
+        html = _worker_store.read(snapshot["digest"])
+        kwargs = {"base_url": snapshot["url"]} if snapshot["url"] else {}
+        result = getattr(extraction, PARSERS[snapshot["site"]])(html, snapshot["query"], **kwargs)
+        row.update(ok=bool(result), result=result, error=None)
+    except Exception as e:
+        row.update(ok=False, result=None, error=str(e))
+    row["ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return row
+
+
+def _summary_of(rows):
+    return {"snapshots": len(rows), "extracted": sum(1 for row in rows if row["ok"]),
+            "errors": sum(1 for row in rows if row["error"])}
+
+
+def compare_runs(rows, baseline_path):
+    """Counts snapshots whose top result appeared, disappeared or changed since a previous run."""
+    with open(baseline_path, encoding="utf-8") as f:
+        before = {row["id"]: row for row in map(json.loads, f) if "id" in row}
+    changes = {"fixed": [], "broken": [], "changed": []}
+    for row in rows:
+        previous = before.get(row["id"])
+        if previous is None:
+            continue
+        old, new = previous.get("result"), row["result"]
+        if not old and new:
+            changes["fixed"].append(row["id"])
+        elif old and not new:
+            changes["broken"].append(row["id"])
+        elif old and new and (old.get("title"), old.get("price")) != (new.get("title"), new.get("price")):
+            changes["changed"].append(row["id"])
+    return changes
+
+
+def reextract(store, snapshots, workers, output=None):
+    """Runs the current extraction over `snapshots` on `workers` processes. Returns the result rows."""
+    started = time.perf_counter()
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(store.root,)) as pool:
+        for row in pool.map(_reextract, snapshots, chunksize=max(1, len(snapshots) // (workers * 8))):
+            rows.append(row)
+            if output:
+                output.write(json.dumps(row) + "\n")
+    seconds = time.perf_counter() - started
+    logging.info(f"Re-extracted {len(rows)} snapshots in {seconds:.1f}s "
+                 f"({len(rows) / seconds * 60 if seconds else 0:.0f} pages/min) on {workers} processes.")
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Inspect the page snapshot archive or re-run extraction over it.")
+    parser.add_argument("--dir", default=SNAPSHOT_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="Print archive size and counts.")
+    runner = commands.add_parser("reextract", help="Run the current extraction over archived pages.")
+    runner.add_argument("--site", choices=sorted(PARSERS))
+    runner.add_argument("--query")
+    runner.add_argument("--hours", type=float, help="Only snapshots captured within this many hours.")
+    runner.add_argument("--limit", type=int)
+    runner.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    runner.add_argument("--output", help="Write one JSON line per snapshot to this file.")
+    runner.add_argument("--compare", help="JSON lines from an earlier run; report what changed since.")
+    runner.add_argument("--selector-stats", help="Selector stats file for this run (default: under --dir).")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    store = SnapshotStore(args.dir)
+    if args.command == "stats":
+        print(json.dumps(store.stats(), indent=2))
+        sys.exit(0)
+
+    # Set before the workers import extraction, which records selector outcomes
+    os.environ["SELECTOR_STATS_PATH"] = args.selector_stats or os.path.join(args.dir, "reextract_selector_stats.json")
+    since = time.time() - args.hours * 3600 if args.hours else None
+    snapshots = store.select(site=args.site, query=args.query, since=since, limit=args.limit)
+    if not snapshots:
+        print("No snapshots match.", file=sys.stderr)
+        sys.exit(1)
+    output = open(args.output, "w", encoding="utf-8") if args.output else None
+    try:
+        rows = reextract(store, snapshots, args.workers, output)
+    finally:
+        if output:
+            output.close()
+
+    report = {site: _summary_of([row for row in rows if row["site"] == site]) for site in sorted({row["site"] for row in rows})}
+    if args.compare:
+        report["compared_to"] = {name: len(ids) for name, ids in compare_runs(rows, args.compare).items()}
+    print(json.dumps(report, indent=2))
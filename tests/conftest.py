@@ -0,0 +1,17 @@
+import os
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES_DIR = os.path.join(REPO_DIR, "fixtures")
+
+# The scrapers live at the repo root and the web app's modules import each other from app/
+sys.path[:0] = [REPO_DIR, os.path.join(REPO_DIR, "app")]
+
+# Keep test runs from touching the selector stats the real scrapers learn from
+os.environ.setdefault("SELECTOR_STATS_PATH", os.path.join(tempfile.mkdtemp(prefix="pricecomp-tests-"), "selector_stats.json"))
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return f.read()
@@ -0,0 +1,116 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionController, Rejected
+
+
+def test_try_acquire_never_queues():
+    admission = AdmissionController(capacity=1, queue_size=1, max_wait=1)
+    assert admission.try_acquire()
+    assert admission.busy()
+    assert not admission.try_acquire()
+    admission.release()
+    assert not admission.busy()
+    assert admission.stats()["tries_busy"] == 1
+
+
+def test_full_queue_is_rejected():
+    admission = AdmissionController(capacity=1, queue_size=0, max_wait=1)
+    assert admission.try_acquire()
+    assert admission.full()
+
+    async def search():
+        async with admission.slot():
+            pass
+
+    with pytest.raises(Rejected) as rejected:
+        asyncio.run(search())
+    assert rejected.value.status == 429
+
+
+def test_queued_search_goes_before_held_work():
+    admission = AdmissionController(capacity=1, queue_size=2, max_wait=5)
+    order = []
+    assert admission.try_acquire()
+
+    def held_work():
+        with admission.hold():
+            order.append("hold")
+
+    async def search():
+        async with admission.slot():
+            order.append("search")
+            await asyncio.sleep(0.05)
+
+    async def main():
+        queued = asyncio.create_task(search())
+        await asyncio.sleep(0.02)
+        worker = threading.Thread(target=held_work)
+        worker.start()
+        await asyncio.sleep(0.02)
+        assert admission.stats()["holding_back"] == 1
+        admission.release()
+        await queued
+        await asyncio.to_thread(worker.join, 5)
+
+    asyncio.run(main())
+    assert order == ["search", "hold"]
+    assert admission.stats()["running"] == 0
+
+
+def test_hold_counts_against_capacity():
+    admission = AdmissionController(capacity=1, queue_size=1, max_wait=0.1)
+    entered = threading.Event()
+    done = threading.Event()
+
+    def held_work():
+        with admission.hold():
+            entered.set()
+            done.wait(5)
+
+    worker = threading.Thread(target=held_work)
+    worker.start()
+    entered.wait(5)
+    assert not admission.try_acquire()
+
+    async def search():
+        async with admission.slot():
+            pass
+
+    started = time.monotonic()
+    with pytest.raises(Rejected) as rejected:
+        asyncio.run(search())
+    assert rejected.value.status == 503
+    assert time.monotonic() - started >= 0.1
+    done.set()
+    worker.join()
+    assert admission.try_acquire()
+
+
+def test_hold_limit_leaves_slots_for_searches():
+    admission = AdmissionController(capacity=3, queue_size=1, max_wait=1)
+    entered = threading.Semaphore(0)
+    done = threading.Event()
+
+    def held_work():
+        with admission.hold(limit=2):
+            entered.release()
+            done.wait(5)
+
+    workers = [threading.Thread(target=held_work) for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    for _ in range(2):
+        assert entered.acquire(timeout=5)
+    time.sleep(0.05)
+    stats = admission.stats()
+    assert (stats["held"], stats["holding_back"]) == (2, 1)
+    assert admission.try_acquire()      # the slot the limit keeps free
+    admission.release()
+    done.set()
+    for worker in workers:
+        worker.join(5)
+    assert admission.stats()["holds"] == 3
@@ -0,0 +1,40 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import fanout
+
+
+def test_one_deadline_covers_queueing_and_scraping(monkeypatch):
+    monkeypatch.setattr(fanout, "_executor", ThreadPoolExecutor(max_workers=1))
+    timeouts = {}
+
+    def scraper(site, seconds):
+        def scrape(product_name, timeout=None):
+            timeouts[site] = timeout
+            time.sleep(min(seconds, timeout))
+            return {"title": product_name, "price": 1.0}
+        return scrape
+
+    started = time.perf_counter()
+    results, timings = fanout.run_site_scrapes("potato", {"amazon": scraper("amazon", 0.3),
+                                                          "flipkart": scraper("flipkart", 0.3)}, deadline=0.5)
+    assert time.perf_counter() - started < 0.7
+    assert timings["amazon"]["status"] == "ok"
+    assert timeouts["flipkart"] < 0.25      # it queued behind amazon, so it only got what was left
+    assert timings["flipkart"]["seconds"] >= timings["amazon"]["seconds"]
+
+
+def test_scrape_still_queued_at_the_deadline_never_starts(monkeypatch):
+    monkeypatch.setattr(fanout, "_executor", ThreadPoolExecutor(max_workers=1))
+    started = []
+
+    def scrape(product_name, timeout=None):
+        started.append(timeout)
+        time.sleep(0.3)
+        return None
+
+    results, timings = fanout.run_site_scrapes("potato", {"amazon": scrape, "flipkart": scrape}, deadline=0.2)
+    time.sleep(0.2)
+    assert len(started) == 1
+    assert timings["amazon"]["status"] == timings["flipkart"]["status"] == "timeout"
+    assert abs(timings["amazon"]["seconds"] - timings["flipkart"]["seconds"]) < 0.05
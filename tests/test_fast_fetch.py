@@ -0,0 +1,121 @@
+import time
+from contextlib import contextmanager
+
+import pytest
+
+import extraction
+import fast_fetch
+import scrape_runner
+import waits
+from conftest import read_fixture
+
+
+def test_parse_amazon_fixture():
+    result = extraction.parse_amazon_results(read_fixture("amazon_search.html"), "potato", base_url="https://www.amazon.in")
+    assert result["title"] == "Fresh Potato, 1kg Pack"
+    assert result["price"] == 1049.5
+    assert result["link"] == "https://www.amazon.in/Fresh-Potato-1kg-Pack/dp/B07BG6JH2L/ref=sr_1_3"
+    # The sponsored card has no price and the chips are excluded for a plain "potato" search
+    assert [c["title"] for c in result["candidates"]] == ["Fresh Potato, 1kg Pack", "Fresh Potato, 2kg Pack"]
+
+
+def test_parse_flipkart_fixture():
+    result = extraction.parse_flipkart_results(read_fixture("flipkart_search.html"), "potato", base_url="https://www.flipkart.com")
+    assert result["title"] == "Fresh Potato (1 kg)"
+    assert result["price"] == 1045.0
+    assert result["link"] == "https://www.flipkart.com/fresh-potato/p/itm456?pid=VEGG5YYZ5ZHDHRDK"
+    assert [c["price"] for c in result["candidates"]] == [1045.0, 82.0]
+
+
+def test_chips_are_kept_when_searched_for():
+    result = extraction.parse_amazon_results(read_fixture("amazon_search.html"), "potato chips")
+    assert result["title"].startswith("Lay's Potato Chips")
+
+
+def test_parse_page_without_results():
+    assert extraction.parse_amazon_results("<html><body></body></html>", "potato") is None
+    assert extraction.parse_flipkart_results("<html><body></body></html>", "potato") is None
+
+
+@pytest.mark.parametrize("site, fixture", [("amazon", "amazon_search.html"), ("flipkart", "flipkart_search.html")])
+def test_scrape_fast_parses_fetched_page(monkeypatch, site, fixture):
+    html = read_fixture(fixture)
+    monkeypatch.setattr(fast_fetch, "fetch_search_page", lambda site, product_name, timeout=None: ("https://example.test/s", html))
+    result = fast_fetch.scrape_fast(site, "potato")
+    assert "Potato" in result["title"] and result["link"].startswith("https://example.test/")
+
+
+def test_scrape_fast_raises_when_fetch_fails(monkeypatch):
+    monkeypatch.setattr(fast_fetch, "fetch_search_page", lambda site, product_name, timeout=None: ("https://example.test/s", None))
+    with pytest.raises(fast_fetch.FetchFailed):
+        fast_fetch.scrape_fast("amazon", "potato")
+
+
+@pytest.fixture
+def browser_scrape(monkeypatch):
+    """Replaces the Selenium scrape of amazon with a fake; returns the list of queries it was called with."""
+    calls = []
+
+    def scrape(product_name, driver=None):
+        calls.append((product_name, driver))
+        return {"title": "From the browser", "price": 1.0, "link": "https://www.amazon.in/dp/X"}
+
+    @contextmanager
+    def lease_driver(site, timeout=None):
+        yield "driver"
+
+    _, options, origins = scrape_runner.SITES["amazon"]
+    monkeypatch.setitem(scrape_runner.SITES, "amazon", (scrape, options, origins))
+    monkeypatch.setattr(scrape_runner, "lease_driver", lease_driver)
+    monkeypatch.setattr(scrape_runner, "FAST_EXTRACTION", True)
+    return calls
+
+
+def test_fast_path_answer_skips_the_browser(monkeypatch, browser_scrape):
+    fast = {"title": "Over HTTP", "price": 2.0, "link": "https://www.amazon.in/dp/Y"}
+    monkeypatch.setattr(fast_fetch, "scrape_fast", lambda site, product_name, timeout=None: fast)
+    assert scrape_runner.run_scrape("amazon", "potato") is fast
+    assert browser_scrape == []
+
+
+def test_empty_fast_path_falls_back_to_the_browser(monkeypatch, browser_scrape):
+    monkeypatch.setattr(fast_fetch, "scrape_fast", lambda site, product_name, timeout=None: None)
+    assert scrape_runner.run_scrape("amazon", "potato")["title"] == "From the browser"
+    assert browser_scrape == [("potato", "driver")]
+
+
+def test_failed_fast_path_falls_back_to_the_browser(monkeypatch, browser_scrape):
+    def fail(site, product_name, timeout=None):
+        raise fast_fetch.FetchFailed("HTTP 503")
+    monkeypatch.setattr(fast_fetch, "scrape_fast", fail)
+    assert scrape_runner.run_scrape("amazon", "potato")["title"] == "From the browser"
+    assert browser_scrape == [("potato", "driver")]
+
+
+def test_fast_path_runs_within_the_scrape_budget(monkeypatch, browser_scrape):
+    timeouts = []
+
+    def slow(site, product_name, timeout=None):
+        timeouts.append(timeout)
+        time.sleep(0.3)
+        raise fast_fetch.FetchFailed("timed out")
+    monkeypatch.setattr(fast_fetch, "scrape_fast", slow)
+    with pytest.raises(waits.BudgetExhausted):
+        scrape_runner.run_scrape("amazon", "potato", timeout=0.2)
+    assert timeouts[0] <= 0.2
+    assert browser_scrape == []
+
+
+def test_grocery_searches_are_scoped_in_the_url(monkeypatch):
+    urls = []
+
+    def fetch(url, timeout=None):
+        urls.append(url)
+        raise fast_fetch.requests.ConnectionError("offline")
+    monkeypatch.setattr(fast_fetch.get_session(), "get", fetch)
+    for site in ("amazon", "flipkart"):
+        with pytest.raises(fast_fetch.FetchFailed):
+            fast_fetch.scrape_fast(site, "onion")
+    assert urls[0].endswith("&i=nowstore")
+    assert urls[1].endswith("&marketplace=GROCERY")
+    assert "marketplace" not in fast_fetch.SITES["flipkart"][0]("iphone 15")
@@ -0,0 +1,50 @@
+import json
+import os
+
+import pytest
+
+import matching
+from conftest import FIXTURES_DIR
+
+with open(os.path.join(FIXTURES_DIR, "title_pairs.json"), encoding="utf-8") as f:
+    TITLE_PAIRS = json.load(f)
+
+
+@pytest.mark.parametrize("pair", [pair for pair in TITLE_PAIRS if not pair["same"]],
+                         ids=lambda pair: f"{pair['amazon']} / {pair['flipkart']}")
+def test_different_products_never_match(pair):
+    score = matching.score_matrix([pair["amazon"]], [pair["flipkart"]], backend="rapidfuzz")[0, 0]
+    assert score < matching.MATCH_THRESHOLD
+
+
+@pytest.mark.parametrize("amazon, flipkart", [
+    ("Apple iPhone 15 (128 GB) - Black", "Apple iPhone 15 Back Cover Case (Black)"),
+    ("Amul Butter 100 g", "Amul Butter Cookies 100 g"),
+    ("Onion 1 kg", "Onion Seeds 1 kg"),
+    ("Tata Salt, 1kg", "Tata Salt Iodized Salt (1 kg, Pack of 2)"),
+])
+def test_accessories_other_products_and_multipacks_never_match(amazon, flipkart):
+    assert matching.score_matrix([amazon], [flipkart], backend="rapidfuzz")[0, 0] < matching.MATCH_THRESHOLD
+    assert matching.score_matrix([flipkart], [amazon], backend="rapidfuzz")[0, 0] < matching.MATCH_THRESHOLD
+
+
+def test_contradictions_cover_every_pair():
+    left = [matching.parse_title(title) for title in ("Tata Salt, 1kg", "Tata Salt, 1kg (Pack of 2)", "Apple iPhone 15 (128 GB) - Blue")]
+    right = [matching.parse_title(title) for title in ("Tata Salt (1 kg)", "Apple iPhone 15 (Black, 128 GB)", "Apple iPhone 15 (128 GB)")]
+    assert matching.contradictions(left, right).tolist() == [
+        [False, False, False],
+        [True, True, True],
+        [False, True, False],
+    ]
+
+
+def test_extra_descriptors_still_match():
+    score = matching.score_matrix(["Tata Salt, 1kg"], ["Tata Salt Iodized (1 kg)"], backend="rapidfuzz")[0, 0]
+    assert score >= matching.MATCH_THRESHOLD
+
+
+def test_best_match_skips_the_variant():
+    amazon = [{"title": "Samsung Galaxy S24 (256 GB)", "price": 1.0}]
+    flipkart = [{"title": "Samsung Galaxy S24 Ultra (256 GB)", "price": 2.0}, {"title": "Samsung Galaxy S24 (256 GB)", "price": 3.0}]
+    _, match, _ = matching.best_match(amazon, flipkart)
+    assert match["price"] == 3.0
@@ -0,0 +1,19 @@
+import metrics
+import tracing
+
+
+def test_page_weight_is_exported():
+    trace = tracing.Trace("flipkart")
+    with tracing.activate(trace):
+        tracing.page({"bytes": 2048, "requests": 12, "blocked": 30, "failed": 1, "dom_content_loaded_ms": 850})
+        tracing.page({"bytes": 1024, "requests": 1})
+    assert [span["phase"] for span in trace.spans] == ["page_load", "page_load"]
+
+    metrics.observe_spans(trace.spans)
+    text = metrics.render()
+    assert 'pricecomp_page_loads_total{site="flipkart"} 2' in text
+    assert 'pricecomp_page_bytes_total{site="flipkart"} 3072' in text
+    assert 'pricecomp_page_requests_total{outcome="blocked",site="flipkart"} 30' in text
+    assert 'pricecomp_page_requests_total{outcome="loaded",site="flipkart"} 13' in text
+    # Only the browser load has a timing to put in the latency histogram
+    assert 'pricecomp_phase_seconds_count{site="flipkart",phase="page_load"} 1' in text
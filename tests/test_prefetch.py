@@ -0,0 +1,42 @@
+import threading
+import time
+
+from admission import AdmissionController
+from prefetch import Prefetcher
+
+
+def test_prefetch_waits_for_a_free_slot_and_holds_it():
+    admission = AdmissionController(capacity=1, queue_size=1, max_wait=1)
+    fetched = []
+    done = threading.Event()
+
+    def fetch(query):
+        fetched.append((query, admission.stats()["running"]))
+        done.set()
+
+    prefetcher = Prefetcher(fetch, admission)
+    assert admission.try_acquire()      # a search is using the only browser
+    prefetcher.submit("tab", "potato")
+    time.sleep(0.1)
+    assert fetched == []
+    assert prefetcher.stats()["busy"] >= 1
+
+    admission.release()
+    assert done.wait(5)
+    assert fetched == [("potato", 1)]
+    time.sleep(0.05)
+    assert admission.stats()["running"] == 0
+
+
+def test_expired_prefetch_gives_its_slot_back():
+    admission = AdmissionController(capacity=1, queue_size=1, max_wait=1)
+    prefetcher = Prefetcher(lambda query: None, admission, max_age=0)
+    assert admission.try_acquire()
+    prefetcher.submit("tab", "potato")
+    time.sleep(0.05)
+    admission.release()
+    deadline = time.monotonic() + 5
+    while prefetcher.stats()["expired"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert prefetcher.stats()["expired"] == 1
+    assert admission.stats()["running"] == 0
@@ -0,0 +1,126 @@
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionController
+from resilience import CircuitOpen, ResilientScraper, percentile
+
+
+class FakeScrape:
+    """Stands in for a site scraper: fails while `failing` is set and sleeps `delays` in turn."""
+
+    def __init__(self):
+        self.failing = False
+        self.delays = []
+        self.gate = None
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, product_name, timeout=None):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+            delay = self.delays.pop(0) if self.delays else 0
+        if self.gate is not None:
+            self.gate.wait(5)
+        time.sleep(delay)
+        if self.failing:
+            raise RuntimeError("HTTP 503")
+        return {"title": product_name, "price": 10.0, "call": call}
+
+
+def test_percentile_is_nearest_rank():
+    assert percentile([5, 1, 4, 2, 3], 0.5) == 3
+    assert percentile([5, 1, 4, 2, 3], 0.95) == 5
+    assert percentile(list(range(1, 101)), 0.95) == 95
+
+
+def test_breaker_opens_then_half_opens_then_closes():
+    scrape = FakeScrape()
+    scraper = ResilientScraper("amazon", scrape, window=4, min_samples=2, error_threshold=0.5, cooldown=0.2, hedge=False)
+
+    scrape.failing = True
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            scraper("potato", timeout=5)
+    assert scraper.stats()["state"] == "open"
+    with pytest.raises(CircuitOpen):
+        scraper("potato", timeout=5)
+    assert scrape.calls == 2
+
+    time.sleep(0.25)
+    scrape.failing = False
+    scrape.gate = threading.Event()
+    trial = threading.Thread(target=scraper, args=("potato",), kwargs={"timeout": 5})
+    trial.start()
+    time.sleep(0.05)
+    assert scraper.stats()["state"] == "half_open"
+    with pytest.raises(CircuitOpen):     # only the trial call goes through while half-open
+        scraper("potato", timeout=5)
+    scrape.gate.set()
+    trial.join(5)
+
+    stats = scraper.stats()
+    assert (stats["state"], stats["opened"], stats["closed"], stats["rejected"]) == ("closed", 1, 1, 2)
+    assert scraper("potato", timeout=5)["price"] == 10.0
+
+
+def test_failed_trial_reopens_the_breaker():
+    scrape = FakeScrape()
+    scraper = ResilientScraper("amazon", scrape, window=4, min_samples=2, error_threshold=0.5, cooldown=0.1, hedge=False)
+    scrape.failing = True
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            scraper("potato", timeout=5)
+    time.sleep(0.15)
+    with pytest.raises(RuntimeError):
+        scraper("potato", timeout=5)
+    stats = scraper.stats()
+    assert (stats["state"], stats["opened"]) == ("open", 2)
+
+
+def test_hedge_fires_past_p95_and_wins():
+    scrape = FakeScrape()
+    scraper = ResilientScraper("amazon", scrape, min_samples=5, hedge_min_seconds=0)
+    for _ in range(5):
+        scraper("potato", timeout=5)
+    assert scraper.hedge_delay() < 0.1
+
+    scrape.delays = [2.0]       # the next attempt stalls; its hedge answers at once
+    started = time.monotonic()
+    result = scraper("potato", timeout=5)
+    assert time.monotonic() - started < 1.0
+    assert result["call"] == 7
+    stats = scraper.stats()
+    assert (stats["hedges"], stats["hedge_wins"]) == (1, 1)
+
+
+def test_no_hedge_until_enough_samples():
+    scrape = FakeScrape()
+    scraper = ResilientScraper("amazon", scrape, min_samples=5, hedge_min_seconds=0)
+    scrape.delays = [0.2]
+    scraper("potato", timeout=5)
+    assert scraper.hedge_delay() is None
+    assert scraper.stats()["hedges"] == 0
+
+
+def test_hedge_needs_a_free_admission_slot():
+    admission = AdmissionController(capacity=1, queue_size=1, max_wait=1)
+    scrape = FakeScrape()
+    scraper = ResilientScraper("amazon", scrape, min_samples=5, hedge_min_seconds=0, admission=admission)
+    for _ in range(5):
+        scraper("potato", timeout=5)
+
+    assert admission.try_acquire()      # the search itself holds the only browser
+    scrape.delays = [0.3]
+    assert scraper("potato", timeout=5)["call"] == 6
+    stats = scraper.stats()
+    assert (stats["hedges"], stats["hedges_busy"]) == (0, 1)
+
+    admission.release()
+    scrape.delays = [2.0]
+    assert scraper("potato", timeout=5)["call"] == 8
+    time.sleep(0.05)
+    assert scraper.stats()["hedges"] == 1
+    assert admission.stats()["running"] == 0
@@ -0,0 +1,44 @@
+import threading
+import time
+
+from admission import AdmissionController
+from result_cache import MemoryBackend, ResultCache
+
+
+def test_partial_results_expire_quickly_and_are_not_served_stale():
+    cache = ResultCache(MemoryBackend(), hit_ttl=900, stale_ttl=3600, partial_ttl=60)
+    cache.put("amazon", "potato", {"title": "Potato", "price": 40.0, "partial": True})
+    assert cache.peek("amazon", "potato")[2] == "fresh"
+
+    key = cache.key("amazon", "potato")
+    cache.backend.set(key, dict(cache.backend.get(key), stored_at=time.time() - 61))
+    assert cache.peek("amazon", "potato") == (False, None, None)
+    calls = []
+    assert cache.get_or_scrape("amazon", "potato", lambda query, timeout=None: calls.append(query) or {"price": 41.0}) == {"price": 41.0}
+    assert calls == ["potato"]
+
+
+def test_stale_refresh_takes_a_free_admission_slot():
+    admission = AdmissionController(capacity=1, queue_size=1, max_wait=1)
+    cache = ResultCache(MemoryBackend(), hit_ttl=1, stale_ttl=3600, admission=admission)
+    key = cache.key("amazon", "potato")
+    cache.backend.set(key, {"value": {"price": 40.0}, "stored_at": time.time() - 10})
+    refreshed = threading.Event()
+
+    def scrape(query, timeout=None):
+        assert admission.stats()["running"] == 1
+        refreshed.set()
+        return {"price": 41.0}
+
+    assert admission.try_acquire()      # every browser is busy: serve stale, do not refresh
+    assert cache.get_or_scrape("amazon", "potato", scrape) == {"price": 40.0}
+    assert cache.stats()["refreshes_busy"] == 1
+    admission.release()
+
+    assert cache.get_or_scrape("amazon", "potato", scrape) == {"price": 40.0}
+    assert refreshed.wait(5)
+    deadline = time.time() + 5
+    while admission.stats()["running"] and time.time() < deadline:
+        time.sleep(0.01)
+    assert admission.stats()["running"] == 0
+    assert cache.peek("amazon", "potato")[1] == {"price": 41.0}
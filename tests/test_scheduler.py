@@ -0,0 +1,139 @@
+"""Runs the scheduler against the mock storefront, scraping it over plain HTTP."""
+import threading
+import time
+import urllib.request
+
+import pytest
+
+import amazon_scraping
+import fast_fetch
+import flipkart_scraping
+from mock_storefront import start_storefront
+from scheduler import Scheduler, Watchlist
+
+QUERIES = ["potato", "onion", "tomato", "garlic", "ginger"]
+
+
+@pytest.fixture(scope="module")
+def storefront():
+    server, root_url = start_storefront()
+    yield server, root_url
+    server.shutdown()
+
+
+@pytest.fixture
+def root_url(storefront, monkeypatch):
+    server, root_url = storefront
+    monkeypatch.setattr(amazon_scraping, "AMAZON_BASE_URL", f"{root_url}/amazon")
+    monkeypatch.setattr(flipkart_scraping, "FLIPKART_BASE_URL", f"{root_url}/flipkart")
+    yield root_url
+    set_faults(root_url, "error_rate=0&slow_rate=0&slow_ms=0")
+
+
+def set_faults(root_url, query):
+    with urllib.request.urlopen(f"{root_url}/_faults?{query}") as response:
+        response.read()
+
+
+class RecordingScraper:
+    """Scrapes one site with fast_fetch, noting when each scrape started and how many ran at once."""
+
+    def __init__(self, site):
+        self.site = site
+        self.starts = []        # (query, monotonic start time)
+        self.running = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, query, timeout=None):
+        with self._lock:
+            self.starts.append((query, time.monotonic()))
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            return fast_fetch.scrape_fast(self.site, query)
+        finally:
+            with self._lock:
+                self.running -= 1
+
+    def starts_of(self, query):
+        return [started for q, started in self.starts if q == query]
+
+
+def run_scheduler(tmp_path, scrapers, queries, until, results=None, seconds=10, **options):
+    """Runs a scheduler over `queries` until `until()` holds; returns (scheduler, results).
+
+    `results` collects (site, query, result) for every result handed to `on_result`.
+    """
+    results = [] if results is None else results
+    watchlist = Watchlist(str(tmp_path / "watchlist.sqlite3"))
+    for query in queries:
+        watchlist.add(query)
+    scheduler = Scheduler(scrapers, lambda *result: results.append(result), watchlist,
+                          refresh_seconds=3600, **options)
+    scheduler.start()
+    try:
+        deadline = time.monotonic() + seconds
+        while not until() and time.monotonic() < deadline:
+            time.sleep(0.02)
+    finally:
+        scheduler.stop()
+    assert until(), "scheduler did not get there in time"
+    return scheduler, results
+
+
+def test_rate_limit_spaces_starts(tmp_path, root_url):
+    amazon = RecordingScraper("amazon")
+    _, results = run_scheduler(tmp_path, {"amazon": amazon}, QUERIES, lambda: len(amazon.starts) >= len(QUERIES),
+                               concurrency=len(QUERIES), rate_per_minute=600)
+    starts = sorted(started for _, started in amazon.starts)
+    gaps = [b - a for a, b in zip(starts, starts[1:])]
+    # 600 a minute is one start every 0.1s, with no bursts
+    assert min(gaps) >= 0.09
+    time.sleep(0.1)
+    assert sorted(query for _, query, _ in results) == sorted(QUERIES)
+
+
+def test_concurrency_cap_per_site(tmp_path, root_url):
+    set_faults(root_url, "slow_rate=1&slow_ms=300")
+    amazon, flipkart = RecordingScraper("amazon"), RecordingScraper("flipkart")
+    scheduler, _ = run_scheduler(
+        tmp_path, {"amazon": amazon, "flipkart": flipkart}, QUERIES,
+        lambda: len(amazon.starts) >= len(QUERIES) and len(flipkart.starts) >= len(QUERIES),
+        concurrency=2, rate_per_minute=60000,
+    )
+    # Each site may run two scrapes at once; the lanes do not share that cap
+    assert amazon.peak == 2 and flipkart.peak == 2
+    assert scheduler.stats()["sites"]["amazon"]["scrapes"] == len(QUERIES)
+
+
+def test_failures_back_off_with_jitter(tmp_path, root_url):
+    set_faults(root_url, "site=amazon&error_rate=1")
+    amazon = RecordingScraper("amazon")
+    base = 0.2
+    scheduler, results = run_scheduler(tmp_path, {"amazon": amazon}, ["potato"], lambda: len(amazon.starts) >= 4,
+                                       rate_per_minute=60000, backoff_base=base)
+    starts = amazon.starts_of("potato")
+    for failures, (before, after) in enumerate(zip(starts, starts[1:4]), start=1):
+        delay = base * 2 ** (failures - 1)
+        # Each retry waits the doubled delay, scaled by a jitter factor between 0.5 and 1.5
+        assert 0.5 * delay - 0.02 <= after - before <= 1.5 * delay + 0.15
+    stats = scheduler.stats()["sites"]["amazon"]
+    assert stats["errors"] >= 3 and stats["results"] == 0    # the fourth may still be running
+    assert results == []
+
+
+def test_recovers_once_the_site_answers(tmp_path, root_url):
+    set_faults(root_url, "site=amazon&error_rate=1")
+    amazon = RecordingScraper("amazon")
+    results = []
+
+    def until():
+        if len(amazon.starts) == 2:
+            set_faults(root_url, "site=amazon&error_rate=0")
+        return bool(results)
+
+    scheduler, _ = run_scheduler(tmp_path, {"amazon": amazon}, ["potato"], until, results,
+                                 rate_per_minute=60000, backoff_base=0.1)
+    assert results[0][2]["title"] == "Fresh Potato, 1kg Pack"
+    assert scheduler.stats()["sites"]["amazon"]["backing_off"] == 0
@@ -0,0 +1,34 @@
+import json
+import multiprocessing
+
+import extraction
+import selector_stats
+from conftest import read_fixture
+
+
+def _record_and_save(path, rounds):
+    stats = selector_stats.SelectorStats(path)
+    for _ in range(rounds):
+        stats.record("flipkart", "search_box", "input.Pke_EE", True, 0.01)
+        stats.save()
+
+
+def test_concurrent_saves_keep_every_count(tmp_path):
+    path = str(tmp_path / "selector_stats.json")
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=_record_and_save, args=(path, 20)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(30)
+    with open(path, encoding="utf-8") as f:
+        entry = json.load(f)["flipkart"]["search_box"]["input.Pke_EE"]
+    assert entry["tries"] == entry["hits"] == 80
+
+
+def test_parsing_ignores_learned_selector_order(monkeypatch):
+    html = read_fixture("flipkart_search.html")
+    expected = extraction.parse_flipkart_results(html, "potato")
+    monkeypatch.setattr(selector_stats, "order", lambda site, role, selectors: list(reversed(selectors)))
+    monkeypatch.setattr(selector_stats.stats, "order", lambda site, role, selectors: list(reversed(selectors)))
+    assert extraction.parse_flipkart_results(html, "potato") == expected
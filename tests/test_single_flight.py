@@ -0,0 +1,43 @@
+import threading
+import time
+
+import pytest
+
+from single_flight import FlightTimeout, SingleFlight, SQLiteFlightStore
+
+
+def test_waiter_timeout_is_not_a_result():
+    flight = SingleFlight()
+    release = threading.Event()
+    leader = threading.Thread(target=flight.do, args=("amazon:potato", lambda: release.wait(5) and {"price": 1.0}))
+    leader.start()
+    time.sleep(0.05)
+    with pytest.raises(FlightTimeout):
+        flight.do("amazon:potato", lambda: None, timeout=0.1)
+    release.set()
+    leader.join()
+    assert flight.stats()["wait_timeouts"] == 1
+
+
+def test_remote_waiter_timeout_is_not_a_result(tmp_path):
+    store = SQLiteFlightStore(str(tmp_path / "flights.sqlite3"))
+    store.acquire("amazon:potato", "another-process")
+    with pytest.raises(FlightTimeout):
+        SingleFlight(store, poll_interval=0.01).do("amazon:potato", lambda: None, timeout=0.1)
+
+
+def test_waiters_share_the_leaders_result():
+    flight = SingleFlight()
+    release = threading.Event()
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("k", lambda: release.wait(5) and "value")))
+    leader.start()
+    time.sleep(0.05)
+    follower = threading.Thread(target=lambda: results.append(flight.do("k", lambda: "other", timeout=5)))
+    follower.start()
+    time.sleep(0.05)
+    release.set()
+    leader.join()
+    follower.join()
+    assert results == ["value", "value"]
+    assert flight.stats()["coalesced_local"] == 1
@@ -0,0 +1,62 @@
+import pytest
+from selenium.common.exceptions import JavascriptException
+
+import waits
+import warm_profiles
+
+
+class FakeDriver:
+    """Answers wait scripts from a list, raising the entries that are exceptions."""
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.calls = 0
+
+    def set_script_timeout(self, seconds):
+        pass
+
+    def execute_async_script(self, script, *arguments):
+        self.calls += 1
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+def test_wait_rearms_after_navigation(monkeypatch):
+    monkeypatch.setattr(waits, "NAVIGATION_RETRY_SECONDS", 0)
+    driver = FakeDriver(JavascriptException("javascript error: document unloaded while waiting for result"), ".s-result")
+    assert waits.wait_for_any(driver, [".s-result"], timeout=5) == ".s-result"
+    assert driver.calls == 2
+
+
+def test_wait_raises_script_errors():
+    driver = FakeDriver(JavascriptException("javascript error: Cannot read properties of null"), ".s-result")
+    with pytest.raises(JavascriptException):
+        waits.wait_for_any(driver, [".s-result"], timeout=5)
+    assert driver.calls == 1
+
+
+def test_late_popup_is_not_missed():
+    class PopupDriver(FakeDriver):
+        """The search box shows first; the popup only after it."""
+
+        def __init__(self):
+            super().__init__("input.Pke_EE", "button._2doB4z")
+            self.overlays = [[], ["button._2doB4z"]]
+
+        def execute_script(self, script, selectors):
+            return self.overlays.pop(0)
+
+    driver = PopupDriver()
+    assert warm_profiles.wait_for_overlays(driver, ["button._2doB4z"], ["input.Pke_EE"]) == ["button._2doB4z"]
+    assert driver.calls == 2
+
+
+def test_no_popup_after_grace():
+    class QuietDriver(FakeDriver):
+        def execute_script(self, script, selectors):
+            return []
+
+    driver = QuietDriver("input.Pke_EE", None)
+    assert warm_profiles.wait_for_overlays(driver, ["button._2doB4z"], ["input.Pke_EE"], grace=0.1) == []
@@ -0,0 +1,59 @@
+import threading
+import time
+
+import pytest
+
+import worker_client
+from worker_client import WorkerError, WorkerGroup
+
+# Speaks the scraper_worker.py protocol: "hang" is never answered, "slow" after half a second
+FAKE_WORKER = """
+import json, os, sys, threading, time
+
+def answer(request):
+    if request["query"] == "hang":
+        return
+    if request["query"] == "slow":
+        time.sleep(0.5)
+    print(json.dumps({"id": request["id"], "ok": True, "result": {"pid": os.getpid()}}), flush=True)
+
+for line in sys.stdin:
+    request = json.loads(line)
+    if request.get("op") != "cancel":
+        threading.Thread(target=answer, args=(request,)).start()
+"""
+
+
+@pytest.fixture
+def script(tmp_path, monkeypatch):
+    monkeypatch.setattr(worker_client, "CANCEL_GRACE_SECONDS", 0.2)
+    monkeypatch.setattr(worker_client, "RESTART_BACKOFF_SECONDS", 0)
+    path = tmp_path / "fake_worker.py"
+    path.write_text(FAKE_WORKER)
+    return str(path)
+
+
+def test_stuck_worker_finishes_its_other_requests_before_it_restarts(script):
+    group = WorkerGroup(script, size=2)
+    stuck, other = group.workers
+    try:
+        with pytest.raises(WorkerError):
+            stuck.request({"site": "amazon", "query": "hang"}, timeout=0.1)
+        slow = {}
+        waiting = threading.Thread(target=lambda: slow.update(stuck.request({"site": "amazon", "query": "slow"}, timeout=5)))
+        waiting.start()
+        time.sleep(0.25)
+        assert stuck.stuck
+
+        # New requests go around the stuck worker, which keeps serving the one still waiting on it
+        pid = group.scrape("amazon", "potato", timeout=5)["result"]["pid"]
+        assert pid == other._process.pid
+        waiting.join(5)
+        assert slow["ok"]
+
+        time.sleep(0.1)
+        assert stuck._process.poll() is not None and not stuck.stuck
+        assert stuck.request({"site": "amazon", "query": "potato"}, timeout=5)["ok"]
+        assert stuck.restarts == 1
+    finally:
+        group.stop()
@@ -0,0 +1,112 @@
+"""Lightweight per-phase timing for scrapes.
+
+A `Trace` is activated for the thread running one site scrape. The scrapers mark
+sequential phases with `phase(name)` (each one ends where the next begins) and
+time self-contained steps with `with span(name):`. Every call is a no-op when no
+trace is active, so the scrapers still run standalone.
+
+`page(metrics)` adds the bytes and requests one page load took to the trace.
+
+Spans recorded outside any trace (e.g. pooled browsers launched in the background)
+are kept in a small backlog that a long-lived process can ship with its next reply.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+_local = threading.local()
+_background = deque(maxlen=200)
+
+
+class Trace:
+    def __init__(self, site):
+        self.site = site
+        self.spans = []
+        self._phase = None
+        self._phase_started = None
+
+    def add(self, name, seconds, ok=True, **fields):
+        self.spans.append(dict({"site": self.site, "phase": name, "seconds": round(seconds, 4), "ok": ok}, **fields))
+
+    def phase(self, name):
+        self.end_phase()
+        self._phase = name
+        self._phase_started = time.perf_counter()
+
+    def end_phase(self, ok=True):
+        if self._phase is not None:
+            self.add(self._phase, time.perf_counter() - self._phase_started, ok)
+            self._phase = None
+
+
+def current():
+    return getattr(_local, "trace", None)
+
+
+@contextmanager
+def activate(trace):
+    """Makes `trace` the current trace of this thread for the duration of the block."""
+    previous = current()
+    _local.trace = trace
+    try:
+        yield trace
+    finally:
+        trace.end_phase()
+        _local.trace = previous
+
+
+def phase(name):
+    trace = current()
+    if trace is not None:
+        trace.phase(name)
+
+
+def end_phase():
+    trace = current()
+    if trace is not None:
+        trace.end_phase()
+
+
+def fail_phase():
+    """Closes the running phase as failed; call from a scraper's error handler."""
+    trace = current()
+    if trace is not None:
+        trace.end_phase(ok=False)
+
+
+def page(metrics):
+    """Records the weight of the page just loaded as a "page_load" span carrying `metrics` under "page".
+
+    `metrics` has "bytes" and "requests" (plus "blocked"/"failed" requests and load timings
+    when a browser loaded the page); the span lasts until DOMContentLoaded, when known.
+    """
+    trace = current()
+    if trace is not None:
+        trace.add("page_load", (metrics.get("dom_content_loaded_ms") or 0) / 1000, page=metrics)
+
+
+@contextmanager
+def span(name, site=None):
+    started = time.perf_counter()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        seconds = time.perf_counter() - started
+        trace = current()
+        if trace is not None:
+            trace.add(name, seconds, ok)
+        else:
+            _background.append({"site": site or "background", "phase": name, "seconds": round(seconds, 4), "ok": ok})
+
+
+def drain_background():
+    spans = []
+    while _background:
+        try:
+            spans.append(_background.popleft())
+        except IndexError:
+            break
+    return spans
@@ -0,0 +1,254 @@
+"""Deadline-driven waits shared by the Selenium scrapers.
+
+Every scrape runs under one time budget (SCRAPE_BUDGET_SECONDS). Each wait and each
+page load takes at most what is left of that budget, so chained waits can no longer
+add up to minutes. Waits run inside the page. One script watches all of its
+selectors with a MutationObserver and returns the moment the DOM satisfies any of
+them; selectors are not polled one after another, and nothing sleeps for a fixed
+time. Once the budget is spent, waits raise `BudgetExhausted`. The scrapers then
+return whatever the page already shows, marked as partial.
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from selenium.common.exceptions import StaleElementReferenceException, TimeoutException, WebDriverException
+from selenium.webdriver.common.by import By
+import selector_stats
+
+SCRAPE_BUDGET_SECONDS = float(os.environ.get("SCRAPE_BUDGET_SECONDS", "60"))
+SCRIPT_TIMEOUT_SLACK = 5         # Seconds WebDriver allows a wait script beyond its own timeout
+NAVIGATION_RETRY_SECONDS = 0.1   # Pause before re-arming a wait whose page navigated away
+# How the driver reports that the document a script ran in went away under it
+NAVIGATION_ERRORS = ("document unloaded", "execution context was destroyed", "inspected target navigated",
+                     "cannot find context", "stale element")
+
+# Resolves with the first selector matching an element (or, in "gone" mode, with true once
+# none does), re-checking on every DOM mutation and on a short timer for CSS-only changes.
+# Selectors starting with "//" are XPath.
+WAIT_SCRIPT = """
+const selectors = arguments[0], mode = arguments[1], needVisible = arguments[2], timeoutMs = arguments[3];
+const done = arguments[arguments.length - 1];
+function elements(selector) {
+    if (selector.startsWith('//')) {
+        const found = document.evaluate(selector, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        const list = [];
+        for (let i = 0; i < found.snapshotLength; i++) list.push(found.snapshotItem(i));
+        return list;
+    }
+    return Array.from(document.querySelectorAll(selector));
+}
+function shown(element) {
+    if (!needVisible) return true;
+    const style = window.getComputedStyle(element);
+    return element.getClientRects().length > 0 && style.visibility !== 'hidden' && style.display !== 'none';
+}
+function check() {
+    const hit = selectors.find(selector => elements(selector).some(shown));
+    if (mode === 'any') return hit === undefined ? null : hit;
+    return hit === undefined ? true : null;
+}
+let finished = false, observer = null, ticker = null, timer = null;
+function finish(value) {
+    if (finished) return;
+    finished = true;
+    if (observer) observer.disconnect();
+    clearInterval(ticker);
+    clearTimeout(timer);
+    done(value);
+}
+const first = check();
+if (first !== null) {
+    finish(first);
+} else {
+    observer = new MutationObserver(() => { const value = check(); if (value !== null) finish(value); });
+    observer.observe(document, {childList: true, subtree: true, attributes: true});
+    ticker = setInterval(() => { const value = check(); if (value !== null) finish(value); }, 250);
+    timer = setTimeout(() => finish(null), timeoutMs);
+}
+"""
+
+# Resolves true once the page has changed since `mark_page` and then stayed quiet for
+# quietMs: either a new document (navigation) or DOM mutations in the same one.
+UPDATE_SCRIPT = """
+const token = arguments[0], quietMs = arguments[1], timeoutMs = arguments[2];
+const done = arguments[arguments.length - 1];
+let changed = window.__waitsToken !== token, quiet = null, observer = null, timer = null;
+function finish(value) {
+    if (observer) observer.disconnect();
+    clearTimeout(quiet);
+    clearTimeout(timer);
+    done(value);
+}
+function armQuiet() {
+    clearTimeout(quiet);
+    quiet = setTimeout(() => finish(true), quietMs);
+}
+observer = new MutationObserver(() => { changed = true; armQuiet(); });
+observer.observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+timer = setTimeout(() => finish(false), timeoutMs);
+if (changed) armQuiet();
+"""
+
+
+class BudgetExhausted(Exception):
+    pass
+
+
+class Budget:
+    def __init__(self, seconds, parent=None):
+        self.seconds = seconds
+        self.parent = parent
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        remaining = max(0.0, self.expires_at - time.monotonic())
+        return remaining if self.parent is None else min(remaining, self.parent.remaining())
+
+    def cancel(self):
+        """Spends the rest of the budget, so the scrape under it stops at its next wait."""
+        self.expires_at = time.monotonic()
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def cap(self, seconds):
+        """`seconds`, cut down to what is left of the budget. Raises once nothing is left."""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise BudgetExhausted(f"Scrape budget of {self.seconds:g}s is spent.")
+        return min(seconds, remaining)
+
+
+_local = threading.local()
+
+
+def current():
+    return getattr(_local, "budget", None)
+
+
+@contextmanager
+def budget(seconds=SCRAPE_BUDGET_SECONDS):
+    """Runs the block under a time budget, never longer than (and cancelled with) an enclosing one."""
+    previous = current()
+    if previous is not None and previous.remaining() < seconds:
+        seconds = previous.remaining()
+    _local.budget = Budget(seconds, previous)
+    try:
+        yield _local.budget
+    finally:
+        _local.budget = previous
+
+
+def _cap(seconds):
+    active = current()
+    return seconds if active is None else active.cap(seconds)
+
+
+def _navigated(error):
+    """True if `error` means the page navigated while a script ran, rather than the script or driver failing."""
+    if isinstance(error, StaleElementReferenceException):
+        return True
+    message = (error.msg or "").lower()
+    return any(marker in message for marker in NAVIGATION_ERRORS)
+
+
+def _run(driver, script, timeout, *arguments):
+    """Runs a wait script for up to `timeout` seconds of the budget, re-arming it if the page navigates."""
+    allowed = _cap(timeout)
+    deadline = time.monotonic() + allowed
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            driver.set_script_timeout(remaining + SCRIPT_TIMEOUT_SLACK)
+            result = driver.execute_async_script(script, *arguments, int(remaining * 1000))
+        except TimeoutException:
+            break
+        except WebDriverException as e:
+            if not _navigated(e):
+                raise
+            # The document went away under the script; wait again on the new one
+            logging.debug(f"Wait interrupted, re-arming: {e.msg}")
+            time.sleep(NAVIGATION_RETRY_SECONDS)
+            continue
+        if result is not None and result is not False:
+            return result
+        break
+    if allowed < timeout:
+        raise BudgetExhausted(f"Scrape budget of {current().seconds:g}s ran out while waiting.")
+    return None
+
+
+def wait_for_any(driver, selectors, timeout, visible=False):
+    """Waits for the first of `selectors` to match an element (a visible one if `visible`).
+
+    Returns the selector that matched, or None after `timeout` seconds.
+    """
+    return _run(driver, WAIT_SCRIPT, timeout, list(selectors), "any", visible)
+
+
+def wait_until_gone(driver, selectors, timeout):
+    """Waits until none of `selectors` matches a visible element. Returns False on timeout."""
+    return bool(_run(driver, WAIT_SCRIPT, timeout, list(selectors), "gone", True))
+
+
+def mark_page(driver):
+    """Tags the current document so `wait_for_update` can tell when it changes."""
+    token = str(time.monotonic())
+    driver.execute_script("window.__waitsToken = arguments[0];", token)
+    return token
+
+
+def wait_for_update(driver, token, timeout, quiet_ms=400):
+    """Waits until the page marked with `token` has changed and then been quiet for `quiet_ms`."""
+    return bool(_run(driver, UPDATE_SCRIPT, timeout, token, quiet_ms))
+
+
+def find(driver, selector):
+    by = By.XPATH if selector.startswith("//") else By.CSS_SELECTOR
+    return driver.find_element(by, selector)
+
+
+def race_selectors(driver, site, role, selectors, timeout, visible=True):
+    """Waits on all of `selectors` at once, preferring the historically best when several match.
+
+    Returns (selector, element), or (None, None) after `timeout`. Outcomes feed `selector_stats`.
+    """
+    ordered = selector_stats.order(site, role, selectors)
+    started = time.perf_counter()
+    selector = wait_for_any(driver, ordered, timeout, visible=visible)
+    seconds = time.perf_counter() - started
+    if selector is None:
+        for candidate in ordered:
+            selector_stats.record(site, role, candidate, False, seconds / len(ordered))
+        return None, None
+    selector_stats.record(site, role, selector, True, seconds)
+    return selector, find(driver, selector)
+
+
+def navigate(driver, url):
+    """`driver.get(url)`, with the page load limited to what is left of the budget."""
+    active = current()
+    if active is not None:
+        driver.set_page_load_timeout(active.cap(active.remaining()))
+    try:
+        driver.get(url)
+    except TimeoutException:
+        if active is not None and active.expired():
+            raise BudgetExhausted(f"Scrape budget of {active.seconds:g}s ran out loading {url}.")
+        raise
+
+
+def partial_result(driver, parse, product_name):
+    """Extracts whatever the page shows right now, marked partial. Returns None if nothing is usable."""
+    try:
+        result = parse(driver.page_source, product_name, base_url=driver.current_url)
+    except Exception as e:
+        logging.debug(f"No partial result could be extracted: {e}")
+        return None
+    if result:
+        result["partial"] = True
+    return result
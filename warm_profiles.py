@@ -0,0 +1,177 @@
+"""Warmed browser state, saved once per site and loaded into every new browser or tab.
+
+A warm-up visit to each site goes through its popups, login prompt and location
+selection once. The cookies it ends up with are saved to WARM_PROFILE_DIR/<site>.json.
+Scrapes load those cookies before their first navigation, so the site treats the
+browser as a returning visitor and the popups do not show. Loading goes through
+DevTools and needs no page, so it works on a pooled driver right after its reset
+and on a fresh shared-browser tab alike. A saved profile older than
+WARM_PROFILE_MAX_AGE is re-warmed in the background, in a browser of its own.
+
+    python warm_profiles.py amazon flipkart     # warm (or re-warm) now, e.g. from cron
+
+`wait_for_overlays` is the detector the scrapers consult before their dismissal
+phases. It waits for the page to be usable (its search box showing), then gives a
+late popup OVERLAY_GRACE_SECONDS to appear, and the phases are skipped when none did.
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracing
+import waits
+from driver_pool import launch_driver
+
+WARM_PROFILES = os.environ.get("WARM_PROFILES", "1") == "1"
+WARM_PROFILE_DIR = os.environ.get("WARM_PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "warm_profiles"))
+WARM_PROFILE_MAX_AGE = int(os.environ.get("WARM_PROFILE_MAX_AGE", str(6 * 3600)))
+# Seconds to keep watching for a popup once the page is usable; sites often show theirs a moment after load
+OVERLAY_GRACE_SECONDS = float(os.environ.get("OVERLAY_GRACE_SECONDS", "1.5"))
+OVERLAY_READY_TIMEOUT = 10      # Seconds to wait for the page to be usable before checking anyway
+
+# Fields of a cookie from Network.getAllCookies that Network.setCookies accepts back
+COOKIE_FIELDS = ("name", "value", "domain", "path", "secure", "httpOnly", "sameSite", "expires", "priority")
+
+VISIBLE_OVERLAYS_SCRIPT = """
+return arguments[0].filter(function (selector) {
+    return Array.prototype.some.call(document.querySelectorAll(selector), function (element) {
+        const style = window.getComputedStyle(element);
+        return element.getClientRects().length > 0 && style.visibility !== 'hidden' && style.display !== 'none';
+    });
+});
+"""
+
+_profiles = {}            # site -> (file mtime, cookies)
+_warming = set()
+_lock = threading.Lock()
+
+
+def profile_path(site):
+    return os.path.join(WARM_PROFILE_DIR, f"{site}.json")
+
+
+def visible_overlays(driver, selectors):
+    """Returns the selectors that match a visible element, checked in one round trip.
+
+    If the check itself fails, every selector is returned so the caller falls back to dismissing.
+    """
+    try:
+        return driver.execute_script(VISIBLE_OVERLAYS_SCRIPT, list(selectors)) or []
+    except Exception as e:
+        logging.debug(f"Overlay check failed, assuming overlays are present: {e}")
+        return list(selectors)
+
+
+def wait_for_overlays(driver, selectors, ready_selectors, grace=OVERLAY_GRACE_SECONDS):
+    """Returns the popup selectors showing once the page is usable, after waiting up to `grace` for a late one.
+
+    The page is usable once one of `ready_selectors` (e.g. its search box) or a popup shows.
+    """
+    waits.wait_for_any(driver, list(selectors) + list(ready_selectors), OVERLAY_READY_TIMEOUT, visible=True)
+    shown = visible_overlays(driver, selectors)
+    if not shown and waits.wait_for_any(driver, selectors, grace, visible=True):
+        shown = visible_overlays(driver, selectors)
+    return shown
+
+
+def saved_cookies(site):
+    """Returns (age in seconds, cookies) of `site`'s saved profile, or (None, None) if there is none."""
+    path = profile_path(site)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None, None
+    with _lock:
+        cached = _profiles.get(site)
+    if cached is None or cached[0] != mtime:
+        try:
+            with open(path, encoding="utf-8") as f:
+                cookies = json.load(f)["cookies"]
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Ignoring unreadable warm profile {path}: {e}")
+            return None, None
+        cached = (mtime, cookies)
+        with _lock:
+            _profiles[site] = cached
+    return time.time() - cached[0], cached[1]
+
+
+def save(site, driver):
+    """Saves the cookies of `driver`'s browser as `site`'s warm profile."""
+    cookies = driver.execute_cdp_cmd("Network.getAllCookies", {})["cookies"]
+    kept = []
+    for cookie in cookies:
+        fields = {key: cookie[key] for key in COOKIE_FIELDS if key in cookie}
+        if cookie.get("session"):
+            fields.pop("expires", None)
+        kept.append(fields)
+    os.makedirs(WARM_PROFILE_DIR, exist_ok=True)
+    path = profile_path(site)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"site": site, "warmed_at": time.time(), "cookies": kept}, f)
+    os.replace(path + ".tmp", path)
+    logging.info(f"Saved warm profile for {site} with {len(kept)} cookies.")
+
+
+def warm(site, warm_up, options_factory):
+    """Runs `warm_up(driver)` in a browser of its own and saves the cookies it leaves behind."""
+    started = time.perf_counter()
+    driver = launch_driver(options_factory())
+    try:
+        warm_up(driver)
+        save(site, driver)
+    finally:
+        driver.quit()
+    logging.info(f"Warmed {site} profile in {time.perf_counter() - started:.1f}s.")
+
+
+def _rewarm(site, warm_up, options_factory):
+    try:
+        warm(site, warm_up, options_factory)
+    except Exception as e:
+        logging.warning(f"Re-warming the {site} profile failed: {e}")
+    finally:
+        with _lock:
+            _warming.discard(site)
+
+
+def apply(site, driver, warm_up, options_factory, rewarm=True):
+    """Loads `site`'s warm profile into `driver`. Returns True if cookies were loaded.
+
+    With `rewarm`, a missing or stale profile is (re-)warmed on a background thread
+    while this scrape goes ahead with whatever is saved. Short-lived processes pass
+    False, since they would exit before the warm-up finishes.
+    """
+    if not WARM_PROFILES:
+        return False
+    age, cookies = saved_cookies(site)
+    if rewarm and (age is None or age > WARM_PROFILE_MAX_AGE):
+        with _lock:
+            start = site not in _warming
+            _warming.add(site)
+        if start:
+            logging.info(f"Warm profile for {site} is {'missing' if age is None else 'stale'}, re-warming in the background.")
+            threading.Thread(target=_rewarm, args=(site, warm_up, options_factory), name=f"warm-{site}", daemon=True).start()
+    if not cookies:
+        return False
+    try:
+        with tracing.span("profile_load", site=site):
+            driver.execute_cdp_cmd("Network.setCookies", {"cookies": cookies})
+        return True
+    except Exception as e:
+        logging.warning(f"Could not load the {site} warm profile: {e}")
+        return False
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    import amazon_scraping
+    import flipkart_scraping
+    sites = {
+        "amazon": (amazon_scraping.warm_up_session, amazon_scraping.build_chrome_options),
+        "flipkart": (flipkart_scraping.warm_up_session, flipkart_scraping.build_chrome_options),
+    }
+    for site in sys.argv[1:] or sites:
+        warm(site, *sites[site])